@@ -8,5 +8,5 @@ Modules used to run simulations.
 
 
 __all__ = ["atoms", "cell", "simulation", "forces", "ensembles", "properties",
-           "thermostats", "barostats", "beads", "outputs", "normalmodes",
+           "thermostats", "barostats", "constraints", "beads", "outputs", "normalmodes",
            "initializer", "system", "paratemp"]
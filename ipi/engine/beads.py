@@ -114,7 +114,7 @@ class Beads(dobject):
         dself.vpath = depend_value(name="vpath", func=self.get_vpath,
                                    dependencies=[dself.q, dself.m3])
         dself.fpath = depend_array(name="fpath", value=np.zeros((nbeads, 3 * natoms), float),
-                                   func=self.get_fpath, dependencies=[dself.q])
+                                   func=self.get_fpath, dependencies=[dself.q, dself.m3])
 
         # create proxies to access the individual beads as Atoms objects
         # TODO: ACTUALLY THIS IS ONLY USED HERE METHINK, SO PERHAPS WE COULD REMOVE IT TO DECLUTTER THE CODE.
@@ -123,12 +123,12 @@ class Beads(dobject):
         # kinetic energies of thhe beads, and total (classical) kinetic stress tensor
         dself.kins = depend_array(name="kins", value=np.zeros(nbeads, float),
                                   func=self.kin_gather,
-                                  dependencies=[dd(b).kin for b in self._blist])
+                                  dependencies=[dself.p, dself.m3])
         dself.kin = depend_value(name="kin", func=self.get_kin,
                                  dependencies=[dself.kins])
         dself.kstress = depend_array(name="kstress", value=np.zeros((3, 3), float),
                                      func=self.get_kstress,
-                                     dependencies=[dd(b).kstress for b in self._blist])
+                                     dependencies=[dself.p, dself.m3])
 
     def copy(self, nbeads=-1):
         """Creates a new beads object with newP <= P beads from the original.
@@ -186,7 +186,8 @@ class Beads(dobject):
            A list of the kinetic energy for each system.
         """
 
-        return np.array([b.kin for b in self._blist])
+        p = dstrip(self.p)
+        return 0.5 * np.einsum("ij,ij->i", p, p / dstrip(self.m3))
 
     def get_kin(self):
         """Gets the total kinetic energy of all the replicas.
@@ -210,10 +211,22 @@ class Beads(dobject):
            The sum of the kinetic stress tensor of each replica.
         """
 
-        ks = np.zeros((3, 3), float)
-        for b in range(self.nbeads):
-            ks += self[b].kstress
-        return ks
+        # all the beads and atoms are treated as a single list of 3-vectors,
+        # so that the tensor is obtained with a (3 x N) by (N x 3) product.
+        # as for the Atoms object, only the upper triangle is filled in.
+        p = dstrip(self.p).reshape((-1, 3))
+        pm = (dstrip(self.p) / dstrip(self.m3)).reshape((-1, 3))
+        return np.triu(np.dot(p.T, pm))
+
+    @staticmethod
+    def _ringdiff(q):
+        """Returns the differences between the position of each bead and that
+        of the previous one along the ring polymer."""
+
+        dq = np.empty_like(q)
+        np.subtract(q[1:], q[:-1], out=dq[1:])
+        np.subtract(q[0], q[-1], out=dq[0])
+        return dq
 
     def get_vpath(self):
         """Calculates the spring potential between the replicas.
@@ -223,16 +236,9 @@ class Beads(dobject):
         ensemble as the temperature is required to calculate it.
         """
 
-        epath = 0.0
-        q = dstrip(self.q)
-        m = dstrip(self.m3)[0]
-        for b in range(self.nbeads):
-            if b > 0:
-                dq = q[b, :] - q[b - 1, :]
-            else:
-                dq = q[b, :] - q[self.nbeads - 1, :]
-            epath += np.dot(dq, m * dq)
-        return epath * 0.5
+        dq = self._ringdiff(dstrip(self.q))
+        dq *= dq
+        return 0.5 * np.dot(dq.sum(axis=0), dstrip(self.m3)[0])
 
     def get_fpath(self):
         """Calculates the spring force between the replicas.
@@ -242,23 +248,14 @@ class Beads(dobject):
         ensemble as the temperature is required to calculate it.
         """
 
-        nbeads = self.nbeads
-        natoms = self.natoms
-        f = np.zeros((nbeads, 3 * natoms), float)
-
-        q = dstrip(self.q)
-        m = dstrip(self.m3)[0]
-        for b in range(nbeads):
-            if b > 0:
-                dq = q[b, :] - q[b - 1, :]
-            else:
-                dq = q[b, :] - q[self.nbeads - 1, :]
-            dq *= m
-            f[b] -= dq
-            if b > 0:
-                f[b - 1] += dq
-            else:
-                f[nbeads - 1] += dq
+        # each spring pulls bead b back towards b-1 and bead b-1 towards b,
+        # so f[b] = dq[b+1] - dq[b]. this is done in place, to avoid
+        # allocating another large temporary array.
+        f = self._ringdiff(dstrip(self.q))
+        f *= dstrip(self.m3)[0]
+        first = f[0].copy()
+        np.subtract(f[1:], f[:-1], out=f[:-1])
+        np.subtract(first, f[-1], out=f[-1])
         return f
 
     # A set of functions to access individual beads as Atoms objects
@@ -0,0 +1,296 @@
+"""Classes that deal with holonomic constraints.
+
+Holds the algorithms that keep the length of a set of bonds, and optionally the
+angles between pairs of constrained bonds, fixed during a molecular dynamics
+simulation. The positions are constrained with a matrix version of SHAKE and
+the momenta with RATTLE (H. C. Andersen, J. Comput. Phys. 52, 24 (1983)).
+The constraints are split into clusters of atoms that are connected by
+constrained bonds (e.g. the water molecules), and the linear systems of all
+the clusters with the same number of constraints, for all the beads, are
+solved at once.
+"""
+
+# This file is part of i-PI.
+# i-PI Copyright (C) 2014-2017 i-PI developers
+# See the "licenses" directory for full license information.
+
+
+import numpy as np
+
+from ipi.utils.depend import dstrip
+from ipi.utils.messages import verbosity, warning, info
+
+
+__all__ = ['Constraints']
+
+
+class Constraints(object):
+    """Holonomic bond length and angle constraints.
+
+    Angle constraints are enforced by constraining the distance between the
+    two outer atoms, so both the bonds that make up the angle must be
+    constrained as well. Distances are computed without the minimum image
+    convention, so the constrained molecules must not be split across the
+    boundaries of the cell. Fixed atoms are treated as having an infinite mass.
+
+    Attributes:
+       bonds: An array of shape (nbonds, 2) with the indices of the pairs of
+          atoms whose distance is constrained.
+       lengths: The lengths of the constrained bonds. If empty, they are taken
+          from the centroid positions when the constraints are bound.
+       angles: An array of shape (nangles, 3) with the indices of the atoms
+          that make up the constrained angles, the central atom being the
+          second one.
+       values: The values of the constrained angles, in radians. If empty,
+          they are taken from the centroid positions when the constraints are
+          bound.
+       tolerance: The relative tolerance on the constrained distances.
+       maxcycles: The maximum number of iterations of the SHAKE solver.
+       nconstraints: The number of constraints applied to each bead.
+       beads: The beads object the constraints are applied to.
+       _pairs: An array of shape (nconstraints, 2) with the atoms of all the
+          constrained distances, including those that enforce the angles.
+       _d2: The squares of the constrained distances.
+       _invm: The inverse atomic masses, zero for the fixed atoms.
+       _free: An array that is zero for the fixed atoms and one otherwise.
+       _groups: A list of tuples (indices, coupling), one for each size of the
+          clusters. indices has shape (nclusters, nc) and gives the
+          constraints of each cluster, coupling has shape (nclusters, nc, nc)
+          and gives the change of the constrained vectors of a cluster for a
+          unit impulse along each of them.
+       _scatter: The flat indices, in an array of positions of all the beads,
+          of the first and second atoms of each constraint.
+    """
+
+    def __init__(self, bonds=None, lengths=None, angles=None, values=None, tolerance=1e-8, maxcycles=100):
+        """Initialises Constraints.
+
+        Args:
+           bonds: An optional list of pairs of atom indices.
+           lengths: An optional list of bond lengths.
+           angles: An optional list of triplets of atom indices.
+           values: An optional list of angles, in radians.
+           tolerance: The relative tolerance on the constrained distances.
+              Defaults to 1e-8.
+           maxcycles: The maximum number of SHAKE iterations. Defaults to 100.
+        """
+
+        self.bonds = np.zeros((0, 2), int) if bonds is None else np.asarray(bonds, int).reshape((-1, 2))
+        self.lengths = np.zeros(0, float) if lengths is None else np.asarray(lengths, float).flatten()
+        self.angles = np.zeros((0, 3), int) if angles is None else np.asarray(angles, int).reshape((-1, 3))
+        self.values = np.zeros(0, float) if values is None else np.asarray(values, float).flatten()
+        self.tolerance = tolerance
+        self.maxcycles = maxcycles
+        self.nconstraints = len(self.bonds) + len(self.angles)
+        self.beads = None
+
+    def bind(self, beads, fixatoms=None):
+        """Binds the constraints to a set of beads.
+
+        Computes the missing bond lengths and angles, builds the clusters of
+        constrained atoms and moves the beads so that they satisfy the
+        constraints.
+
+        Args:
+           beads: The beads object the constraints are applied to.
+           fixatoms: An optional list of the indices of the fixed atoms.
+
+        Raises:
+           ValueError: Raised if the constraints refer to atoms that do not
+              exist, are redundant, or cannot be satisfied.
+        """
+
+        self.beads = beads
+        natoms = beads.natoms
+        if self.nconstraints == 0:
+            return
+
+        for atoms in (self.bonds, self.angles):
+            if len(atoms) > 0 and (atoms.min() < 0 or atoms.max() >= natoms):
+                raise ValueError("Constraint atom indices must be between 0 and %d" % (natoms - 1))
+        qc = dstrip(beads.qc).reshape((-1, 3))
+
+        if len(self.lengths) == 0:
+            self.lengths = np.sqrt(((qc[self.bonds[:, 0]] - qc[self.bonds[:, 1]])**2).sum(axis=1))
+            info(" Constrained bond lengths taken from the initial centroid positions.", verbosity.medium)
+        elif len(self.lengths) != len(self.bonds):
+            raise ValueError("The number of bond lengths does not match the number of constrained bonds")
+
+        if len(self.values) == 0:
+            rij = qc[self.angles[:, 0]] - qc[self.angles[:, 1]]
+            rkj = qc[self.angles[:, 2]] - qc[self.angles[:, 1]]
+            cos = (rij * rkj).sum(axis=1) / np.sqrt((rij * rij).sum(axis=1) * (rkj * rkj).sum(axis=1))
+            self.values = np.arccos(np.clip(cos, -1.0, 1.0))
+            info(" Constrained angles taken from the initial centroid positions.", verbosity.medium)
+        elif len(self.values) != len(self.angles):
+            raise ValueError("The number of angle values does not match the number of constrained angles")
+
+        # angles are enforced as the distance between the outer atoms
+        blen = {}
+        for (i, j), d in zip(self.bonds, self.lengths):
+            blen[(min(i, j), max(i, j))] = d
+        d13 = np.zeros(len(self.angles), float)
+        for n, ((i, j, k), theta) in enumerate(zip(self.angles, self.values)):
+            try:
+                dij = blen[(min(i, j), max(i, j))]
+                djk = blen[(min(j, k), max(j, k))]
+            except KeyError:
+                raise ValueError("Angle %d-%d-%d is constrained, but the bonds that make it up are not" % (i, j, k))
+            d13[n] = np.sqrt(dij**2 + djk**2 - 2.0 * dij * djk * np.cos(theta))
+
+        pairs = np.concatenate((self.bonds, self.angles[:, ::2])).reshape((-1, 2))
+        if (pairs[:, 0] == pairs[:, 1]).any():
+            raise ValueError("An atom cannot be constrained to itself")
+        if len(set((min(i, j), max(i, j)) for i, j in pairs)) != len(pairs):
+            raise ValueError("The same distance is constrained more than once")
+        self._pairs = pairs
+        self._d2 = np.concatenate((self.lengths, d13))**2
+
+        self._invm = 1.0 / dstrip(beads.m)
+        if fixatoms is not None and len(fixatoms) > 0:
+            self._invm[fixatoms] = 0.0
+        if (self._invm[pairs].max(axis=1) == 0.0).any():
+            raise ValueError("The distance between two fixed atoms cannot be constrained")
+        self._free = (self._invm > 0.0).astype(float)
+
+        # finds the clusters of atoms connected by constraints
+        root = np.arange(natoms)
+
+        def find(i):
+            while root[i] != i:
+                root[i] = root[root[i]]
+                i = root[i]
+            return i
+
+        for i, j in pairs:
+            root[find(i)] = find(j)
+        clusters = {}
+        for k, (i, j) in enumerate(pairs):
+            clusters.setdefault(find(i), []).append(k)
+
+        bysize = {}
+        for cl in clusters.values():
+            bysize.setdefault(len(cl), []).append(cl)
+        self._groups = []
+        for nc in sorted(bysize):
+            idx = np.asarray(bysize[nc], int)
+            a = pairs[idx, 0]
+            b = pairs[idx, 1]
+            al, bl = a[:, :, np.newaxis], b[:, :, np.newaxis]
+            ak, bk = a[:, np.newaxis, :], b[:, np.newaxis, :]
+            coupling = (self._invm[al] * ((al == ak).astype(float) - (al == bk)) -
+                        self._invm[bl] * ((bl == ak).astype(float) - (bl == bk)))
+            self._groups.append((idx, coupling))
+
+        offset = np.arange(beads.nbeads)[:, np.newaxis, np.newaxis] * natoms
+        self._scatter = tuple(((offset + pairs[:, n, np.newaxis]) * 3 + np.arange(3)).flatten() for n in (0, 1))
+
+        q = dstrip(beads.q)
+        qs = self.qconstrain(q, q)
+        if np.abs(qs - q).max() > 0.0:
+            info(" Initial positions adjusted to satisfy the constraints.", verbosity.low)
+            beads.q = qs
+
+    def _vectors(self, q):
+        """Returns the constrained vectors, with shape (nbeads, nconstraints, 3)."""
+
+        q = q.reshape((len(q), -1, 3))
+        return q[:, self._pairs[:, 0]] - q[:, self._pairs[:, 1]]
+
+    def _solve(self, r, r0, rhs):
+        """Solves for the impulses along r0 that give the target changes of
+        the projections of the constrained vectors on r.
+
+        Args:
+           r: The vectors the changes are projected on.
+           r0: The directions of the impulses.
+           rhs: The target changes, with shape (nbeads, nconstraints).
+        """
+
+        x = np.zeros(rhs.shape, float)
+        for idx, coupling in self._groups:
+            a = coupling * np.einsum("bcld,bckd->bclk", r[:, idx], r0[:, idx])
+            x[:, idx] = np.linalg.solve(a, rhs[:, idx])
+        return x
+
+    def _impulse(self, x, r):
+        """Sums the impulses x along r acting on each atom, with the same
+        shape as the momenta of the beads."""
+
+        g = (x[:, :, np.newaxis] * r).flatten()
+        n = len(r) * self.beads.natoms * 3
+        dp = np.bincount(self._scatter[0], g, minlength=n) - np.bincount(self._scatter[1], g, minlength=n)
+        return dp.reshape((len(r), -1))
+
+    def qconstrain(self, q0, q):
+        """Moves the positions along the constrained vectors so that they
+        satisfy the constraints (SHAKE).
+
+        Args:
+           q0: The positions at the beginning of the step, that give the
+              directions of the constraint forces.
+           q: The unconstrained positions.
+
+        Returns:
+           A new array with the constrained positions.
+        """
+
+        q = q.copy()
+        if self.nconstraints == 0:
+            return q
+        r0 = self._vectors(q0)
+        invm3 = np.repeat(self._invm, 3)
+        for i in xrange(self.maxcycles):
+            r = self._vectors(q)
+            sigma = (r * r).sum(axis=2) - self._d2
+            if np.abs(sigma / self._d2).max() <= 2.0 * self.tolerance:
+                break
+            q += self._impulse(self._solve(r, r0, -0.5 * sigma), r0) * invm3
+        else:
+            warning("SHAKE did not converge in %d iterations" % self.maxcycles, verbosity.low)
+        return q
+
+    def pconstrain(self, q, p):
+        """Removes from the momenta the components that change the constrained
+        distances (RATTLE).
+
+        Args:
+           q: The positions, which must satisfy the constraints.
+           p: The momenta.
+
+        Returns:
+           A tuple with a new array with the constrained momenta, and the
+           kinetic energy that has been removed.
+        """
+
+        if self.nconstraints == 0:
+            return p.copy(), 0.0
+        invm3 = np.repeat(self._invm, 3)
+        r = self._vectors(q)
+        dv = self._vectors(p * invm3)
+        pc = p + self._impulse(self._solve(r, r, -(r * dv).sum(axis=2)), r) * np.repeat(self._free, 3)
+        return pc, 0.5 * np.dot((p * p - pc * pc).sum(axis=0), invm3)
+
+    def pthermal(self, kt):
+        """Returns momenta along the constrained directions, that carry
+        kt/2 kinetic energy per constraint and bead.
+
+        Used to compute the temperature of parts of the system, like the fake
+        momenta of the fixed atoms. If the momenta satisfy the constraints,
+        adding these momenta increases the total kinetic energy by exactly
+        kt/2 times the number of constrained degrees of freedom.
+
+        Args:
+           kt: The thermal energy of each bead.
+        """
+
+        q = dstrip(self.beads.q)
+        if self.nconstraints == 0:
+            return np.zeros(q.shape, float)
+        r = self._vectors(q)
+        c = np.zeros(r.shape[:2], float)
+        for idx, coupling in self._groups:
+            # with K = L L^T, c = L^-T u gives c.K.c = u.u
+            l = np.linalg.cholesky(coupling * np.einsum("bcld,bckd->bclk", r[:, idx], r[:, idx]))
+            c[:, idx] = np.linalg.solve(np.swapaxes(l, -1, -2), np.ones(r.shape[:1] + idx.shape) * np.sqrt(kt))
+        return self._impulse(c, r) * np.repeat(self._free, 3)
@@ -133,7 +133,7 @@ class Ensemble(dobject):
         dself.econs.add_dependency(dd(self.nm).kin)
         dself.econs.add_dependency(dd(self.forces).pot)
         dself.econs.add_dependency(dd(self.bias).pot)
-        dself.econs.add_dependency(dd(self.beads).vpath)
+        dself.econs.add_dependency(dd(self.nm).vpath)
         dself.econs.add_dependency(dself.eens)
 
         # pipes the weights to the list of weight vectors
@@ -154,7 +154,7 @@ class Ensemble(dobject):
         for ic in xrange(len(self.forces.mforces)):
             sfc = ScaledForceComponent(self.forces.mforces[ic], 1.0)
             self.bias.add_component(self.forces.mbeads[ic], self.forces.mrpc[ic], sfc)
-            dd(sfc).scaling._func = lambda i=ic: self.hweights[i] - 1
+            dd(sfc).scaling.set_func(lambda i=ic: self.hweights[i] - 1)
             dd(sfc).scaling.add_dependency(dself.hweights)
 
         self._elist = []
@@ -167,7 +167,7 @@ class Ensemble(dobject):
         dself.lpens.add_dependency(dd(self.nm).kin)
         dself.lpens.add_dependency(dd(self.forces).pot)
         dself.lpens.add_dependency(dd(self.bias).pot)
-        dself.lpens.add_dependency(dd(self.beads).vpath)
+        dself.lpens.add_dependency(dd(self.nm).vpath)
 
         # extended Lagrangian terms for the ensemble
         self._xlpot = []
@@ -194,7 +194,7 @@ class Ensemble(dobject):
         """Calculates the conserved energy quantity for constant energy
         ensembles.
         """
-        eham = self.beads.vpath * self.nm.omegan2 + self.nm.kin + self.forces.pot
+        eham = self.nm.vpath * self.nm.omegan2 + self.nm.kin + self.forces.pot
         eham += self.bias.pot   # bias
         for e in self._elist:
             eham += e.get()
@@ -206,7 +206,7 @@ class Ensemble(dobject):
         for the ensemble.
         """
 
-        lpens = (self.forces.pot + self.bias.pot + self.nm.kin + self.beads.vpath * self.nm.omegan2);
+        lpens = (self.forces.pot + self.bias.pot + self.nm.kin + self.nm.vpath * self.nm.omegan2);
 
         # inlcude terms associated with an extended Lagrangian integrator of some sort
         for p in self._xlpot:
@@ -15,6 +15,7 @@ and the driver (that only cares about a single bead).
 import time
 import sys
 import threading
+import itertools
 from copy import deepcopy
 
 import numpy as np
@@ -26,7 +27,7 @@ from ipi.utils.nmtransform import nm_rescale
 from ipi.engine.beads import Beads
 
 
-__all__ = ['Forces', 'ForceComponent']
+__all__ = ['Forces', 'ForceComponent', 'ForceBatch']
 
 
 fbuid = 0
@@ -582,10 +583,10 @@ class Forces(dobject):
 
             # the beads positions for this force components are obtained
             # automatically, when needed, as a contraction of the full beads
-            dd(newbeads).q._func = make_rpc(newrpc, beads)
+            dd(newbeads).q.set_func(make_rpc(newrpc, beads))
             for b in newbeads:
                 # must update also indirect access to the beads coordinates
-                dd(b).q._func = dd(newbeads).q._func
+                dd(b).q.set_func(dd(newbeads).q._func)
 
             # makes newbeads.q depend from beads.q
             dd(beads).q.add_dependant(dd(newbeads).q)
@@ -1002,3 +1003,75 @@ class Forces(dobject):
         rc[0::2] = (self.alpha / self.omegan2 / 9.0)
         rc[1::2] = ((1.0 - self.alpha) / self.omegan2 / 9.0)
         return np.asmatrix(rc).T
+
+
+class ForceBatch(object):
+    """Computes the forces for many configurations of a system at once.
+
+    Estimators that displace the path of one atom at a time would otherwise
+    have to wait for a full force evaluation for each atom before moving on
+    to the next one. ForceBatch keeps a pool of copies of a Forces object,
+    each bound to its own beads, loads a batch of configurations into them
+    and queues all the force calculations before collecting any result, so
+    that they can be dispatched to all the available clients at once.
+
+    Attributes:
+       forces: The Forces object whose copies are used to compute the forces.
+       maxbatch: The largest number of configurations that are evaluated at
+          once, which also limits the number of copies kept in memory.
+       _cell: A copy of the system box shared by all the copies.
+       _replicas: A list of the Forces copies that have been created so far.
+    """
+
+    def __init__(self, forces, maxbatch=32):
+        """Initialises ForceBatch.
+
+        Args:
+           forces: A bound Forces object.
+           maxbatch: The largest number of configurations evaluated at once.
+        """
+
+        self.forces = forces
+        self.maxbatch = maxbatch
+        self._cell = None
+        self._replicas = []
+
+    def run(self, keys, path):
+        """Evaluates the forces for a sequence of configurations.
+
+        Args:
+           keys: An iterable with one item for each configuration, e.g. the
+              index of the atom that is displaced.
+           path: A function that takes an item of keys and returns the
+              corresponding bead positions, as an array with the same shape
+              as forces.beads.q. It is only called for one batch at a time.
+
+        Returns:
+           A generator that gives, for each item of keys and in the same
+           order, a tuple (key, forces) where forces is a Forces object whose
+           beads hold the corresponding positions. The Forces objects are
+           reused for later batches, so their properties must be read before
+           moving on to the next item.
+        """
+
+        keys = iter(keys)
+        while True:
+            batch = list(itertools.islice(keys, self.maxbatch))
+            if len(batch) == 0:
+                return
+
+            if self._cell is None:
+                self._cell = self.forces.cell.copy()
+            else:
+                self._cell.h = dstrip(self.forces.cell.h)
+            while len(self._replicas) < len(batch):
+                self._replicas.append(self.forces.copy(self.forces.beads.copy(), self._cell))
+
+            replicas = self._replicas[:len(batch)]
+            for key, rforces in zip(batch, replicas):
+                rforces.beads.q = path(key)
+            # all the jobs are queued before waiting for any of them
+            for rforces in replicas:
+                rforces.queue()
+            for key, rforces in zip(batch, replicas):
+                yield key, rforces
@@ -18,7 +18,7 @@ from ipi.engine.cell import Cell
 from ipi.engine.normalmodes import NormalModes
 from ipi.engine.ensembles import Ensemble
 from ipi.engine.motion import Motion
-from ipi.utils.io import read_file
+from ipi.utils.io import read_file, read_npy
 from ipi.utils.io.inputs.io_xml import xml_parse_file
 from ipi.utils.depend import dobject
 from ipi.utils.units import Constants, unit_to_internal
@@ -204,12 +204,15 @@ def init_vector(iif, nbeads, momenta=False, dimension="length", units="automatic
         else: rq = init_beads(iif, nbeads).q
     elif mode == "manual":
         rq = value
+    elif mode == "npy":
+        # the file is memory-mapped, so this is the only copy in memory
+        rq = read_npy(value) * unit_to_internal(dimension, units, 1.0)
 
     # determines the size of the input data
-    if mode == "manual":
+    if mode == "manual" or mode == "npy":
         if iif.bead >= 0:  # if there is a bead specifier then we return a single bead slice
             nbeads = 1
-        natoms = len(rq) / nbeads / 3
+        natoms = rq.size / nbeads / 3
         rq.shape = (nbeads, 3 * natoms)
 
     return rq
@@ -355,6 +358,8 @@ class Initializer(dobject):
                     warning("Overwriting previous atomic masses", verbosity.medium)
                 if v.mode == "manual":
                     rm = v.value * unit_to_internal("mass", v.units, 1.0)
+                elif v.mode == "npy":
+                    rm = read_npy(v.value) * unit_to_internal("mass", v.units, 1.0)
                 else:
                     rm = init_beads(v, self.nbeads).m
 
@@ -379,6 +384,8 @@ class Initializer(dobject):
                     warning("Overwriting previous atomic labels", verbosity.medium)
                 if v.mode == "manual":
                     rn = v.value
+                elif v.mode == "npy":
+                    rn = np.array(read_npy(v.value))
                 else:
                     rn = init_beads(v, self.nbeads).names
 
@@ -17,8 +17,9 @@ import numpy as np
 
 from ipi.engine.motion import Motion
 from ipi.utils.depend import *
-from ipi.engine.thermostats import Thermostat
+from ipi.engine.thermostats import Thermostat, ThermoPILE_L
 from ipi.engine.barostats import Barostat
+from ipi.engine.constraints import Constraints
 
 
 #__all__ = ['Dynamics', 'NVEIntegrator', 'NVTIntegrator', 'NPTIntegrator', 'NSTIntegrator', 'SCIntegrator`']
@@ -48,13 +49,18 @@ class Dynamics(Motion):
             effective classical temperature.
     """
 
-    def __init__(self, timestep, mode="nve", thermostat=None, barostat=None, fixcom=False, fixatoms=None, nmts=None):
+    def __init__(self, timestep, mode="nve", thermostat=None, barostat=None, fixcom=False, fixatoms=None, nmts=None, fused=False, constraints=None):
         """Initialises a "dynamics" motion object.
 
         Args:
             dt: The timestep of the simulation algorithms.
             fixcom: An optional boolean which decides whether the centre of mass
                 motion will be constrained or not. Defaults to False.
+            fused: An optional boolean which decides whether the nve and nvt
+                integrators should do each step on raw normal mode arrays,
+                rather than through the depend objects. Defaults to False.
+            constraints: An optional object holding the holonomic constraints
+                on bond lengths and angles. Defaults to no constraints.
         """
 
         super(Dynamics, self).__init__(fixcom=fixcom, fixatoms=fixatoms)
@@ -78,8 +84,21 @@ class Dynamics(Motion):
         else:
             self.nmts = np.asarray(nmts)
 
+        if constraints is None:
+            self.constraints = Constraints()
+        else:
+            self.constraints = constraints
+
         self.enstype = mode
-        if self.enstype == "nve":
+        self.fused = fused
+        if self.constraints.nconstraints > 0:
+            if self.fused or not self.enstype in ["nve", "nvt"]:
+                raise ValueError("Holonomic constraints are only available for the nve and nvt modes, without the fused integrator")
+        if self.fused:
+            if not self.enstype in ["nve", "nvt"]:
+                raise ValueError("The fused integrator is only available for the nve and nvt modes")
+            self.integrator = FusedIntegrator()
+        elif self.enstype == "nve":
             self.integrator = NVEIntegrator()
         elif self.enstype == "nvt":
             self.integrator = NVTIntegrator()
@@ -128,6 +147,9 @@ class Dynamics(Motion):
         if (len(self.nmts) != self.forces.nmtslevels):
             raise ValueError("The number of mts levels for the integrator does not agree with the mts_weights of the force components.")
 
+        # makes the positions consistent with the constraints
+        self.constraints.bind(self.beads, self.fixatoms)
+
         # Binds integrators
         self.integrator.bind(self)
 
@@ -140,6 +162,7 @@ class Dynamics(Motion):
         fixdof = len(self.fixatoms) * 3 * self.beads.nbeads
         if self.fixcom:
             fixdof += 3
+        fixdof += self.constraints.nconstraints * self.beads.nbeads
 
         # first makes sure that the thermostat has the correct temperature, then proceed with binding it.
         dpipe(dself.ntemp, dd(self.thermostat).temp)
@@ -212,6 +235,7 @@ class DummyIntegrator(dobject):
         self.barostat = motion.barostat
         self.fixcom = motion.fixcom
         self.fixatoms = motion.fixatoms
+        self.constraints = motion.constraints
         dself = dd(self)
         dself.dt = dd(motion).dt
         if motion.enstype == "mts": self.nmts = motion.nmts
@@ -302,18 +326,54 @@ class NVEIntegrator(DummyIntegrator):
                 bp[self.fixatoms * 3 + 1] = 0.0
                 bp[self.fixatoms * 3 + 2] = 0.0
 
+        if self.constraints.nconstraints > 0:
+            p, dke = self.constraints.pconstrain(dstrip(self.beads.q), dstrip(self.beads.p))
+            self.ensemble.eens += dke
+            self.beads.p = p
+
     def pstep(self):
-        """Velocity Verlet momenta propagator."""
+        """Velocity Verlet momenta propagator.
 
-        self.beads.p += dstrip(self.forces.f) * (self.dt * 0.5)
-        # also adds the bias force
-        self.beads.p += dstrip(self.bias.f) * (self.dt * 0.5)
+        If there are holonomic constraints, the components of the momenta
+        along the constraints are removed (the second stage of RATTLE). This
+        is part of the constrained dynamics, so the kinetic energy that is
+        removed does not contribute to the conserved quantity.
+        """
+
+        p = dstrip(self.beads.p) + (dstrip(self.forces.f) + dstrip(self.bias.f)) * (self.dt * 0.5)
+        if self.constraints.nconstraints > 0:
+            p = self.constraints.pconstrain(dstrip(self.beads.q), p)[0]
+        self.beads.p = p
 
     def qcstep(self):
         """Velocity Verlet centroid position propagator."""
 
         self.nm.qnm[0, :] += dstrip(self.nm.pnm)[0, :] / dstrip(self.beads.m3)[0] * self.dt
 
+    def qstep(self):
+        """Propagates the positions for a time step, with the centroid and the
+        free ring polymer propagators.
+
+        If there are holonomic constraints, each bead is then moved along the
+        constraints at the beginning of the step until they are satisfied
+        (SHAKE), and the momenta get the corresponding impulse. For more than
+        one bead this treats the constraint forces as if they did not mix
+        with the ring polymer springs during the step.
+        """
+
+        if self.constraints.nconstraints == 0:
+            self.qcstep()
+            self.nm.free_qstep()
+            return
+
+        q0 = dstrip(self.beads.q).copy()
+        self.qcstep()
+        self.nm.free_qstep()
+        q = dstrip(self.beads.q)
+        qc = self.constraints.qconstrain(q0, q)
+        self.beads.p += dstrip(self.beads.m3) * (qc - q) / self.dt
+        self.beads.q = qc
+
     def step(self, step=None):
         """Does one simulation time step."""
 
@@ -323,9 +383,7 @@ class NVEIntegrator(DummyIntegrator):
         self.ptime += time.time()
 
         self.qtime = -time.time()
-        self.qcstep()
-
-        self.nm.free_qstep()
+        self.qstep()
         self.qtime += time.time()
 
         self.ptime -= time.time()
@@ -363,8 +421,7 @@ class NVTIntegrator(NVEIntegrator):
         self.ptime += time.time()
 
         self.qtime = -time.time()
-        self.qcstep()
-        self.nm.free_qstep()
+        self.qstep()
         self.qtime += time.time()
 
         self.ptime -= time.time()
@@ -379,6 +436,110 @@ class NVTIntegrator(NVEIntegrator):
         # print "PTIME: ", self.ptime, "  TTIME: ", self.ttime, "  QTIME: ", self.qtime
 
 
+class FusedIntegrator(NVTIntegrator):
+    """Integrator object for constant energy or temperature simulations, that
+    does each time step on raw normal mode arrays.
+
+    Follows the same O-B-A-B-O splitting as NVTIntegrator (or B-A-B as
+    NVEIntegrator), but the momenta are only kept in the normal mode
+    representation, so the forces are transformed rather than the momenta,
+    and the thermostat and the constraints are applied to plain arrays. The
+    positions are written back once, before the forces are computed, and the
+    momenta once at the end of the step, so the depend network is only
+    updated twice per step. The trajectories are the same as those of the
+    standard integrators, up to round-off errors.
+
+    Only the PILE_L thermostat, or no thermostat, and a single MTS level
+    are supported.
+    """
+
+    def bind(self, motion):
+        """Checks that the motion can be integrated with raw arrays."""
+
+        super(FusedIntegrator, self).bind(motion)
+        self.thermalize = (motion.enstype == "nvt")
+        if self.thermalize and not type(self.thermostat) is ThermoPILE_L:
+            raise ValueError("The fused integrator only supports the pile_l thermostat")
+        if len(motion.nmts) > 1 or motion.nmts[0] != 1:
+            raise ValueError("The fused integrator does not support multiple time stepping")
+
+    def nmconstraints(self, pnm):
+        """Applies the constraints of pconstraints to raw normal mode momenta.
+
+        The centre of mass momentum only depends on the centroid mode, as the
+        other modes are orthogonal to a uniform displacement of the beads,
+        and for fixed atoms the kinetic energy is the same in the normal mode
+        and the bead representations.
+
+        Args:
+            pnm: A plain (nbeads, 3*natoms) array of normal mode momenta.
+        """
+
+        if self.fixcom:
+            na3 = self.beads.natoms * 3
+            nb = self.beads.nbeads
+            m = dstrip(self.beads.m)
+            M = self.beads[0].M
+
+            # the centroid mode is the sum of the beads divided by sqrt(nb)
+            pcom = pnm[0].reshape((-1, 3)).sum(axis=0) * np.sqrt(nb)
+            self.ensemble.eens += np.dot(pcom, pcom) / (2.0 * M * nb)
+
+            # subtracts COM velocity
+            pcom *= np.sqrt(nb) / (nb * M)
+            pnm[0] -= (m[:, np.newaxis] * pcom).reshape(na3)
+
+        if len(self.fixatoms) > 0:
+            cols = np.asarray([3 * self.fixatoms, 3 * self.fixatoms + 1, 3 * self.fixatoms + 2]).T.flatten()
+            m3 = dstrip(self.beads.m3)[0, cols]
+            pfix = pnm[:, cols]
+            self.ensemble.eens += 0.5 * np.dot((pfix * pfix).sum(axis=0), 1.0 / m3)
+            pnm[:, cols] = 0.0
+
+    def nmpstep(self, pnm):
+        """Velocity Verlet momenta propagator for raw normal mode momenta."""
+
+        f = dstrip(self.forces.f) + dstrip(self.bias.f)
+        pnm += self.nm.transform.b2nm(f) * (self.dt * 0.5)
+
+    def step(self, step=None):
+        """Does one simulation time step."""
+
+        dt = self.dt
+        pnm = dstrip(self.nm.pnm).copy()
+        qnm = dstrip(self.nm.qnm).copy()
+
+        self.ttime = -time.time()
+        if self.thermalize:
+            self.thermostat.pnm_step(pnm)
+            self.nmconstraints(pnm)
+        self.ttime += time.time()
+
+        self.ptime = -time.time()
+        self.nmpstep(pnm)
+        self.nmconstraints(pnm)
+        self.ptime += time.time()
+
+        self.qtime = -time.time()
+        qnm[0] += pnm[0] / dstrip(self.beads.m3)[0] * dt
+        self.nm.free_propagate(pnm, qnm)
+        self.nm.qnm = qnm
+        self.qtime += time.time()
+
+        self.ptime -= time.time()
+        self.nmpstep(pnm)
+        self.nmconstraints(pnm)
+        self.ptime += time.time()
+
+        self.ttime -= time.time()
+        if self.thermalize:
+            self.thermostat.pnm_step(pnm)
+            self.nmconstraints(pnm)
+        self.ttime += time.time()
+
+        self.nm.pnm = pnm
+
+
 class NPTIntegrator(NVTIntegrator):
     """Integrator object for constant pressure simulations.
 
@@ -74,9 +74,13 @@ class NormalModes(dobject):
        kstress: The kinetic stress tensor, as calculated in the normal mode
           representation, using the dynamical mass factors. Depends on
           beads.sm3, beads.p and nm_factor.
+       vpath: The spring potential between the replicas, without the
+          omegan**2 factor, as calculated in the normal mode representation.
+          The same as beads.vpath, but it does not need the bead positions.
+          Depends on qnm and beads.m3.
     """
 
-    def __init__(self, mode="rpmd", transform_method="fft", freqs=None, open_paths=None, dt=1.0):
+    def __init__(self, mode="rpmd", transform_method="fft", freqs=None, open_paths=None, dt=1.0, n_threads=1):
         """Initializes NormalModes.
 
         Sets the options for the normal mode transform.
@@ -86,6 +90,8 @@ class NormalModes(dobject):
            transform_method: A string specifying how to do the normal mode
               transformation.
            freqs: A list of data used to calculate the dynamical mass factors.
+           n_threads: The number of threads used by the FFT transform, if
+              PyFFTW is available.
         """
 
         if freqs is None:
@@ -93,6 +99,8 @@ class NormalModes(dobject):
         if open_paths is None:
             open_paths = []
         self.open_paths = np.asarray(open_paths, int)
+        self.n_threads = n_threads
+        self._free_work = None
         dself = dd(self)
         dself.dt = depend_value(name='dt', value=dt)
         dself.mode = depend_value(name='mode', value=mode)
@@ -109,7 +117,7 @@ class NormalModes(dobject):
         if freqs is None:
             freqs = self.nm_freqs.copy()
 
-        newnm = NormalModes(self.mode, self.transform_method, freqs, self.dt)
+        newnm = NormalModes(self.mode, self.transform_method, freqs, self.open_paths, self.dt, self.n_threads)
         return newnm
 
     def bind(self, ensemble, motion, beads=None, forces=None):
@@ -141,33 +149,34 @@ class NormalModes(dobject):
 
         # sets up what's necessary to perform nm transformation.
         if self.transform_method == "fft":
-            self.transform = nmtransform.nm_fft(nbeads=self.nbeads, natoms=self.natoms, open_paths=self.open_paths)
+            self.transform = nmtransform.nm_fft(nbeads=self.nbeads, natoms=self.natoms, open_paths=self.open_paths, n_threads=self.n_threads)
         elif self.transform_method == "matrix":
             self.transform = nmtransform.nm_trans(nbeads=self.nbeads, open_paths=self.open_paths)
 
         # creates arrays to store normal modes representation of the path.
-        # must do a lot of piping to create "ex post" a synchronization between the beads and the nm
+        # must do a lot of piping to create "ex post" a synchronization between the beads and the nm.
+        # the transforms write straight into the array that is being updated
         sync_q = synchronizer()
         sync_p = synchronizer()
         dself.qnm = depend_array(name="qnm",
                                  value=np.zeros((self.nbeads, 3 * self.natoms), float),
-                                 func={"q": (lambda: self.transform.b2nm(dstrip(self.beads.q)))},
+                                 func={"q": (lambda: self.transform.b2nm(dstrip(self.beads.q), out=dstrip(dd(self).qnm)))},
                                  synchro=sync_q)
         dself.pnm = depend_array(name="pnm",
                                  value=np.zeros((self.nbeads, 3 * self.natoms), float),
-                                 func={"p": (lambda: self.transform.b2nm(dstrip(self.beads.p)))},
+                                 func={"p": (lambda: self.transform.b2nm(dstrip(self.beads.p), out=dstrip(dd(self).pnm)))},
                                  synchro=sync_p)
 
         # must overwrite the functions
-        dd(self.beads).q._func = {"qnm": (lambda: self.transform.nm2b(dstrip(self.qnm)))}
-        dd(self.beads).p._func = {"pnm": (lambda: self.transform.nm2b(dstrip(self.pnm)))}
+        dd(self.beads).q.set_func({"qnm": (lambda: self.transform.nm2b(dstrip(self.qnm), out=dstrip(dd(self.beads).q)))})
+        dd(self.beads).p.set_func({"pnm": (lambda: self.transform.nm2b(dstrip(self.pnm), out=dstrip(dd(self.beads).p)))})
         dd(self.beads).q.add_synchro(sync_q)
         dd(self.beads).p.add_synchro(sync_p)
 
         # also within the "atomic" interface to beads
         for b in range(self.nbeads):
-            dd(self.beads._blist[b]).q._func = {"qnm": (lambda: self.transform.nm2b(dstrip(self.qnm)))}
-            dd(self.beads._blist[b]).p._func = {"pnm": (lambda: self.transform.nm2b(dstrip(self.pnm)))}
+            dd(self.beads._blist[b]).q.set_func({"qnm": (lambda: self.transform.nm2b(dstrip(self.qnm)))})
+            dd(self.beads._blist[b]).p.set_func({"pnm": (lambda: self.transform.nm2b(dstrip(self.pnm)))})
             dd(self.beads._blist[b]).q.add_synchro(sync_q)
             dd(self.beads._blist[b]).p.add_synchro(sync_p)
 
@@ -179,7 +188,7 @@ class NormalModes(dobject):
         # as they always get computed in the bead rep
         if not self.forces is None:
             dself.fnm = depend_array(name="fnm",
-                                     value=np.zeros((self.nbeads, 3 * self.natoms), float), func=(lambda: self.transform.b2nm(dstrip(self.forces.f))),
+                                     value=np.zeros((self.nbeads, 3 * self.natoms), float), func=(lambda: self.transform.b2nm(dstrip(self.forces.f), out=dstrip(dd(self).fnm))),
                                      dependencies=[dd(self.forces).f])
         else:  # have a fall-back plan when we don't want to initialize a force mechanism, e.g. for ring-polymer initialization
             dself.fnm = depend_array(name="fnm",
@@ -244,6 +253,16 @@ class NormalModes(dobject):
                                      value=0.0, func=self.get_vspring,
                                      dependencies=[dself.qnm, dself.omegak, dd(self.beads).m3])
 
+        # temperature-independent spring energy, the same as beads.vpath. for
+        # closed paths it is computed directly from the normal modes
+        self._eva2 = nmtransform.nm_eva(self.nbeads)**2
+        if len(self.open_paths) > 0:
+            dself.vpath = depend_value(name="vpath", func=(lambda: self.beads.vpath),
+                                       dependencies=[dd(self.beads).vpath])
+        else:
+            dself.vpath = depend_value(name="vpath", func=self.get_vpath,
+                                       dependencies=[dself.qnm, dd(self.beads).m3])
+
         # spring forces on normal modes
         dself.fspringnm = depend_array(name="fspringnm",
                                        value=np.zeros((self.nbeads, 3 * self.natoms), float),
@@ -266,6 +285,18 @@ class NormalModes(dobject):
 
         return 0.5 * (self.beads.m3 * self.omegak[:, np.newaxis]**2 * self.qnm**2).sum()
 
+    def get_vpath(self):
+        """Returns the spring energy calculated in NM representation, without
+        the omegan**2 factor.
+
+        As the transformation to normal modes is orthogonal, this is the sum
+        of the harmonic energies of the modes, with the eigenvalues of the
+        free ring polymer as frequencies.
+        """
+
+        qnm = dstrip(self.qnm)
+        return 0.5 * np.dot(self._eva2, np.dot(qnm * qnm, dstrip(self.beads.m3)[0]))
+
     def get_omegan(self):
         """Returns the effective vibrational frequency for the interaction
         between replicas.
@@ -463,50 +494,71 @@ class NormalModes(dobject):
         Note that the propagator works in mass scaled coordinates, so that the
         propagator matrix can be determined independently from the particular
         atom masses, and so the same propagator will work for all the atoms in
-        the system. All the ring polymers are propagated at the same time by a
-        matrix multiplication.
+        the system. All the modes of all the ring polymers are propagated at
+        the same time, broadcasting the elements of the propagator matrices
+        over the atoms.
 
         Also note that the centroid coordinate is propagated in qcstep, so is
-        not altered here.
+        not altered here. pnm and qnm are propagated in place, and then
+        flagged as manually updated.
         """
 
         if self.nbeads == 1:
-            pass
-        else:
-            pq = np.zeros((2, self.natoms * 3), float)
-            sm = dstrip(self.beads.sm3)
-            prop_pq = dstrip(self.prop_pq)
+            return
+
+        pnm = dstrip(self.pnm)
+        qnm = dstrip(self.qnm)
+        self.free_propagate(pnm, qnm)
+        dd(self).pnm.update_man()
+        dd(self).qnm.update_man()
+
+    def free_propagate(self, pnm, qnm):
+        """Applies the free ring polymer propagator in place to raw arrays.
+
+        Does the same as free_qstep, but on plain (nbeads, 3*natoms) arrays of
+        normal mode momenta and positions rather than on pnm and qnm, so that
+        it can be used by integrators that work outside the depend machinery.
+
+        Args:
+           pnm: The normal mode momenta.
+           qnm: The normal mode positions.
+        """
+
+        if self.nbeads == 1:
+            return
+
+        sm = dstrip(self.beads.sm3)
+        prop_pq = dstrip(self.prop_pq)
+        pnm /= sm
+        qnm *= sm
+
+        if len(self.open_paths) > 0:
+            # open paths are propagated separately, from the initial values
+            ocols = nmtransform.open_columns(self.open_paths)
             o_prop_pq = dstrip(self.o_prop_pq)
-            pnm = dstrip(self.pnm) / sm
-            qnm = dstrip(self.qnm) * sm
-
-            for k in range(1, self.nbeads):
-                pq[0, :] = pnm[k]
-                pq[1, :] = qnm[k]
-                pq = np.dot(prop_pq[k], pq)
-                qnm[k] = pq[1, :]
-                pnm[k] = pq[0, :]
-
-            pq = np.zeros(2)
-            for j in self.open_paths:
-                for a in xrange(3 * j, 3 * (j + 1)):
-                    for k in xrange(1, self.nbeads):
-                        pq[0] = self.pnm[k, a] / sm[k, a]
-                        pq[1] = self.qnm[k, a] * sm[k, a]
-                        pq = np.dot(o_prop_pq[k], pq)
-                        qnm[k, a] = pq[1]
-                        pnm[k, a] = pq[0]
-            self.pnm = pnm * sm
-            self.qnm = qnm / sm
-            # pq = np.zeros((2,self.natoms*3),float)
-            # sm = dstrip(self.beads.sm3)[0]
-            # prop_pq = dstrip(self.prop_pq)
-            # for k in range(1,self.nbeads):
-            #   pq[0,:] = dstrip(self.pnm)[k]/sm
-            #   pq[1,:] = dstrip(self.qnm)[k]*sm
-            #   pq = np.dot(prop_pq[k],pq)
-            #   self.qnm[k] = pq[1,:]/sm
-            #   self.pnm[k] = pq[0,:]*sm
+            opnm = pnm[1:, ocols]
+            oqnm = qnm[1:, ocols]
+
+        # all the non-centroid modes are propagated at once, using two work
+        # arrays that are kept between the steps. the diagonal elements of
+        # the propagator are the same, which saves one product.
+        pk = pnm[1:]
+        qk = qnm[1:]
+        if self._free_work is None or self._free_work[0].shape != qk.shape:
+            self._free_work = (np.empty(qk.shape), np.empty(qk.shape))
+        qnew, work = self._free_work
+        np.multiply(qk, prop_pq[1:, 0, 0, np.newaxis], out=qnew)
+        qnew += np.multiply(pk, prop_pq[1:, 1, 0, np.newaxis], out=work)
+        pk *= prop_pq[1:, 0, 0, np.newaxis]
+        pk += np.multiply(qk, prop_pq[1:, 0, 1, np.newaxis], out=work)
+        qk[:] = qnew
+
+        if len(self.open_paths) > 0:
+            pnm[1:, ocols] = opnm * o_prop_pq[1:, 0, 0, np.newaxis] + oqnm * o_prop_pq[1:, 0, 1, np.newaxis]
+            qnm[1:, ocols] = opnm * o_prop_pq[1:, 1, 0, np.newaxis] + oqnm * o_prop_pq[1:, 1, 1, np.newaxis]
+
+        pnm *= sm
+        qnm /= sm
 
     def get_kins(self):
         """Gets the MD kinetic energy for all the normal modes.
@@ -515,17 +567,12 @@ class NormalModes(dobject):
            A list of the kinetic energy for each NM.
         """
 
-        kmd = np.zeros(self.nbeads, float)
         sm = dstrip(self.beads.sm3[0])
-        pnm = dstrip(self.pnm)
         nmf = dstrip(self.nm_factor)
 
         # computes the MD ke in the normal modes representation, to properly account for CMD mass scaling
-        for b in range(self.nbeads):
-            sp = pnm[b] / sm                      # mass-scaled momentum of b-th NM
-            kmd[b] = np.dot(sp, sp) * 0.5 / nmf[b]   # include the partially adiabatic CMD mass scaling
-
-        return kmd
+        sp = dstrip(self.pnm) / sm   # mass-scaled momenta of all the NMs
+        return np.einsum("ij,ij->i", sp, sp) * 0.5 / nmf   # include the partially adiabatic CMD mass scaling
 
     def get_kin(self):
         """Gets the total MD kinetic energy.
@@ -549,19 +596,14 @@ class NormalModes(dobject):
            The sum of the MD kinetic stress tensor contributions from each NM.
         """
 
-        kmd = np.zeros((3, 3), float)
         sm = dstrip(self.beads.sm3[0])
-        pnm = dstrip(self.pnm)
         nmf = dstrip(self.nm_factor)
 
-        for b in range(self.nbeads):
-            sp = pnm[b] / sm  # mass-scaled momentum of b-th NM
-
-            for i in range(3):
-                for j in range(3):
-                    # computes the outer product of the p of various normal modes
-                    # singling out Cartesian components to build the tensor
-                    # also takes care of the possibility of having non-RPMD masses
-                    kmd[i, j] += np.dot(sp[i:3 * self.natoms:3], sp[j:3 * self.natoms:3]) / nmf[b]
+        sp = dstrip(self.pnm) / sm  # mass-scaled momenta of all the NMs
 
-        return kmd
+        # sums the outer products of the p of all the normal modes and atoms,
+        # treating them as a list of 3-vectors so that the tensor comes from a
+        # single (3 x N) by (N x 3) product. also takes care of the possibility
+        # of having non-RPMD masses
+        spw = sp / nmf[:, np.newaxis]
+        return np.dot(sp.reshape((-1, 3)).T, spw.reshape((-1, 3)))
@@ -11,6 +11,7 @@ and the restart files.
 
 import os
 import time
+from copy import copy
 
 import numpy as np
 
@@ -20,14 +21,95 @@ from ipi.utils.softexit import softexit
 from ipi.utils.depend import *
 import ipi.utils.io as io
 from ipi.utils.io.inputs.io_xml import *
-from ipi.utils.io import open_backup
-from ipi.engine.properties import getkey
+from ipi.utils.io import open_backup, backup_file
+from ipi.utils.io.io_properties import print_properties_header, print_properties_record, property_size, is_binary_properties, PropertyFile
+from ipi.utils.inputvalue import ArraySidecar
+from ipi.engine.properties import getkey, getall
 from ipi.engine.atoms import *
+from ipi.engine.beads import Beads
 from ipi.engine.cell import *
+from ipi.engine.snapshot import StateSnapshot
+from ipi.utils.threadpool import SerialQueue
 
 __all__ = ['PropertyOutput', 'TrajectoryOutput', 'CheckpointOutput']
 
 
+# maximum number of frames waiting to be written by the background writer.
+# when it is full the simulation waits, so that a slow disk cannot fill the memory.
+OUTPUTQUEUE = 64
+
+# background thread shared by all the outputs with background=True. frames
+# are written in the order they are submitted, so each file stays in order.
+outwriter = SerialQueue(name="output_writer", maxsize=OUTPUTQUEUE)
+
+# size in bytes of the buffers of the property and trajectory streams, so that
+# unless the durability policy asks otherwise data reach the disk in large blocks.
+OUTPUTBUFFER = 1 << 20
+
+# the ways in which the outputs push the data they write to disk: "none" leaves
+# them in the stream buffers until these are full or closed, "flush" hands them
+# to the operating system, "fsync" also waits for them to be written to disk,
+# and "periodic" does the same, but at most once every sync_interval seconds.
+DURABILITY = ["none", "flush", "fsync", "periodic"]
+
+
+def _sync_due(out):
+    """Counts one write to the stream(s) of the output object out, and tells
+    whether they should be synced after it, as required by its durability
+    policy and by its flush and sync_interval attributes."""
+
+    if out.durability == "none":
+        return False
+    elif out.durability == "periodic":
+        now = time.time()
+        if now - out.tsync < out.sync_interval:
+            return False
+        out.tsync = now
+        return True
+
+    out.nout += 1
+    if out.flush > 0 and out.nout >= out.flush:
+        out.nout = 0
+        return True
+    return False
+
+
+def _sync_stream(stream, durability):
+    """Pushes the data written to stream to the operating system, and to the
+    disk unless durability is "flush"."""
+
+    stream.flush()
+    if durability != "flush":
+        os.fsync(stream.fileno())  # we REALLY want to print out! pretty please OS let us do it.
+
+
+def _fsync_dir(filename):
+    """Syncs the directory containing filename, so that a file that has just
+    been renamed to filename keeps its new name in a crash."""
+
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(filename)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass  # some file systems do not allow syncing directories
+    finally:
+        os.close(fd)
+
+
+def _drain_writer(out):
+    """Waits for the background writer to write all the pending frames, so
+    that the stream(s) of the output object out can be closed safely."""
+
+    try:
+        outwriter.drain()
+    except Exception as e:
+        # This gets called on softexit. We want to carry on to shut down as cleanly as possible
+        warning("Exception in the background output writer for " + str(out.filename) + ": " + str(e), verbosity.low)
+
+
 class PropertyOutput(dobject):
     """Class dealing with outputting a set of properties to file.
 
@@ -41,11 +123,22 @@ class PropertyOutput(dobject):
           data to file.
        flush: How often we should flush to disk.
        nout: Number of steps since data was last flushed.
+       durability: How the data are pushed to disk, one of DURABILITY.
+       sync_interval: The minimum number of seconds between two syncs, if
+          durability is "periodic".
+       tsync: The time of the latest periodic sync.
+       format: Either "text", or "binary" to write fixed-width records of
+          float64 values, described by a header written with the first frame.
+       needheader: True if the header of a binary file is still to be written.
+       needcheck: True if a binary file is appended to, and its header is
+          still to be checked against the properties that are output.
        out: The output stream on which to output the properties.
+       background: If True, the properties are formatted and written to disk by
+          a background thread, so that the simulation does not wait for them.
        system: The system object to get the data to be output from.
     """
 
-    def __init__(self, filename="out", stride=1, flush=1, outlist=None):
+    def __init__(self, filename="out", stride=1, flush=1, outlist=None, background=False, durability="fsync", sync_interval=10.0, format="text"):
         """Initializes a property output stream opening the corresponding
         file name.
 
@@ -57,6 +150,11 @@ class PropertyOutput(dobject):
               outputting the data to file.
            flush: Number of writes to file between flushing data.
            outlist: A list of all the properties that should be output.
+           background: If True, formatting and writing are done by a background
+              thread.
+           durability: How the data are pushed to disk, one of DURABILITY.
+           sync_interval: Seconds between two syncs, if durability is "periodic".
+           format: The format of the file, "text" or "binary".
         """
 
         if outlist is None:
@@ -66,7 +164,14 @@ class PropertyOutput(dobject):
         self.stride = stride
         self.flush = flush
         self.nout = 0
+        self.durability = durability
+        self.sync_interval = sync_interval
+        self.tsync = 0.0
+        self.format = format
+        self.needheader = False
+        self.needcheck = False
         self.out = None
+        self.background = background
 
     def bind(self, system):
         """Binds output proxy to System object.
@@ -100,7 +205,17 @@ class PropertyOutput(dobject):
         else:
             mode = "a"
 
-        self.out = open_backup(self.filename, mode)
+        if self.format == "binary":
+            self.out = open_backup(self.filename, mode + "b", OUTPUTBUFFER)
+            self.tsync = time.time()
+            # the header needs the size of the properties, known at the first
+            # write. a file that is appended to has one, unless it is empty
+            self.needheader = is_start or os.path.getsize(self.filename) == 0
+            self.needcheck = not self.needheader
+            return
+
+        self.out = open_backup(self.filename, mode, OUTPUTBUFFER)
+        self.tsync = time.time()
 
         # print nice header if information is available on the properties
         if is_start:
@@ -127,8 +242,10 @@ class PropertyOutput(dobject):
         self.close_stream()
 
     def close_stream(self):
-        """Closes the output stream."""
+        """Closes the output stream, once all the pending data are written."""
 
+        if self.background:
+            _drain_writer(self)
         self.out.close()
 
     def write(self):
@@ -136,6 +253,8 @@ class PropertyOutput(dobject):
 
         Note that properties are outputted using the same format as for the
         output to the xml checkpoint files, as specified in io_xml.
+        The values are computed here, and copied if the output is done in
+        the background.
 
         Raises:
            KeyError: Raised if one of the properties specified in the output list
@@ -146,7 +265,8 @@ class PropertyOutput(dobject):
 
         if not (self.system.simul.step + 1) % self.stride == 0:
             return
-        self.out.write("  ")
+
+        values = []
         for what in self.outlist:
             try:
                 quantity, dimension, unit = self.system.properties[what]
@@ -154,19 +274,88 @@ class PropertyOutput(dobject):
                     quantity = unit_to_user(dimension, unit, quantity)
             except KeyError:
                 raise KeyError(what + " is not a recognized property")
-            if not hasattr(quantity, "__len__"):
-                self.out.write(write_type(float, quantity) + "   ")
-            else:
-                for el in quantity:
-                    self.out.write(write_type(float, el) + " ")
+            if self.background and hasattr(quantity, "__len__"):
+                quantity = np.array(quantity)
+            values.append(quantity)
+
+        if self.background:
+            outwriter.submit(self.write_values, values=values)
+        else:
+            self.write_values(values)
+
+    def write_values(self, values):
+        """Writes out one line with the values of the properties.
 
-        self.out.write("\n")
+        Args:
+           values: A list with the value of each of the properties in outlist.
+        """
+
+        if self.out.closed:
+            return
+        if self.format == "binary":
+            if self.needheader:
+                print_properties_header(self.describe(values), self.out)
+                self.needheader = False
+            elif self.needcheck:
+                self.check_header(values)
+                self.needcheck = False
+            print_properties_record(values, self.out)
+        else:
+            self.out.write("  ")
+            for quantity in values:
+                if not hasattr(quantity, "__len__"):
+                    self.out.write(write_type(float, quantity) + "   ")
+                else:
+                    for el in quantity:
+                        self.out.write(write_type(float, el) + " ")
+
+            self.out.write("\n")
+
+        if _sync_due(self):
+            _sync_stream(self.out, self.durability)
+
+    def check_header(self, values):
+        """Checks that the binary file that is appended to has the columns of
+        the properties in outlist.
+
+        Args:
+           values: A list with the value of each of the properties in outlist.
+
+        Raises:
+           ValueError: Raised if the file is not a binary property file, or if
+              its header describes different properties, or properties of a
+              different size.
+        """
+
+        if not is_binary_properties(self.filename):
+            raise ValueError("Cannot append binary properties to " + self.filename + ", which is not a binary property file")
+        columns = [(p["name"], p["size"]) for p in PropertyFile(self.filename).properties]
+        if columns != [(p["name"], p["size"]) for p in self.describe(values)]:
+            raise ValueError("The columns of the binary property file " + self.filename + " do not match the properties to be output. "
+                             "Move the file away to restart with different properties.")
+
+    def describe(self, values):
+        """Describes the properties in outlist, for the header of a binary file.
+
+        Args:
+           values: A list with the value of each of the properties in outlist,
+              used to get the number of columns each of them takes.
+
+        Returns:
+           A list with a dictionary for each property, giving its name,
+           dimension, unit, size and help string.
+        """
 
-        self.nout += 1
-        if self.flush > 0 and self.nout >= self.flush:
-            self.out.flush()
-            os.fsync(self.out)  # we REALLY want to print out! pretty please OS let us do it.
-            self.nout = 0
+        properties = []
+        for what, quantity in zip(self.outlist, values):
+            prop = self.system.properties.property_dict[getkey(what)]
+            dimension = prop.get("dimension", "")
+            unit = ""
+            if dimension != "":
+                unit = getall(what)[1] or "atomic_unit"
+            properties.append({"name": str(what), "dimension": dimension, "unit": unit,
+                               "size": property_size(quantity), "help": prop.get("help", "")})
+        return properties
 
 
 class TrajectoryOutput(dobject):
@@ -185,12 +374,27 @@ class TrajectoryOutput(dobject):
        out: The output stream on which to output the trajectories.
        flush: How often we should flush to disk.
        nout: Number of steps since data was last flushed.
+       durability: How the data are pushed to disk, one of DURABILITY.
+       sync_interval: The minimum number of seconds between two syncs, if
+          durability is "periodic".
+       tsync: The time of the latest periodic sync.
        ibead: Index of the replica to print the trajectory of.
        cell_units: The units that the cell parameters are given in.
+       background: If True, the frames are formatted and written to disk by
+          a background thread, so that the simulation does not wait for them.
+       compression: One of io.COMPRESSION. Compressed files get the extension
+          of the compression appended to their name, and are always written
+          by the background thread, that also does the compression.
+       precision: The resolution of the data in the output units, for the
+          lossy "fixed" format. Must be given for that format, as a suitable
+          value depends on what is output.
+       bundle: If True, the replicas of a per-bead trajectory are all written
+          to a single file, each frame holding the data of all the beads.
        system: The System object to get the data to be output from.
     """
 
-    def __init__(self, filename="out", stride=1, flush=1, what="", format="xyz", cell_units="atomic_unit", ibead=-1):
+    def __init__(self, filename="out", stride=1, flush=1, what="", format="xyz", cell_units="atomic_unit", ibead=-1, background=False, durability="fsync", sync_interval=10.0,
+                 compression="none", precision=0.0, bundle=False):
         """ Initializes a property output stream opening the corresponding
         file name.
 
@@ -206,6 +410,14 @@ class TrajectoryOutput(dobject):
            cell_units: A string specifying the units that the cell parameters are
               given in.
            ibead: If positive, prints out only the selected bead. If negative, prints out one file per bead.
+           background: If True, formatting and writing are done by a background
+              thread.
+           durability: How the data are pushed to disk, one of DURABILITY.
+           sync_interval: Seconds between two syncs, if durability is "periodic".
+           compression: The compression of the output files.
+           precision: The resolution of the data for the "fixed" format.
+              Must be positive if the format is "fixed".
+           bundle: If True, all the beads are written to a single file.
         """
 
         self.filename = filename
@@ -217,6 +429,16 @@ class TrajectoryOutput(dobject):
         self.cell_units = cell_units
         self.out = None
         self.nout = 0
+        self.durability = durability
+        self.sync_interval = sync_interval
+        self.tsync = 0.0
+        self.background = background
+        self.compression = compression
+        self.precision = precision
+        self.bundle = bundle
+
+        if self.format == "fixed" and not self.precision > 0:
+            raise ValueError("The precision of the fixed format trajectory " + self.filename + " must be given, in the units of the output.")
 
     def bind(self, system):
         """Binds output proxy to System object.
@@ -252,7 +474,11 @@ class TrajectoryOutput(dobject):
         # including underscpre
         fmt_bead = "{0:0" + str(int(1 + np.floor(np.log(self.system.beads.nbeads) / np.log(10)))) + "d}"
 
-        if getkey(self.what) in ["positions", "velocities", "forces", "extras", "forces_sc", "momenta"]:
+        ext = ""
+        if self.compression != "none":
+            ext = "." + self.compression
+
+        if getkey(self.what) in ["positions", "velocities", "forces", "extras", "forces_sc", "momenta"] and not self.is_bundle():
 
             # must write out trajectories for each bead, so must create b streams
 
@@ -266,7 +492,7 @@ class TrajectoryOutput(dobject):
             self.out = []
             for b in range(self.system.beads.nbeads):
                 if (self.ibead < 0) or (self.ibead == b):
-                    self.out.append(open_backup(fmt_fn.format(b), mode))
+                    self.out.append(open_backup(fmt_fn.format(b) + ext, mode, OUTPUTBUFFER, self.compression))
                 else:
                     # Create null outputs if a single bead output is chosen.
                     self.out.append(None)
@@ -274,8 +500,12 @@ class TrajectoryOutput(dobject):
         else:
 
             # open one file
-            filename = self.filename + "." + self.format
-            self.out = open_backup(filename, mode)
+            if getkey(self.what) == "extras":
+                filename = self.filename + ext
+            else:
+                filename = self.filename + "." + self.format + ext
+            self.out = open_backup(filename, mode, OUTPUTBUFFER, self.compression)
+        self.tsync = time.time()
 
     def softexit(self):
         """Emergency cleanup if i-pi wants to exit"""
@@ -283,8 +513,10 @@ class TrajectoryOutput(dobject):
         self.close_stream()
 
     def close_stream(self):
-        """Closes the output stream."""
+        """Closes the output stream, once all the pending frames are written."""
 
+        if self.in_background():
+            _drain_writer(self)
         try:
             if hasattr(self.out, "__getitem__"):
                 for o in self.out:
@@ -295,6 +527,16 @@ class TrajectoryOutput(dobject):
                     # This gets called on softexit. We want to carry on to shut down as cleanly as possible
             warning("Exception while closing output stream " + str(self.out), verbosity.low)
 
+    def is_bundle(self):
+        """Tells whether all the beads of the trajectory go to a single file."""
+
+        return self.bundle and self.ibead < 0 and getkey(self.what) in ["positions", "velocities", "forces", "extras", "forces_sc", "momenta"]
+
+    def in_background(self):
+        """Tells whether the frames are written by the background thread."""
+
+        return self.background or self.compression != "none"
+
     def write(self):
         """Writes out the required trajectories."""
 
@@ -302,28 +544,50 @@ class TrajectoryOutput(dobject):
         if not (self.system.simul.step + 1) % self.stride == 0:
             return
 
-        doflush = False
-        self.nout += 1
-        if self.flush > 0 and self.nout >= self.flush:
-            doflush = True
-            self.nout = 0
+        doflush = _sync_due(self)
 
         data, dimension, units = self.system.trajs[self.what]  # gets the trajectory data that must be printed
+        if self.in_background():
+            # takes a copy of everything that is needed to print the frame, as
+            # the system will have moved on by the time it is written
+            if isinstance(data, np.ndarray):
+                data = np.array(data)
+            else:
+                data = list(data)
+            outwriter.submit(self.write_frame, data=data, dimension=dimension, units=units, flush=doflush,
+                             step=self.system.simul.step, names=dstrip(self.system.beads.names).copy(), h=dstrip(self.system.cell.h).copy())
+        else:
+            self.write_frame(data, dimension, units, flush=doflush)
+
+    def write_frame(self, data, dimension="", units="automatic", flush=True, step=None, names=None, h=None):
+        """Writes out one frame of the trajectory to the output stream(s).
+
+        Args:
+           data: The trajectory data, as returned by the Trajectories object.
+           dimension: The dimension of the data.
+           units: The units in which the data are output.
+           flush: A boolean which specifies whether to flush the output buffer
+              after writing or not.
+           step, names, h: The simulation step, the atom names and the cell
+              vectors for the frame. If None, those of the system are used.
+        """
+
         # quick-and-dirty way to check if a trajectory is "global" or per-bead
         # Checks to see if there is a list of files or just a single file.
         if hasattr(self.out, "__getitem__"):
             if self.ibead < 0:
                 for b in range(len(self.out)):
-                    self.write_traj(data, self.what, self.out[b], b, format=self.format, dimension=dimension, units=units, cell_units=self.cell_units, flush=doflush)
+                    self.write_traj(data, self.what, self.out[b], b, format=self.format, dimension=dimension, units=units, cell_units=self.cell_units, flush=flush, step=step, names=names, h=h)
             elif self.ibead < len(self.out):
-                self.write_traj(data, self.what, self.out[self.ibead], self.ibead, format=self.format, dimension=dimension, units=units, cell_units=self.cell_units, flush=doflush)
+                self.write_traj(data, self.what, self.out[self.ibead], self.ibead, format=self.format, dimension=dimension, units=units, cell_units=self.cell_units, flush=flush, step=step, names=names, h=h)
             else:
                 raise ValueError("Selected bead index " + str(self.ibead) + " does not exist for trajectory " + self.what)
+        elif self.is_bundle():
+            self.write_path(data, self.what, self.out, format=self.format, dimension=dimension, units=units, cell_units=self.cell_units, flush=flush, step=step, names=names, h=h)
         else:
-            self.write_traj(data, getkey(self.what), self.out, b=0, format=self.format, dimension=dimension, units=units, cell_units=self.cell_units, flush=doflush)
-        
+            self.write_traj(data, getkey(self.what), self.out, b=0, format=self.format, dimension=dimension, units=units, cell_units=self.cell_units, flush=flush, step=step, names=names, h=h)
 
-    def write_traj(self, data, what, stream, b=0, format="xyz", dimension="", units="automatic", cell_units="automatic", flush=True):
+    def write_traj(self, data, what, stream, b=0, format="xyz", dimension="", units="automatic", cell_units="automatic", flush=True, step=None, names=None, h=None):
         """Prints out a frame of a trajectory for the specified quantity and bead.
 
         Args:
@@ -334,35 +598,86 @@ class TrajectoryOutput(dobject):
            cell_units: The units used to specify the cell parameters.
            flush: A boolean which specifies whether to flush the output buffer
               after each write to file or not.
+           step, names, h: The simulation step, the atom names and the cell
+              vectors for the frame. If None, those of the system are used.
         """
 
+        if stream.closed:
+            return
+        if step is None:
+            step = self.system.simul.step
+        if names is None:
+            names = self.system.beads.names
+        if h is None:
+            h = self.system.cell.h
+
         key = getkey(what)
         if key in ["extras"]:
-            stream.write(" #*EXTRAS*# Step:  %10d  Bead:  %5d  \n" % (self.system.simul.step + 1, b))
+            stream.write(" #*EXTRAS*# Step:  %10d  Bead:  %5d  \n" % (step + 1, b))
             stream.write(data[b])
             stream.write("\n")
             if flush:
-                stream.flush()
-                os.fsync(stream)
+                _sync_stream(stream, self.durability)
             return
         elif getkey(what) in ["positions", "velocities", "forces", "forces_sc", "momenta"]:
             fatom = Atoms(self.system.beads.natoms)
-            fatom.names[:] = self.system.beads.names
+            fatom.names[:] = names
             fatom.q[:] = data[b]
         else:
             fatom = Atoms(self.system.beads.natoms)
-            fatom.names[:] = self.system.beads.names
+            fatom.names[:] = names
             fatom.q[:] = data
 
         fcell = Cell()
-        fcell.h = self.system.cell.h
+        fcell.h = h
 
         if units == "": units = "automatic"
         if cell_units == "": cell_units = "automatic"
-        io.print_file(format, fatom, fcell, stream, title=("Step:  %10d  Bead:   %5d " % (self.system.simul.step + 1, b)), key=key, dimension=dimension, units=units, cell_units=cell_units)
+        kwargs = {}
+        if format == "fixed":
+            kwargs["precision"] = self.precision
+        io.print_file(format, fatom, fcell, stream, title=("Step:  %10d  Bead:   %5d " % (step + 1, b)), key=key, dimension=dimension, units=units, cell_units=cell_units, **kwargs)
         if flush:
-            stream.flush()
-            os.fsync(stream)
+            _sync_stream(stream, self.durability)
+
+    def write_path(self, data, what, stream, format="xyz", dimension="", units="automatic", cell_units="automatic", flush=True, step=None, names=None, h=None):
+        """Prints out a frame of a per-bead trajectory for all the beads at once.
+
+        Args:
+           what: A string specifying what to print.
+           stream: A reference to the stream on which data will be printed.
+           format: The output file format.
+           cell_units: The units used to specify the cell parameters.
+           flush: A boolean which specifies whether to flush the output buffer
+              after writing or not.
+           step, names, h: The simulation step, the atom names and the cell
+              vectors for the frame. If None, those of the system are used.
+        """
+
+        if stream.closed:
+            return
+        if step is None:
+            step = self.system.simul.step
+        if names is None:
+            names = self.system.beads.names
+        if h is None:
+            h = self.system.cell.h
+
+        key = getkey(what)
+        if key in ["extras"]:
+            stream.write("".join(" #*EXTRAS*# Step:  %10d  Bead:  %5d  \n%s\n" % (step + 1, b, data[b]) for b in range(len(data))))
+        else:
+            fbeads = Beads(self.system.beads.natoms, self.system.beads.nbeads)
+            fbeads.names[:] = names
+            fbeads.q[:] = data
+            fcell = Cell()
+            fcell.h = h
+
+            if units == "": units = "automatic"
+            if cell_units == "": cell_units = "automatic"
+            io.print_file_path(format, fbeads, fcell, stream, title=("Step:  %10d " % (step + 1)), key=key, dimension=dimension, units=units, cell_units=cell_units)
+        if flush:
+            _sync_stream(stream, self.durability)
 
 
 class CheckpointOutput(dobject):
@@ -378,11 +693,29 @@ class CheckpointOutput(dobject):
        overwrite: If True, the checkpoint file is overwritten at each output.
           If False, will output to 'filename_step'. Note that no check is done
           on whether 'filename_step' exists already.
+       format: Either "xml", or "npz" to save the large arrays in a binary
+          file named as the checkpoint file with the step and a '.npz'
+          extension added.
+       durability: How the checkpoint is pushed to disk, one of DURABILITY.
+          Checkpoints are always written to a temporary file that then replaces
+          the previous one, so that a crash never leaves a truncated checkpoint.
+          With "fsync" the data reach the disk before the replacement, with
+          "periodic" only if sync_interval seconds have passed since the
+          latest sync.
+       sync_interval: The minimum number of seconds between two syncs, if
+          durability is "periodic".
+       tsync: The time of the latest periodic sync.
        simul: The simulation object to get the data to be output from.
        status: An input simulation object used to write out the checkpoint file.
+       snap: A StateSnapshot object holding a copy of the state of the systems,
+          taken by snapshot(). None until the first snapshot is taken.
+       snapstep: The simulation step at which the latest snapshot was taken.
+       _sidecar: The name of the binary file referred to by the latest
+          checkpoint file, if format is "npz", and if that file is replaced
+          by the next checkpoint.
     """
 
-    def __init__(self, filename="restart", stride=1000, overwrite=True, step=0):
+    def __init__(self, filename="restart", stride=1000, overwrite=True, step=0, format="xml", durability="fsync", sync_interval=10.0):
         """Initializes a checkpoint output proxy.
 
         Args:
@@ -393,14 +726,26 @@ class CheckpointOutput(dobject):
               If False, will output to 'filename_step'. Note that no check is done
               on whether 'filename_step' exists already.
            step: The number of checkpoint files that have been created so far.
+           format: The checkpoint format, "xml" or "npz".
+           durability: How the checkpoint is pushed to disk, one of DURABILITY.
+           sync_interval: Seconds between two syncs, if durability is "periodic".
         """
 
         self.filename = filename
         self.step = step
         self.stride = stride
         self.overwrite = overwrite
+        self.format = format
+        self.durability = durability
+        self.sync_interval = sync_interval
+        self.tsync = 0.0
+        self.nout = 0
+        self.flush = 1
         self._storing = False
         self._continued = False
+        self.snap = None
+        self.snapstep = None
+        self._sidecar = None
 
     def bind(self, simul):
         """Binds output proxy to simulation object.
@@ -427,6 +772,47 @@ class CheckpointOutput(dobject):
         self.status.store(self.simul)
         self._storing = False
 
+    def snapshot(self):
+        """Takes a lightweight copy of the state of the simulation.
+
+        Cheaper alternative to store(), to be called at the beginning of every
+        step: only the raw state of the systems is copied, and it is converted
+        to the input representation by restore() only if a checkpoint
+        corresponding to the beginning of the step must actually be written.
+        """
+
+        if self.snap is None:
+            # objects that hold no state of their own, or that are not restarted
+            from ipi.engine.forcefields import ForceField
+            from ipi.engine.forces import Forces, ForceComponent, ScaledForceComponent, ForceBead
+            from ipi.engine.properties import Properties, Trajectories
+            from ipi.engine.initializer import Initializer, InitBase
+            skip = (type(self.simul), ForceField, Forces, ForceComponent, ScaledForceComponent, ForceBead,
+                    Properties, Trajectories, Initializer, InitBase,
+                    PropertyOutput, TrajectoryOutput, CheckpointOutput)
+            self.snap = StateSnapshot([self.simul.prng, self.simul.syslist, self.simul.smotion], skip=skip)
+
+        self.snap.take()
+        self.snapstep = self.simul.step
+
+    def restore(self):
+        """Stores the simulation status at the latest snapshot.
+
+        The snapshot is restored into copies of the systems, rather than into
+        the systems themselves, so that this can be called while the
+        simulation is still running on other threads.
+        """
+
+        if self.snap is None or self.snap.taken == 0:
+            return
+
+        simul = copy(self.simul)
+        simul.prng, simul.syslist, simul.smotion = self.snap.copies()
+        self._storing = True
+        self.status.store(simul)
+        self._storing = False
+        self.status.step.store(self.snapstep)
+
     def write(self, store=True):
         """Writes out the required trajectories.
 
@@ -451,15 +837,12 @@ class CheckpointOutput(dobject):
         if not (self.simul.step + 1) % self.stride == 0:
             return
 
-        # function to use to open files
-        open_function = open_backup
-
         if self.overwrite:
             filename = self.filename
-            if self._continued:
-                open_function = open
         else:
             filename = self.filename + "_" + str(self.step)
+        # do not back up the files written by this run
+        backup = not (self.overwrite and self._continued)
 
         # Advance the step counter before saving, so next time the correct index will be loaded.
         if store:
@@ -467,8 +850,52 @@ class CheckpointOutput(dobject):
             self.store()
             self.status.step.store(self.simul.step+1)
 
-        with open_function(filename, "w") as check_file:
-            check_file.write(self.status.write(name="simulation"))
+        if self.format == "npz":
+            # the arrays are written first, so that the xml never refers to
+            # missing data, and to a new file, so that the previous xml keeps
+            # referring to its own arrays until it has been replaced
+            with ArraySidecar(filename + "_" + str(self.status.step.fetch()) + ".npz") as sidecar:
+                text = self.status.write(name="simulation")
+            sync = _sync_due(self)
+            self.write_file(sidecar.filename, sidecar.save, "wb", backup, sync)
+        else:
+            text = self.status.write(name="simulation")
+            sync = _sync_due(self)
+
+        self.write_file(filename, lambda check_file: check_file.write(text), "w", backup, sync)
+
+        if self.format == "npz" and self.overwrite:
+            # the arrays of the checkpoint that has just been replaced
+            if self._sidecar is not None and self._sidecar != sidecar.filename and os.path.exists(self._sidecar):
+                os.remove(self._sidecar)
+            self._sidecar = sidecar.filename
 
-        # Do not use backed up file open on subsequent writes.
+        # Do not back up the checkpoint on subsequent writes.
         self._continued = True
+
+    def write_file(self, filename, dump, mode, backup, sync):
+        """Atomically replaces a file with new content.
+
+        The content is written to a temporary file, which is then renamed, so
+        that filename always holds either the old or the new content in full.
+
+        Args:
+           filename: The name of the file to be written.
+           dump: A function that writes the content to the file object it is
+              given.
+           mode: The mode the temporary file is opened with.
+           backup: If True, an existing file is backed up rather than replaced.
+           sync: If True, the content is pushed to disk before the renaming,
+              as specified by the durability policy.
+        """
+
+        tmpname = filename + ".tmp"
+        with open(tmpname, mode) as tmp_file:
+            dump(tmp_file)
+            if sync:
+                _sync_stream(tmp_file, self.durability)
+        if backup:
+            backup_file(filename)
+        os.rename(tmpname, filename)
+        if sync and self.durability != "flush":
+            _fsync_dir(filename)
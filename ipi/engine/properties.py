@@ -24,7 +24,7 @@ from ipi.engine.ensembles import *
 from ipi.engine.forces import *
 
 
-__all__ = ['Properties', 'Trajectories', 'getkey', 'getall', 'help_latex']
+__all__ = ['Properties', 'Trajectories', 'StepCache', 'AtomSelection', 'getkey', 'getall', 'help_latex']
 
 
 def getkey(pstring):
@@ -92,6 +92,154 @@ def getall(pstring):
     return (pstring, unit, arglist, kwarglist)
 
 
+def _scaled_path(q, qc, i, scalefactor):
+    """Returns the bead positions with the path of one atom scaled towards
+    its centroid.
+
+    Used by the scaled-coordinates isotope estimators, which evaluate the
+    forces on one such path for each atom through ForceBatch.run.
+
+    Args:
+       q: The bead positions.
+       qc: The centroid positions.
+       i: The index of the atom whose path is scaled.
+       scalefactor: The factor by which the path of atom i is scaled.
+
+    Returns:
+       A copy of q, in which the positions of atom i are scaled.
+    """
+
+    dq = q.copy()
+    dq[:, 3 * i:3 * (i + 1)] = qc[3 * i:3 * (i + 1)] * (1.0 - scalefactor) + scalefactor * q[:, 3 * i:3 * (i + 1)]
+    return dq
+
+
+class StepCache(object):
+    """Keeps the values of the properties computed during a single step.
+
+    Outputs often ask for the same property more than once in a step, e.g. in
+    different files or with different units. The values are stored in atomic
+    units, keyed on the name of the property and on its arguments, and are
+    discarded as soon as a value is requested for a different step. The
+    parsed output strings are kept for the whole run.
+
+    Attributes:
+       step: The step the stored values refer to.
+       values: A dictionary {(name, args, kwargs): value}.
+       parsed: A dictionary {output string: (name, unit, args, kwargs, key)}.
+    """
+
+    def __init__(self):
+        """Initialises StepCache."""
+
+        self.step = None
+        self.values = {}
+        self.parsed = {}
+
+    def parse(self, pstring):
+        """Returns the result of getall for pstring, along with the key under
+        which its value is stored.
+
+        Args:
+           pstring: The string input by the user that specifies an output.
+        """
+
+        try:
+            return self.parsed[pstring]
+        except KeyError:
+            (key, unit, arglist, kwarglist) = getall(pstring)
+            rv = (key, unit, arglist, kwarglist, (key, arglist, tuple(sorted(kwarglist.items()))))
+            self.parsed[pstring] = rv
+            return rv
+
+    def get(self, step, ckey, func, arglist, kwarglist):
+        """Returns the value of a property, computing it only if it has not
+        been computed yet during this step.
+
+        Args:
+           step: The current step.
+           ckey: The key returned by parse.
+           func: The function that computes the property.
+           arglist: The positional arguments of func.
+           kwarglist: The keyword arguments of func.
+        """
+
+        if step != self.step:
+            self.values = {}
+            self.step = step
+        try:
+            return self.values[ckey]
+        except KeyError:
+            value = func(*arglist, **kwarglist)
+            self.values[ckey] = value
+            return value
+
+
+class AtomSelection(dobject):
+    """Keeps the atoms selected by the 'atom' argument of the per-atom
+    estimators.
+
+    The argument can either be the (zero based) index of an atom or a label,
+    and an empty string selects all the atoms. Each selection is computed the
+    first time it is used, and all of them are discarded when the atom names
+    change, e.g. after an alchemical exchange.
+
+    Attributes:
+       beads: The beads object whose atoms are selected.
+
+    Depend objects:
+       masks: A dictionary {argument: mask}, where mask is an array of
+          booleans which is True for the selected atoms. Depends on the names
+          of the atoms.
+    """
+
+    def bind(self, beads):
+        """Binds the beads whose atoms are selected.
+
+        Args:
+           beads: The Beads object from which the atom names are taken.
+        """
+
+        self.beads = beads
+        dd(self).masks = depend_value(name="masks", func=dict,
+                                      dependencies=[dd(beads).names])
+
+    def mask(self, atom="", what="property"):
+        """Returns the atoms that match an argument.
+
+        Args:
+           atom: The index or the label of the atoms to be selected.
+           what: The name of the property, used in the error messages.
+
+        Returns:
+           An array of booleans, with one element per atom.
+        """
+
+        masks = self.masks
+        try:
+            return masks[atom]
+        except KeyError:
+            pass
+
+        try:
+            # iatom gives the index of the atom to be studied
+            iatom = int(atom)
+            latom = ""
+            if iatom >= self.beads.natoms:
+                raise IndexError("Cannot output %s as atom index %d is larger than the number of atoms" % (what, iatom))
+        except ValueError:
+            # here 'atom' is a label rather than an index which is stored in latom
+            iatom = -1
+            latom = atom
+
+        if atom == "":
+            mask = np.ones(self.beads.natoms, bool)
+        else:
+            mask = (np.arange(self.beads.natoms) == iatom) | (dstrip(self.beads.names) == latom)
+        masks[atom] = mask
+        return mask
+
+
 def help_latex(idict, standalone=True):
     """Function to generate a LaTeX formatted string.
 
@@ -180,6 +328,10 @@ class Properties(dobject):
           estimator.
        dforces: A dummy Forces object used in the Yamamoto kinetic energy
           estimator.
+       dbatch: A ForceBatch object used to evaluate the forces on the
+          scaled paths of many atoms at once in the isotope estimators.
+       selection: An AtomSelection object giving the atoms that are selected
+          by the argument of the per-atom estimators.
        system: The System object containing the data to be output.
        ensemble: An ensemble object giving the objects necessary for producing
           the correct ensemble.
@@ -307,7 +459,7 @@ class Properties(dobject):
 
             "spring": {"dimension": "energy",
                        "help": "The total spring potential energy between the beads of all the ring polymers in the system.",
-                       'func': (lambda: self.beads.vpath * self.nm.omegan2 / self.beads.nbeads)},
+                       'func': (lambda: self.nm.vpath * self.nm.omegan2 / self.beads.nbeads)},
 
             "kinetic_md": {"dimension": "energy",
                            "help": "The kinetic energy of the (extended) classical system.",
@@ -642,8 +794,12 @@ class Properties(dobject):
         self.dbeads = system.beads.copy()
         self.dcell = system.cell.copy()
         self.dforces = system.forces.copy(self.dbeads, self.dcell)
+        self.dbatch = ForceBatch(system.forces)
+        self.selection = AtomSelection()
+        self.selection.bind(system.beads)
         self.fqref = None
         self._threadlock = system._propertylock # lock to avoid concurrent access and messing up with dbeads 
+        self._cache = StepCache()
         
         # self.properties_init()  # Initialize the properties here so that all
         #+all variables are accessible (for example to set
@@ -673,14 +829,14 @@ class Properties(dobject):
            the property specified by the keyword key.
         """
 
-        (key, unit, arglist, kwarglist) = getall(key)
+        (key, unit, arglist, kwarglist, ckey) = self._cache.parse(key)
         pkey = self.property_dict[key]
 
         # pkey["func"](*arglist,**kwarglist) gives the value of the property
         # in atomic units. unit_to_user() returns the value in the user
-        # specified units.
+        # specified units. the value is only computed once per step.
         with self._threadlock:
-            value = pkey["func"](*arglist, **kwarglist)
+            value = self._cache.get(self.simul.step, ckey, pkey["func"], arglist, kwarglist)
         if "dimension" in pkey:
             dimension = pkey["dimension"]
         else:
@@ -752,8 +908,17 @@ class Properties(dobject):
 
             self.beads.p += self.beads.m3 * vcm
 
+        constraints = getattr(self.motion, "constraints", None)
+        if constraints is not None and constraints.nconstraints > 0:
+            # fake momenta along the holonomic constraints, with the bead temperature
+            pcon = constraints.pthermal(Constants.kb * self.ensemble.temp * self.beads.nbeads)
+            self.beads.p += pcon
+
         kemd, ncount = self.get_kinmd(atom, bead, nm, return_count=True)
 
+        if constraints is not None and constraints.nconstraints > 0:
+            self.beads.p -= pcon
+
         if self.motion.fixcom:
             # Removes the fake momentum from the centre of mass.
             self.beads.p -= self.beads.m3 * vcm
@@ -773,49 +938,18 @@ class Properties(dobject):
               for. If not, the system kinetic energy is given.
         """
 
-        try:
-            # iatom gives the index of the atom to be studied
-            iatom = int(atom)
-            latom = ""
-            if iatom >= self.beads.natoms:
-                raise IndexError("Cannot output kinetic energy as atom index %d is larger than the number of atoms" % iatom)
-        except ValueError:
-            # here 'atom' is a label rather than an index which is stored in latom
-            iatom = -1
-            latom = atom
-
-        f = dstrip(self.forces.f)
-        # subtracts centroid
-        q = dstrip(self.beads.q).copy()
-        qc = dstrip(self.beads.qc)
-        for b in xrange(self.beads.nbeads):
-            q[b] -= qc
+        mask = self.selection.mask(atom, "kinetic energy")
+        ncount = np.count_nonzero(mask)
 
-        # zeroes components that are not requested
-        ncount = 0
-        for i in range(self.beads.natoms):
-            if (atom != "" and iatom != i and latom != self.beads.names[i]):
-                q[:, 3 * i:3 * i + 3] = 0.0
-            else: ncount += 1
+        # centroid-subtracted positions and forces of the selected atoms
+        nb = self.beads.nbeads
+        q = dstrip(self.beads.q).reshape((nb, -1, 3))[:, mask]
+        qc = dstrip(self.beads.qc).reshape((-1, 3))[mask]
+        f = dstrip(self.forces.f).reshape((nb, -1, 3))[:, mask]
 
-        acv = np.dot(q.flatten(), f.flatten())
-        acv *= -0.5 / self.beads.nbeads
+        acv = np.dot((q - qc).flatten(), f.flatten())
+        acv *= -0.5 / nb
         acv += ncount * 1.5 * Constants.kb * self.ensemble.temp
-        #~ acv = 0.0
-        #~ ncount = 0
-        #~
-        #~ for i in range(self.beads.natoms):
-        #~ if (atom != "" and iatom != i and latom != self.beads.names[i]):
-        #~ continue
-#~
-        #~ kcv = 0.0
-        #~ k = 3*i
-        #~ for b in range(self.beads.nbeads):
-        #~ kcv += q[b,k]* f[b,k] + q[b,k+1]* f[b,k+1] + q[b,k+2]* f[b,k+2]
-        #~ kcv *= -0.5/self.beads.nbeads
-        #~ kcv += 1.5*Constants.kb*self.ensemble.temp
-        #~ acv += kcv
-        #~ ncount += 1
 
         if ncount == 0:
             warning("Couldn't find an atom which matched the argument of kinetic energy, setting to zero.", verbosity.medium)
@@ -842,35 +976,18 @@ class Properties(dobject):
               for. If not, the system kinetic energy is given.
         """
 
-        try:
-            # iatom gives the index of the atom to be studied
-            iatom = int(atom)
-            latom = ""
-            if iatom >= self.beads.natoms:
-                raise IndexError("Cannot output kinetic energy as atom index %d is larger than the number of atoms" % iatom)
-        except ValueError:
-            # here 'atom' is a label rather than an index which is stored in latom
-            iatom = -1
-            latom = atom
+        mask = self.selection.mask(atom, "kinetic energy")
+        ncount = np.count_nonzero(mask)
 
-        q = dstrip(self.beads.q)
-        qc = dstrip(self.beads.qc)
-        f = dstrip(self.forces.f)
-
-        acv = 0.0
-        ncount = 0
-        for i in range(self.beads.natoms):
-            if (atom != "" and iatom != i and latom != self.beads.names[i]):
-                continue
+        # only every other bead enters the estimator
+        nb = self.beads.nbeads
+        q = dstrip(self.beads.q).reshape((nb, -1, 3))[0::2, mask]
+        qc = dstrip(self.beads.qc).reshape((-1, 3))[mask]
+        f = dstrip(self.forces.f).reshape((nb, -1, 3))[0::2, mask]
 
-            kcv = 0.0
-            k = 3 * i
-            for b in range(0, self.beads.nbeads, 2):
-                kcv += (q[b, k] - qc[k]) * f[b, k] + (q[b, k + 1] - qc[k + 1]) * f[b, k + 1] + (q[b, k + 2] - qc[k + 2]) * f[b, k + 2]
-            kcv *= -0.5 / self.beads.nbeads * 2.0
-            kcv += 1.5 * Constants.kb * self.ensemble.temp
-            acv += kcv
-            ncount += 1
+        acv = np.dot((q - qc).flatten(), f.flatten())
+        acv *= -0.5 / nb * 2.0
+        acv += ncount * 1.5 * Constants.kb * self.ensemble.temp
 
         if ncount == 0:
             warning("Couldn't find an atom which matched the argument of kinetic energy, setting to zero.", verbosity.medium)
@@ -899,40 +1016,24 @@ class Properties(dobject):
               for. If not, the system kinetic energy is given.
         """
 
-        try:
-            # iatom gives the index of the atom to be studied
-            iatom = int(atom)
-            latom = ""
-            if iatom >= self.beads.natoms:
-                raise IndexError("Cannot output kinetic energy as atom index %d is larger than the number of atoms" % iatom)
-        except ValueError:
-            # here 'atom' is a label rather than an index which is stored in latom
-            iatom = -1
-            latom = atom
-
-        q = dstrip(self.beads.q)
-        qc = dstrip(self.beads.qc)
-        f = dstrip(self.forces.f)
-        fsc = dstrip(self.forces.fsc)
-
-        acv = 0.0
-        ncount = 0
-        for i in range(self.beads.natoms):
-            if (atom != "" and iatom != i and latom != self.beads.names[i]):
-                continue
+        mask = self.selection.mask(atom, "kinetic energy")
+        ncount = np.count_nonzero(mask)
 
-            kcv = 0.0
-            k = 3 * i
-            for b in range(self.beads.nbeads):
-                kcv += (q[b, k] - qc[k]) * (f + fsc)[b, k] + (q[b, k + 1] - qc[k + 1]) * (f + fsc)[b, k + 1] + (q[b, k + 2] - qc[k + 2]) * (f + fsc)[b, k + 2]
-                if b % 2 == 0:
-                    kcv -= 2 * (self.forces.alpha / self.forces.omegan2 / 9.0) * (f[b, k] * f[b, k] / self.forces.beads.m3[b, k] + f[b, k + 1] * f[b, k + 1] / self.forces.beads.m3[b, k + 1] + f[b, k + 2] * f[b, k + 2] / self.forces.beads.m3[b, k + 2])
-                else:
-                    kcv -= 2 * ((1.0 - self.forces.alpha) / self.forces.omegan2 / 9.0) * (f[b, k] * f[b, k] / self.forces.beads.m3[b, k] + f[b, k + 1] * f[b, k + 1] / self.forces.beads.m3[b, k + 1] + f[b, k + 2] * f[b, k + 2] / self.forces.beads.m3[b, k + 2])
-            kcv *= -0.5 / self.beads.nbeads
-            kcv += 1.5 * Constants.kb * self.ensemble.temp
-            acv += kcv
-            ncount += 1
+        nb = self.beads.nbeads
+        q = dstrip(self.beads.q).reshape((nb, -1, 3))[:, mask]
+        qc = dstrip(self.beads.qc).reshape((-1, 3))[mask]
+        f = dstrip(self.forces.f).reshape((nb, -1, 3))[:, mask]
+        fsc = dstrip(self.forces.fsc).reshape((nb, -1, 3))[:, mask]
+        m3 = dstrip(self.forces.beads.m3).reshape((nb, -1, 3))[:, mask]
+
+        # weights of the |f|^2 term on the even and odd beads
+        alpha = self.forces.alpha
+        c = np.where(np.arange(nb) % 2 == 0, alpha, 1.0 - alpha) / self.forces.omegan2 / 9.0
+
+        acv = np.dot((q - qc).flatten(), (f + fsc).flatten())
+        acv -= 2 * np.dot(c, (f * f / m3).reshape((nb, -1)).sum(axis=1))
+        acv *= -0.5 / nb
+        acv += ncount * 1.5 * Constants.kb * self.ensemble.temp
 
         if ncount == 0:
             warning("Couldn't find an atom which matched the argument of kinetic energy, setting to zero.", verbosity.medium)
@@ -947,38 +1048,19 @@ class Properties(dobject):
               for. If not, the system kinetic energy is given.
         """
 
-        try:
-            # iatom gives the index of the atom to be studied
-            iatom = int(atom)
-            latom = ""
-            if iatom >= self.beads.natoms:
-                raise IndexError("Cannot output kinetic energy as atom index %d is larger than the number of atoms" % iatom)
-        except ValueError:
-            # here 'atom' is a label rather than an index which is stored in latom
-            iatom = -1
-            latom = atom
-
-        q = dstrip(self.beads.q)
-        m = dstrip(self.beads.m)
-        PkT32 = 1.5 * Constants.kb * self.ensemble.temp * self.beads.nbeads
-
-        atd = 0.0
-        ncount = 0
-        for i in range(self.beads.natoms):
-            if (atom != "" and iatom != i and latom != self.beads.names[i]):
-                continue
+        mask = self.selection.mask(atom, "kinetic energy")
+        ncount = np.count_nonzero(mask)
 
-            ktd = 0.0
-            for b in range(1, self.beads.nbeads):
-                for j in range(3 * i, 3 * (i + 1)):
-                    ktd += (q[b, j] - q[b - 1, j])**2
-            for j in range(3 * i, 3 * (i + 1)):
-                ktd += (q[self.beads.nbeads - 1, j] - q[0, j])**2
+        nb = self.beads.nbeads
+        q = dstrip(self.beads.q).reshape((nb, -1, 3))[:, mask]
+        m = dstrip(self.beads.m)[mask]
+        PkT32 = 1.5 * Constants.kb * self.ensemble.temp * nb
 
-            ktd *= -0.5 * m[i] * self.nm.omegan2 / self.beads.nbeads
-            ktd += PkT32
-            atd += ktd
-            ncount += 1
+        # squared lengths of the springs, including the one closing the ring
+        dq = q - np.roll(q, 1, axis=0)
+        ktd = (dq * dq).sum(axis=(0, 2))
+        ktd *= -0.5 * m * self.nm.omegan2 / nb
+        atd = ktd.sum() + ncount * PkT32
 
         if ncount == 0:
             warning("Couldn't find an atom which matched the argument of kinetic energy, setting to zero.", verbosity.medium)
@@ -989,7 +1071,7 @@ class Properties(dobject):
         """Calculates the quantum centroid virial kinetic energy estimator.
         """
 
-        spring = self.beads.vpath * self.nm.omegan2 / self.beads.nbeads
+        spring = self.nm.vpath * self.nm.omegan2 / self.beads.nbeads
         PkT32 = 1.5 * Constants.kb * self.ensemble.temp * self.beads.nbeads * self.beads.natoms
         pots = dstrip(self.forces.pots)
         potssc = dstrip(self.forces.potssc)
@@ -1016,17 +1098,8 @@ class Properties(dobject):
 
         if bead != "" and nm != "":
             raise ValueError("Cannot specify both NM and bead for classical kinetic energy estimator")
-        if atom != "":
-            try:
-                # iatom gives the index of the atom to be studied
-                iatom = int(atom)
-                latom = ""
-                if iatom >= self.beads.natoms:
-                    raise IndexError("Cannot output kinetic energy as atom index %d is larger than the number of atoms" % iatom)
-            except ValueError:
-                # here 'atom' is a label rather than an index which is stored in latom
-                iatom = -1
-                latom = atom
+        mask = self.selection.mask(atom, "kinetic energy")
+        ncount = np.count_nonzero(mask)
 
         ibead = -1
         if bead != "":
@@ -1048,43 +1121,24 @@ class Properties(dobject):
             except ValueError:
                 raise ValueError("Normal mode index is not a valid integer")
 
-        pnm = dstrip(self.nm.pnm)
-        dm3 = dstrip(self.nm.dynm3)
-        p = dstrip(self.beads.p)
-        m3 = dstrip(self.beads.m3)
-        kmd = 0.0
-        ncount = 0
-
         if ibead > -1:
             nbeads = 1
-            for i in range(self.beads.natoms):
-                if (atom != "" and iatom != i and latom != self.beads.names[i]):
-                    continue
-                k = 3 * i
-                kmd += (p[ibead, k]**2 + p[ibead, k + 1]**2 + p[ibead, k + 2]**2) / (2.0 * m3[ibead, k])
-                ncount += 1
+            p = dstrip(self.beads.p)[ibead]
+            m3 = dstrip(self.beads.m3)[ibead]
+            kmd = 0.5 * (p * p / m3).reshape((-1, 3))[mask].sum()
         elif inm > -1:
             nbeads = 1
-            for i in range(self.beads.natoms):
-                if (atom != "" and iatom != i and latom != self.beads.names[i]):
-                    continue
-                k = 3 * i
-                kmd += (pnm[inm, k]**2 + pnm[inm, k + 1]**2 + pnm[inm, k + 2]**2) / (2.0 * dm3[inm, k])
-                ncount += 1
+            pnm = dstrip(self.nm.pnm)[inm]
+            dm3 = dstrip(self.nm.dynm3)[inm]
+            kmd = 0.5 * (pnm * pnm / dm3).reshape((-1, 3))[mask].sum()
         else:
             nbeads = self.beads.nbeads
-            ncount = 0
             if atom == "":
                 kmd = self.nm.kin
-                ncount = self.beads.natoms
             else:
-                for i in range(self.beads.natoms):
-                    if (atom != "" and iatom != i and latom != self.beads.names[i]):
-                        continue
-                    k = 3 * i
-                    for b in range(self.beads.nbeads):
-                        kmd += (pnm[b, k]**2 + pnm[b, k + 1]**2 + pnm[b, k + 2]**2) / (2.0 * dm3[b, k])
-                    ncount += 1
+                pnm = dstrip(self.nm.pnm)
+                dm3 = dstrip(self.nm.dynm3)
+                kmd = 0.5 * (pnm * pnm / dm3).reshape((nbeads, -1, 3))[:, mask].sum()
 
         if ncount == 0:
             warning("Couldn't find an atom which matched the argument of kinetic energy, setting to zero.", verbosity.medium)
@@ -1104,25 +1158,21 @@ class Properties(dobject):
               it should be output.
         """
 
-        try:
-            # iatom gives the index of the atom to be studied
-            iatom = int(atom)
-            latom = ""
-            if iatom >= self.beads.natoms:
-                raise IndexError("Cannot output kinetic tensor as atom index %d is larger than the number of atoms" % iatom)
-        except ValueError:
-            # here 'atom' is a label rather than an index which is stored in latom
-            iatom = -1
-            latom = atom
+        mask = self.selection.mask(atom, "kinetic tensor")
+        ncount = np.count_nonzero(mask)
 
-        tkcv = np.zeros((6), float)
-        ncount = 0
-        for i in range(self.beads.natoms):
-            if (atom != "" and iatom != i and latom != self.beads.names[i]):
-                continue
-
-            tkcv += self.get_kij(str(i), str(i))
-            ncount += 1
+        nb = self.beads.nbeads
+        q = dstrip(self.beads.q).reshape((nb, -1, 3))[:, mask]
+        qc = dstrip(self.beads.qc).reshape((-1, 3))[mask]
+        f = dstrip(self.forces.f).reshape((nb, -1, 3))[:, mask]
+
+        # sum of the diagonal terms of kinetic_ij over the selected atoms,
+        # for which the masses cancel out
+        qf = np.einsum("bia,bic->ac", q - qc, f)
+        tkcv = np.array([2 * qf[0, 0], 2 * qf[1, 1], 2 * qf[2, 2],
+                         qf[0, 1] + qf[1, 0], qf[0, 2] + qf[2, 0], qf[1, 2] + qf[2, 1]])
+        tkcv *= -0.5 / (nb * 2)
+        tkcv[0:3] += ncount * 0.5 * Constants.kb * self.ensemble.temp
 
         if ncount == 0:
             warning("Couldn't find an atom which matched the argument of kinetic tensor, setting to zero.", verbosity.medium)
@@ -1198,38 +1248,19 @@ class Properties(dobject):
               for. If not, the system average gyration radius is given.
         """
 
-        try:
-            # iatom gives the index of the atom to be studied
-            iatom = int(atom)
-            latom = ""
-            if iatom >= self.beads.natoms:
-                raise IndexError("Cannot output gyration radius as atom index %d is larger than the number of atoms" % iatom)
-        except ValueError:
-            # here 'atom' is a label rather than an index which is stored in latom
-            iatom = -1
-            latom = atom
+        mask = self.selection.mask(atom, "gyration radius")
+        ncount = np.count_nonzero(mask)
+        if ncount == 0:
+            raise IndexError("Couldn't find an atom which matched the argument of r_gyration")
 
-        q = dstrip(self.beads.q)
-        qc = dstrip(self.beads.qc)
-        nat = self.beads.natoms
         nb = self.beads.nbeads
-        rg_tot = 0.0
-        ncount = 0
-        for i in range(nat):
-            if (atom != "" and iatom != i and latom != self.beads.names[i]):
-                continue
-
-            rg_at = 0.0
-            for j in range(nb):
-                dq = q[j, 3 * i:3 * (i + 1)] - qc[3 * i:3 * (i + 1)]
-                rg_at += np.dot(dq, dq)
-            ncount += 1
-            rg_tot += np.sqrt(rg_at / float(nb))
+        q = dstrip(self.beads.q).reshape((nb, -1, 3))[:, mask]
+        qc = dstrip(self.beads.qc).reshape((-1, 3))[mask]
 
-        if ncount == 0:
-            raise IndexError("Couldn't find an atom which matched the argument of r_gyration")
+        dq = q - qc
+        rg_at = np.sqrt((dq * dq).sum(axis=(0, 2)) / float(nb))
 
-        return rg_tot / float(ncount)
+        return rg_at.sum() / float(ncount)
 
     def kstress_cv(self):
         """Calculates the quantum centroid virial kinetic stress tensor
@@ -1283,16 +1314,7 @@ class Properties(dobject):
               for. If not, the simulation kinetic energy is given.
         """
 
-        try:
-            # iatom gives the index of the atom to be studied
-            iatom = int(atom)
-            latom = ""
-            if iatom >= self.beads.natoms:
-                raise IndexError("Cannot output linlin estimator as atom index %d is larger than the number of atoms" % iatom)
-        except ValueError:
-            # here 'atom' is a label rather than an index which is stored in latom
-            iatom = -1
-            latom = atom
+        mask = self.selection.mask(atom, "linlin estimator")
 
         beta = 1.0 / (self.ensemble.temp * Constants.kb)
 
@@ -1303,9 +1325,7 @@ class Properties(dobject):
         nb = self.beads.nbeads
         nx_tot = 0.0
         ncount = 0
-        for i in range(nat):
-            if (atom != "" and iatom != i and latom != self.beads.names[i]):
-                continue
+        for i in np.flatnonzero(mask):
 
             mass = self.beads.m[i]
             self.dbeads.q[:] = q
@@ -1456,18 +1476,10 @@ class Properties(dobject):
               sign(sum(weight*ke)) )
         """
 
-        try:
-            # iatom gives the index of the atom to be studied
-            iatom = int(atom)
-            latom = ""
-            if iatom >= self.beads.natoms:
-                raise IndexError("Cannot output scaled-mass kinetic energy estimator as atom index %d is larger than the number of atoms" % iatom)
-        except ValueError:
-            # here 'atom' is a label rather than an index which is stored in latom
-            iatom = -1
-            latom = atom
+        mask = self.selection.mask(atom, "scaled-mass kinetic energy estimator")
 
         alpha = float(alpha)
+        scalefactor = 1.0 / np.sqrt(alpha)
 
         atcv = 0.0
         atcv2 = 0.0
@@ -1483,27 +1495,23 @@ class Properties(dobject):
         f = dstrip(self.forces.f)
         qc = dstrip(self.beads.qc)
 
-        for i in range(self.beads.natoms):
-            # selects only the atoms we care about
-            if (atom != "" and iatom != i and latom != self.beads.names[i]):
-                continue
+        # selects only the atoms we care about
+        atoms = np.flatnonzero(mask)
 
+        # the forces on the scaled paths of all the atoms are requested together
+        for i, dforces in self.dbatch.run(atoms, lambda i: _scaled_path(q, qc, i, scalefactor)):
             ni += 1
 
-            # arranges coordinate-scaled beads in a auxiliary beads object
-            self.dbeads.q[:] = q[:]
-            for b in range(self.beads.nbeads):
-                self.dbeads.q[b, 3 * i:3 * (i + 1)] = (qc[3 * i:3 * (i + 1)] +
-                                                       np.sqrt(1.0 / alpha) * (q[b, 3 * i:3 * (i + 1)] - qc[3 * i:3 * (i + 1)]))
-
+            dq = dstrip(dforces.beads.q)
+            dqc = dstrip(dforces.beads.qc)
+            df = dstrip(dforces.f)
             tcv = 0.0
             for b in range(self.beads.nbeads):
-                tcv += np.dot((self.dbeads.q[b, 3 * i:3 * (i + 1)] - self.dbeads.qc[3 * i:3 * (i + 1)]),
-                              self.dforces.f[b, 3 * i:3 * (i + 1)])
+                tcv += np.dot((dq[b, 3 * i:3 * (i + 1)] - dqc[3 * i:3 * (i + 1)]), df[b, 3 * i:3 * (i + 1)])
             tcv *= -0.5 / self.beads.nbeads
             tcv += 1.5 * Constants.kb * self.ensemble.temp
 
-            logr = (self.dforces.pot - self.forces.pot) / (Constants.kb * self.ensemble.temp * self.beads.nbeads)
+            logr = (dforces.pot - self.forces.pot) / (Constants.kb * self.ensemble.temp * self.beads.nbeads)
 
             atcv += tcv
             atcv2 += tcv * tcv
@@ -1546,16 +1554,7 @@ class Properties(dobject):
               sign(sum(weight*ke)) )
         """
 
-        try:
-            # iatom gives the index of the atom to be studied
-            iatom = int(atom)
-            latom = ""
-            if iatom >= self.beads.natoms:
-                raise IndexError("Cannot output scaled-mass kinetic energy estimator as atom index %d is larger than the number of atoms" % iatom)
-        except ValueError:
-            # here 'atom' is a label rather than an index which is stored in latom
-            iatom = -1
-            latom = atom
+        mask = self.selection.mask(atom, "scaled-mass kinetic energy estimator")
 
         alpha = float(alpha)
 
@@ -1573,10 +1572,8 @@ class Properties(dobject):
         f = dstrip(self.forces.f)
         qc = dstrip(self.beads.qc)
 
-        for i in range(self.beads.natoms):
-            # selects only the atoms we care about
-            if (atom != "" and iatom != i and latom != self.beads.names[i]):
-                continue
+        # selects only the atoms we care about
+        for i in np.flatnonzero(mask):
 
             ni += 1
 
@@ -1636,16 +1633,7 @@ class Properties(dobject):
            (spraverage, spr2average, sprexpaverage)
         """
 
-        try:
-            # iatom gives the index of the atom to be studied
-            iatom = int(atom)
-            latom = ""
-            if iatom >= self.beads.natoms:
-                raise IndexError("Cannot output scaled-mass kinetic energy estimator as atom index %d is larger than the number of atoms" % iatom)
-        except ValueError:
-            # here 'atom' is a label rather than an index which is stored in latom
-            iatom = -1
-            latom = atom
+        mask = self.selection.mask(atom, "scaled-mass kinetic energy estimator")
 
         alpha = float(alpha)
 
@@ -1658,10 +1646,8 @@ class Properties(dobject):
         q = dstrip(self.beads.q)
         betaP = 1.0 / (Constants.kb * self.ensemble.temp * self.beads.nbeads)
 
-        for i in range(self.beads.natoms):
-            # selects only the atoms we care about
-            if (atom != "" and iatom != i and latom != self.beads.names[i]):
-                continue
+        # selects only the atoms we care about
+        for i in np.flatnonzero(mask):
 
             ni += 1
 
@@ -1705,16 +1691,7 @@ class Properties(dobject):
            (yamaaverage, yama2average, yamaexpaverage)
         """
 
-        try:
-            # iatom gives the index of the atom to be studied
-            iatom = int(atom)
-            latom = ""
-            if iatom >= self.beads.natoms:
-                raise IndexError("Cannot output scaled-mass kinetic energy estimator as atom index %d is larger than the number of atoms" % iatom)
-        except ValueError:
-            # here 'atom' is a label rather than an index which is stored in latom
-            iatom = -1
-            latom = atom
+        mask = self.selection.mask(atom, "scaled-mass kinetic energy estimator")
 
         alpha = float(alpha)
         scalefactor = 1.0 / np.sqrt(alpha)
@@ -1728,20 +1705,15 @@ class Properties(dobject):
         qc = dstrip(self.beads.qc)
         q = dstrip(self.beads.q)
         v0 = self.forces.pot
-        self.dbeads.q = q
 
-        for i in range(self.beads.natoms):
-            # selects only the atoms we care about
-            if (atom != "" and iatom != i and latom != self.beads.names[i]):
-                continue
+        # selects only the atoms we care about
+        atoms = np.flatnonzero(mask)
 
+        # the forces on the scaled paths of all the atoms are requested together
+        for i, dforces in self.dbatch.run(atoms, lambda i: _scaled_path(q, qc, i, scalefactor)):
             ni += 1
 
-            for b in range(self.beads.nbeads):
-                for j in range(3 * i, 3 * (i + 1)):
-                    self.dbeads.q[b, j] = qc[j] * (1.0 - scalefactor) + scalefactor * q[b, j]
-
-            sc = self.dforces.pot - v0
+            sc = dforces.pot - v0
             sc2 = sc * sc
             scexp = np.exp(-betaP * sc)
 
@@ -1749,8 +1721,6 @@ class Properties(dobject):
             sc2sum += sc2
             scexpsum += scexp
 
-            self.dbeads.q = q
-
         if ni == 0:
             raise IndexError("Couldn't find an atom which matched the argument of isotope_zetasc")
         return np.asarray([scsum / ni, sc2sum / ni, scexpsum / ni])
@@ -1772,16 +1742,7 @@ class Properties(dobject):
             (ti_weight, chin_weight)
         """
 
-        try:
-            # iatom gives the index of the atom to be studied
-            iatom = int(atom)
-            latom = ""
-            if iatom >= self.beads.natoms:
-                raise IndexError("Cannot output scaled-mass kinetic energy estimator as atom index %d is larger than the number of atoms" % iatom)
-        except ValueError:
-            # here 'atom' is a label rather than an index which is stored in latom
-            iatom = -1
-            latom = atom
+        mask = self.selection.mask(atom, "scaled-mass kinetic energy estimator")
 
         alpha = float(alpha)
 
@@ -1799,10 +1760,8 @@ class Properties(dobject):
         pots = self.forces.pots
         betaP = 1.0 / (self.beads.nbeads * Constants.kb * self.ensemble.temp)
 
-        for i in range(self.beads.natoms):
-            # selects only the atoms we care about
-            if (atom != "" and iatom != i and latom != self.beads.names[i]):
-                continue
+        # selects only the atoms we care about
+        for i in np.flatnonzero(mask):
 
             ni += 1
 
@@ -1862,16 +1821,7 @@ class Properties(dobject):
            (ti_weight, chin_weight)
         """
 
-        try:
-            # iatom gives the index of the atom to be studied
-            iatom = int(atom)
-            latom = ""
-            if iatom >= self.beads.natoms:
-                raise IndexError("Cannot output scaled-mass kinetic energy estimator as atom index %d is larger than the number of atoms" % iatom)
-        except ValueError:
-            # here 'atom' is a label rather than an index which is stored in latom
-            iatom = -1
-            latom = atom
+        mask = self.selection.mask(atom, "scaled-mass kinetic energy estimator")
 
         alpha = float(alpha)
         scalefactor = 1.0 / np.sqrt(alpha)
@@ -1891,27 +1841,21 @@ class Properties(dobject):
         v0 = self.forces.pot
         pots = self.forces.pots
 
-        for i in range(self.beads.natoms):
-            # selects only the atoms we care about
-            if (atom != "" and iatom != i and latom != self.beads.names[i]):
-                continue
+        # selects only the atoms we care about
+        atoms = np.flatnonzero(mask)
 
+        # the forces on the scaled paths of all the atoms are requested together
+        for i, dforces in self.dbatch.run(atoms, lambda i: _scaled_path(q, qc, i, scalefactor)):
             ni += 1
 
-            self.dbeads.q[:] = q
-            # shifts beads positions
-            for b in range(self.beads.nbeads):
-                for j in range(3 * i, 3 * (i + 1)):
-                    self.dbeads.q[b, j] = qc[j] * (1.0 - scalefactor) + scalefactor * q[b, j]
-
             # computes the potential term in the scaled coordinates estimator
-            sc = self.dforces.pot - v0
+            sc = dforces.pot - v0
 
             # this is the extra correction from Suzuki-Chin terms in the hamiltonian.
             # first, the part with |F(q)|^2. this is the scaled-coordinates F with mass m'
             # minus the original coordinates with mass m
-            df = dstrip(self.dforces.f)
-            dpots = self.dforces.pots
+            df = dstrip(dforces.f)
+            dpots = dstrip(dforces.pots)
 
             # Suzuki-Chin correction
             chin = 0.0
@@ -1943,7 +1887,6 @@ class Properties(dobject):
             chinexpsum += chinexp
             tiexpsum += tiexp
 
-        self.dbeads.q[:] = q[:]
         if ni == 0:
             raise IndexError("Couldn't find an atom which matched the argument of isotope_zetasc")
 
@@ -2002,16 +1945,7 @@ class Properties(dobject):
               for. If not, the system kinetic energy is given.
         """
 
-        try:
-            # iatom gives the index of the atom to be studied
-            iatom = int(atom)
-            latom = ""
-            if iatom >= self.beads.natoms:
-                raise IndexError("Cannot output kinetic energy as atom index %d is larger than the number of atoms" % iatom)
-        except ValueError:
-            # here 'atom' is a label rather than an index which is stored in latom
-            iatom = -1
-            latom = atom
+        mask = self.selection.mask(atom, "kinetic energy")
 
         f = dstrip(self.forces.f)
         m3 = dstrip(self.beads.m3)
@@ -2021,9 +1955,7 @@ class Properties(dobject):
         ti = 0.0
 
         ncount = 0
-        for i in range(self.beads.natoms):
-            if (atom != "" and iatom != i and latom != self.beads.names[i]):
-                continue
+        for i in np.flatnonzero(mask):
 
             for j in range(3 * i, 3 * (i + 1)):
                 for b in range(self.beads.nbeads):
@@ -2046,6 +1978,10 @@ class Trajectories(dobject):
           obtained.
        fatom: A dummy beads object used so that individual replica trajectories
           can be output.
+       dbatch: A ForceBatch object used to evaluate the forces on the
+          scaled paths of many atoms at once in the isotope estimators.
+       selection: An AtomSelection object giving the atoms that are selected
+          by the argument of the per-atom estimators.
        traj_dict: A dictionary containing all the trajectories that can be
           output.
     """
@@ -2127,22 +2063,24 @@ class Trajectories(dobject):
         """
 
         self.system = system
-        # dummy beads and forcefield objects so that we can use scaled and
-        # displaced path estimators without changing the simulation bead
-        # coordinates
-        self.dbeads = system.beads.copy()
-        self.dcell = system.cell.copy()
-        self.dforces = self.system.forces.copy(self.dbeads, self.dcell)
+        # copies of the forces so that we can use scaled path estimators
+        # without changing the simulation bead coordinates
+        self.dbatch = ForceBatch(system.forces)
+        self.selection = AtomSelection()
+        self.selection.bind(system.beads)
         self._threadlock = system._propertylock
+        self._cache = StepCache()
 
     def get_akcv(self):
         """Calculates the contribution to the kinetic energy due to each degree
         of freedom.
         """
 
-        rv = np.zeros(self.system.beads.natoms * 3)
-        for b in range(self.system.beads.nbeads):
-            rv[:] += (self.system.beads.q[b] - self.system.beads.qc) * self.system.forces.f[b]
+        q = dstrip(self.system.beads.q)
+        qc = dstrip(self.system.beads.qc)
+        f = dstrip(self.system.forces.f)
+
+        rv = ((q - qc) * f).sum(axis=0)
         rv *= -0.5 / self.system.beads.nbeads
         rv += 0.5 * Constants.kb * self.system.ensemble.temp
         return rv
@@ -2152,20 +2090,20 @@ class Trajectories(dobject):
         due to each atom.
         """
 
-        rv = np.zeros((self.system.beads.natoms, 3))
-        # helper arrays to make it more obvious what we are computing
-        dq = np.zeros((self.system.beads.natoms, 3))
-        f = np.zeros((self.system.beads.natoms, 3))
-        for b in range(self.system.beads.nbeads):
-            dq[:] = (self.system.beads.q[b] - self.system.beads.qc).reshape((self.system.beads.natoms, 3))
-            f[:] = self.system.forces.f[b].reshape((self.system.beads.natoms, 3))
-            rv[:, 0] += dq[:, 0] * f[:, 1] + dq[:, 1] * f[:, 0]
-            rv[:, 1] += dq[:, 0] * f[:, 2] + dq[:, 2] * f[:, 0]
-            rv[:, 2] += dq[:, 1] * f[:, 2] + dq[:, 2] * f[:, 1]
+        nat = self.system.beads.natoms
+        nb = self.system.beads.nbeads
+        # positions and forces as (nbeads, natoms, 3) arrays
+        dq = (dstrip(self.system.beads.q) - dstrip(self.system.beads.qc)).reshape((nb, nat, 3))
+        f = dstrip(self.system.forces.f).reshape((nb, nat, 3))
+
+        rv = np.zeros((nat, 3))
+        rv[:, 0] = (dq[:, :, 0] * f[:, :, 1] + dq[:, :, 1] * f[:, :, 0]).sum(axis=0)
+        rv[:, 1] = (dq[:, :, 0] * f[:, :, 2] + dq[:, :, 2] * f[:, :, 0]).sum(axis=0)
+        rv[:, 2] = (dq[:, :, 1] * f[:, :, 2] + dq[:, :, 2] * f[:, :, 1]).sum(axis=0)
         rv *= 0.5
-        rv *= -0.5 / self.system.beads.nbeads
+        rv *= -0.5 / nb
 
-        return rv.reshape(self.system.beads.natoms * 3)
+        return rv.reshape(nat * 3)
 
     def get_rg(self):
         """Calculates the radius of gyration of the ring polymers.
@@ -2176,14 +2114,10 @@ class Trajectories(dobject):
 
         q = dstrip(self.system.beads.q)
         qc = dstrip(self.system.beads.qc)
-        nat = self.system.beads.natoms
         nb = self.system.beads.nbeads
-        rg = np.zeros(3 * nat)
-        for i in range(nb):
-            for j in range(nat):
-                dq = q[i, 3 * j:3 * (j + 1)] - qc[3 * j:3 * (j + 1)]
-                rg[3 * j:3 * (j + 1)] += dq * dq
-        return np.sqrt(rg / float(nb))
+
+        dq = q - qc
+        return np.sqrt((dq * dq).sum(axis=0) / float(nb))
 
     def get_isotope_zetatd(self, alpha="1.0", atom=""):
         """Get the thermodynamic isotope ratio direct estimator for each atom.
@@ -2195,16 +2129,7 @@ class Trajectories(dobject):
         Args:
            alpha: m'/m the mass ratio
         """
-        try:
-            # iatom gives the index of the atom to be studied
-            iatom = int(atom)
-            latom = ""
-            if iatom >= self.system.beads.natoms:
-                raise IndexError("Cannot output scaled-mass kinetic energy estimator as atom index %d is larger than the number of atoms" % iatom)
-        except ValueError:
-            # here 'atom' is a label rather than an index which is stored in latom
-            iatom = -1
-            latom = atom
+        mask = self.selection.mask(atom, "scaled-mass kinetic energy estimator")
 
         alpha = float(alpha)
 
@@ -2214,10 +2139,8 @@ class Trajectories(dobject):
         # strips dependency control since we are not gonna change the true beads in what follows
         q = dstrip(self.system.beads.q)
 
-        for i in range(nat):
-            # selects only the atoms we care about
-            if (atom != "" and iatom != i and latom != self.system.beads.names[i]):
-                continue
+        # selects only the atoms we care about
+        for i in np.flatnonzero(mask):
 
             for b in range(1, nb):
                 for j in range(3 * i, 3 * (i + 1)):
@@ -2243,16 +2166,7 @@ class Trajectories(dobject):
         Args:
            alpha: m'/m the mass ratio
         """
-        try:
-            # iatom gives the index of the atom to be studied
-            iatom = int(atom)
-            latom = ""
-            if iatom >= self.system.beads.natoms:
-                raise IndexError("Cannot output scaled-mass kinetic energy estimator as atom index %d is larger than the number of atoms" % iatom)
-        except ValueError:
-            # here 'atom' is a label rather than an index which is stored in latom
-            iatom = -1
-            latom = atom
+        mask = self.selection.mask(atom, "scaled-mass kinetic energy estimator")
 
         alpha = float(alpha)
         scalefactor = 1.0 / np.sqrt(alpha)
@@ -2265,19 +2179,13 @@ class Trajectories(dobject):
         qc = dstrip(self.system.beads.qc)
         q = dstrip(self.system.beads.q)
         v0 = self.system.forces.pot / nb
-        self.dbeads.q = q
-
-        for i in range(nat):
-            # selects only the atoms we care about
-            if (atom != "" and iatom != i and latom != self.system.beads.names[i]):
-                continue
 
-            for b in range(nb):
-                for j in range(3 * i, 3 * (i + 1)):
-                    self.dbeads.q[b, j] = qc[j] * (1.0 - scalefactor) + scalefactor * q[b, j]
-            zetasc[i, 0] = self.dforces.pot / nb - v0
+        # selects only the atoms we care about
+        atoms = np.flatnonzero(mask)
 
-            self.dbeads.q = q
+        # the forces on the scaled paths of all the atoms are requested together
+        for i, dforces in self.dbatch.run(atoms, lambda i: _scaled_path(q, qc, i, scalefactor)):
+            zetasc[i, 0] = dforces.pot / nb - v0
 
         zetasc[:, 1] = np.square(zetasc[:, 0])
         zetasc[:, 2] = np.exp(-1.0 * beta * zetasc[:, 0])
@@ -2308,15 +2216,15 @@ class Trajectories(dobject):
            the trajectory specified by the keyword key.
         """
 
-        (key, unit, arglist, kwarglist) = getall(key)
+        (key, unit, arglist, kwarglist, ckey) = self._cache.parse(key)
         pkey = self.traj_dict[key]
 
         # pkey["func"](*arglist,**kwarglist) gives the value of the trajectory
         # in atomic units. unit_to_user() returns the value in the user
-        # specified units.
+        # specified units. the value is only computed once per step.
 
         with self._threadlock:
-            value = pkey["func"](*arglist, **kwarglist)
+            value = self._cache.get(self.system.simul.step, ckey, pkey["func"], arglist, kwarglist)
         if "dimension" in pkey:
             dimension = pkey["dimension"]
         else:
@@ -12,7 +12,6 @@ choosing which properties to initialise, and which properties to output.
 
 
 import os
-import threading
 import time
 from copy import deepcopy
 
@@ -20,6 +19,7 @@ from ipi.utils.depend import depend_value, dobject, dd
 from ipi.utils.io.inputs.io_xml import xml_parse_file
 from ipi.utils.messages import verbosity, info, warning, banner
 from ipi.utils.softexit import softexit
+from ipi.utils.threadpool import ThreadPool, Job
 import ipi.engine.outputs as eoutputs
 import ipi.inputs.simulation as isimulation
 
@@ -51,6 +51,8 @@ class Simulation(dobject):
             the current state of the simulation. This is because we cannot
             restart from half way through a step, only from the beginning of a
             step, so this is necessary for the trajectory to be continuous.
+        pool: A pool of worker threads used to run the systems and the outputs
+            concurrently when threading is enabled. None otherwise.
 
     Depend objects:
         step: The current simulation step.
@@ -150,6 +152,7 @@ class Simulation(dobject):
 
         self.chk = None
         self.rollback = True
+        self.pool = None
 
     def bind(self):
         """Calls the bind routines for all the objects in the simulation."""
@@ -182,7 +185,12 @@ class Simulation(dobject):
                     self.outputs.append(no)
                     isys += 1
 
-        self.chk = eoutputs.CheckpointOutput("RESTART", 1, True, 0)
+        # the soft exit checkpoint uses the same format as the requested ones
+        chkformat = "xml"
+        for o in self.outputs:
+            if type(o) is eoutputs.CheckpointOutput:
+                chkformat = o.format
+        self.chk = eoutputs.CheckpointOutput("RESTART", 1, True, 0, format=chkformat)
         self.chk.bind(self)
 
         if not self.smotion is None:
@@ -200,6 +208,10 @@ class Simulation(dobject):
         if not self.rollback:
             info("SOFTEXIT: Saving the latest status at the end of the step")
             self.chk.store()
+        else:
+            # the systems might still be moving on other threads, so the
+            # checkpoint is stored from a copy of the state at the step start
+            self.chk.restore()
 
         self.chk.write(store=False)
 
@@ -218,26 +230,15 @@ class Simulation(dobject):
         for k, f in self.fflist.iteritems():
             f.run()
 
+        # persistent worker threads, used to run systems and outputs concurrently
+        if self.threading:
+            self.pool = ThreadPool(name="simulation")
+
         # prints inital configuration -- only if we are not restarting
         if self.step == 0:
             self.step = -1
             # must use multi-threading to avoid blocking in multi-system runs with WTE
-            if self.threading:
-                stepthreads = []
-                for o in self.outputs:                    
-                    st = threading.Thread(target=o.write, name=o.filename)
-                    st.daemon = True
-                    st.start()
-                    stepthreads.append(st)
-
-                for st in stepthreads:
-                    while st.isAlive():
-                        # This is necessary as join() without timeout prevents main from receiving signals.
-                        st.join(2.0)
-            else:
-                for o in self.outputs:
-                    o.write()  # threaded output seems to cause random hang-ups. should make things properly thread-safe
-
+            self.write_outputs()
             self.step = 0
 
         steptime = 0.0
@@ -250,30 +251,19 @@ class Simulation(dobject):
         ttot = 0.0
         # main MD loop
         for self.step in xrange(self.step, self.tsteps):
-            # stores the state before doing a step.
-            # this is a bit time-consuming but makes sure that we can honor soft
-            # exit requests without screwing the trajectory
+            # takes a snapshot of the state before doing a step.
+            # this makes sure that we can honor soft exit requests without
+            # screwing the trajectory
 
             steptime = -time.time()
             if softexit.triggered:
                 break
 
-            self.chk.store()
+            self.chk.snapshot()
 
             if self.threading:
-                stepthreads = []
-                # steps through all the systems
-                for s in self.syslist:
-                    # creates separate threads for the different systems
-                    st = threading.Thread(target=s.motion.step, name=s.prefix, kwargs={"step": self.step})
-                    st.daemon = True
-                    st.start()
-                    stepthreads.append(st)
-
-                for st in stepthreads:
-                    while st.isAlive():
-                        # This is necessary as join() without timeout prevents main from receiving signals.
-                        st.join(2.0)
+                # steps through all the systems, on separate worker threads
+                self.pool.run([Job(s.motion.step, {"step": self.step}) for s in self.syslist])
             else:
                 for s in self.syslist:
                     s.motion.step(step=self.step)
@@ -291,21 +281,7 @@ class Simulation(dobject):
                 # Don't write if we are about to exit.
                 break
 
-            if self.threading:
-                stepthreads = []
-                for o in self.outputs:
-                    st = threading.Thread(target=o.write, name=o.filename)
-                    st.daemon = True
-                    st.start()
-                    stepthreads.append(st)
-
-                for st in stepthreads:
-                    while st.isAlive():
-                        # This is necessary as join() without timeout prevents main from receiving signals.
-                        st.join(2.0)
-            else:
-                for o in self.outputs:
-                    o.write()
+            self.write_outputs()
 
             steptime += time.time()
             ttot += steptime
@@ -327,3 +303,15 @@ class Simulation(dobject):
                 break
 
         self.rollback = False
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+
+    def write_outputs(self):
+        """Writes all the outputs, concurrently if threading is enabled."""
+
+        if self.pool is not None:
+            self.pool.run([Job(o.write) for o in self.outputs])
+        else:
+            for o in self.outputs:
+                o.write()  # threaded output seems to cause random hang-ups. should make things properly thread-safe
@@ -0,0 +1,339 @@
+"""Lightweight in-memory copies of the dynamical state of a simulation.
+
+Used to keep track of the state of the systems at the beginning of each step,
+so that a consistent checkpoint can be written if a soft exit is requested
+half way through a step, without converting the whole simulation to its
+input representation at every step. The checkpoint is then stored from
+copies of the objects, so that a simulation that might still be running is
+never modified.
+"""
+
+# This file is part of i-PI.
+# i-PI Copyright (C) 2014-2017 i-PI developers
+# See the "licenses" directory for full license information.
+
+
+import types
+
+import numpy as np
+
+from ipi.utils.depend import depend_base, depend_array, depend_value, dobject, ddirect, dstrip
+from ipi.utils.prng import Random
+
+
+__all__ = ['StateSnapshot']
+
+
+# plain members of a dobject that are copied verbatim (immutable values)
+_SCALARS = (bool, int, long, float, complex, str, unicode, np.number, np.bool_, type(None))
+
+
+class StateSnapshot(object):
+    """Keeps copies of the raw state of a set of objects in two buffers.
+
+    The objects are visited recursively (going through dobjects and through
+    lists, tuples and dictionaries that contain them). For each dobject, the
+    state is made of its independent depend objects (those that are not
+    computed from others), of its members that are numpy arrays and of its
+    members that hold immutable scalars. For each group of synchronized depend
+    objects the member that has been set manually is saved, as well as the
+    values of all the members, so that copies do not have to be synchronized.
+    The state of the random number generators is also saved. Everything else
+    is assumed to be either constant during the run or derived from the state.
+
+    The list of members to be saved is built on the first snapshot, and only
+    rebuilt when members are added to or removed from one of the dobjects.
+    Two buffers are used alternatively, so that a take() that gets interrupted
+    (e.g. by a signal) leaves the previous complete snapshot available.
+    Arrays are copied in place whenever the buffer from two snapshots ago has
+    the right shape, so that in a simulation no new memory is needed after the
+    first two steps.
+
+    Attributes:
+       roots: The list of the objects whose state is saved.
+       skip: A tuple of classes whose instances are not visited.
+       taken: The number of completed snapshots.
+       _objects: The list of the dobjects that have been visited.
+       _sizes: The number of members of each of the visited dobjects.
+       _entries: The list of the members to be saved, as tuples of the form
+          (kind, object, name), where kind is "depend", "synchro", "synced",
+          "plain" or "prng". For synchronized groups object is the
+          synchronizer, and each member has its own "synced" entry.
+       _buffers: The two buffers, dictionaries of the form
+          {(id(object), name): saved value}.
+       _front: The index of the buffer holding the latest complete snapshot.
+    """
+
+    def __init__(self, roots, skip=()):
+        """Initialises StateSnapshot.
+
+        Args:
+           roots: A list of the objects whose state must be saved.
+           skip: An optional tuple of classes that should not be visited, e.g.
+              objects that only hold references to the parts of the state
+              that have to be saved, or caches.
+        """
+
+        self.roots = roots
+        self.skip = tuple(skip)
+        self.taken = 0
+        self._objects = []
+        self._sizes = []
+        self._entries = None
+        self._buffers = [{}, {}]
+        self._front = 0
+
+    def _discover(self):
+        """Builds the list of the members that make up the state."""
+
+        self._objects = []
+        self._entries = []
+        visited = set()
+        stack = list(reversed(self.roots))
+        while len(stack) > 0:
+            obj = stack.pop()
+            if id(obj) in visited or isinstance(obj, self.skip):
+                continue
+            visited.add(id(obj))
+
+            if isinstance(obj, (list, tuple)):
+                stack.extend(reversed(obj))
+                continue
+            elif isinstance(obj, dict):
+                stack.extend(obj.values())
+                continue
+            elif isinstance(obj, Random):
+                self._entries.append(("prng", obj, "state"))
+                continue
+            elif not isinstance(obj, dobject):
+                continue
+
+            self._objects.append(obj)
+            for name, value in sorted(obj.__dict__.iteritems()):
+                vtype = type(value)
+                if vtype is ddirect:
+                    continue
+                elif isinstance(value, depend_base):
+                    if id(value) in visited:
+                        continue
+                    visited.add(id(value))
+                    if value._synchro is not None:
+                        if not id(value._synchro) in visited:
+                            visited.add(id(value._synchro))
+                            self._entries.append(("synchro", value._synchro, ""))
+                        # views share the name of the member they are taken from
+                        if value._synchro.synced.get(value._name) is value:
+                            self._entries.append(("synced", obj, name))
+                    elif value._func is None:
+                        self._entries.append(("depend", obj, name))
+                elif issubclass(vtype, np.ndarray) or issubclass(vtype, _SCALARS):
+                    self._entries.append(("plain", obj, name))
+                elif issubclass(vtype, (dobject, list, tuple, dict, Random)):
+                    stack.append(value)
+
+        self._sizes = [len(obj.__dict__) for obj in self._objects]
+
+    @staticmethod
+    def _copy(value, old):
+        """Returns a copy of value, reusing the memory of old if possible."""
+
+        if isinstance(value, np.ndarray):
+            value = dstrip(value)
+            if isinstance(old, np.ndarray) and old.shape == value.shape and old.dtype == value.dtype:
+                old[...] = value
+                return old
+            return value.copy()
+        return value
+
+    def take(self):
+        """Saves the current state in the back buffer, and makes it the front
+        buffer once the copy is complete."""
+
+        if self._entries is None or self._sizes != [len(obj.__dict__) for obj in self._objects]:
+            self._discover()
+
+        back = self._buffers[1 - self._front]
+        newbuffer = {}
+        for kind, obj, name in self._entries:
+            key = (id(obj), name)
+            if kind == "prng":
+                saved = obj.get_state()
+            elif kind == "synchro":
+                # the manually-set member of the group holds the state
+                saved = (obj.manual, self._copy(obj.synced[obj.manual].get(), back.get(key, (None, None))[1]))
+            elif kind == "depend" or kind == "synced":
+                saved = self._copy(obj.__dict__[name].get(), back.get(key))
+            else:
+                saved = self._copy(obj.__dict__[name], back.get(key))
+            newbuffer[key] = saved
+
+        self._buffers[1 - self._front] = newbuffer
+        self._front = 1 - self._front
+        self.taken += 1
+
+    @staticmethod
+    def _set(dobj, saved):
+        """Sets a depend object to a saved value, unless it is unchanged."""
+
+        current = dobj.get()
+        if isinstance(saved, np.ndarray):
+            if not np.array_equal(dstrip(current), saved):
+                dobj.set(saved.copy())
+        elif not current is saved:
+            dobj.set(saved)
+
+    def restore(self):
+        """Writes the latest complete snapshot back into the objects.
+
+        Members that have not changed are left untouched, so that the
+        quantities that depend on them are not recomputed needlessly.
+
+        Returns:
+           False if no snapshot has been taken yet, True otherwise.
+        """
+
+        if self.taken == 0:
+            return False
+
+        front = self._buffers[self._front]
+        for kind, obj, name in self._entries:
+            key = (id(obj), name)
+            if kind == "synced" or not key in front:
+                continue
+            saved = front[key]
+            if kind == "prng":
+                obj.set_state(saved)
+            elif kind == "synchro":
+                self._set(obj.synced[saved[0]], saved[1])
+            elif kind == "depend":
+                self._set(obj.__dict__[name], saved)
+            else:
+                current = obj.__dict__.get(name)
+                if isinstance(saved, np.ndarray):
+                    if isinstance(current, np.ndarray) and current.shape == saved.shape and current.dtype == saved.dtype:
+                        current[...] = saved
+                    else:
+                        obj.__dict__[name] = saved.copy()
+                else:
+                    obj.__dict__[name] = saved
+        return True
+
+    def copies(self):
+        """Returns copies of the objects holding the latest complete snapshot.
+
+        The objects themselves are left untouched, so this can be used while
+        they are being modified by another thread, e.g. to store the state
+        in the input representation. The visited dobjects are replaced by
+        shallow copies, in which the saved depend objects are replaced by
+        independent ones holding the saved values, and the depend objects that
+        are computed from others by new ones that compute their value from
+        the copies. Random number generators are replaced by new ones in the
+        saved state. Skipped objects are shared with the original objects.
+
+        Returns:
+           A list with the copies of the roots, or None if no snapshot has been
+           taken yet.
+        """
+
+        if self.taken == 0:
+            return None
+
+        # indexes the saved values by the id of the depend object or of the
+        # generator they belong to, and by (id(object), name) for plain members
+        front = self._buffers[self._front]
+        saved = {}
+        for kind, obj, name in self._entries:
+            key = (id(obj), name)
+            if kind == "synchro" or not key in front:
+                continue
+            elif kind == "prng":
+                saved[id(obj)] = front[key]
+            elif kind == "plain":
+                saved[key] = front[key]
+            else:
+                saved[id(obj.__dict__[name])] = front[key]
+
+        objects = set(id(obj) for obj in self._objects)
+        memo = {}
+        return [self._detach(root, objects, saved, memo) for root in self.roots]
+
+    def _detach(self, value, objects, saved, memo):
+        """Returns a copy of value that holds the saved state.
+
+        Args:
+           value: The object to be copied.
+           objects: The set of the ids of the dobjects to be copied.
+           saved: The saved values, as built by copies().
+           memo: A dictionary of the copies made so far, indexed by the id of
+              the original object.
+        """
+
+        vid = id(value)
+        if vid in memo:
+            return memo[vid]
+
+        if isinstance(value, dobject) and vid in objects:
+            copy = dobject.__new__(type(value))
+            memo[vid] = copy
+            for name, member in value.__dict__.iteritems():
+                if type(member) is ddirect:
+                    continue
+                elif (vid, name) in saved:
+                    member = saved[(vid, name)]
+                    copy.__dict__[name] = member.copy() if isinstance(member, np.ndarray) else member
+                else:
+                    copy.__dict__[name] = self._detach(member, objects, saved, memo)
+        elif isinstance(value, depend_base):
+            if vid in saved:
+                func = None
+                current = saved[vid]
+            elif value._func is not None and not isinstance(value._func, dict):
+                # computed once from the copies, the first time it is read
+                func = self._detach_func(value._func, objects, saved, memo)
+                current = dstrip(value) if isinstance(value, depend_array) else value._value
+            else:
+                memo[vid] = value
+                return value
+            if isinstance(value, depend_array):
+                copy = depend_array(name=value._name, value=np.array(current), func=func)
+            else:
+                copy = depend_value(name=value._name, value=current, func=func)
+        elif isinstance(value, Random) and vid in saved:
+            copy = Random(seed=value.seed, state=saved[vid])
+        elif type(value) is list or type(value) is tuple:
+            items = [self._detach(item, objects, saved, memo) for item in value]
+            if all(a is b for a, b in zip(items, value)):
+                copy = value
+            else:
+                copy = type(value)(items)
+        elif type(value) is dict:
+            items = dict((k, self._detach(v, objects, saved, memo)) for k, v in value.iteritems())
+            if all(items[k] is v for k, v in value.iteritems()):
+                copy = value
+            else:
+                copy = items
+        else:
+            copy = value
+
+        memo[vid] = copy
+        return copy
+
+    def _detach_func(self, func, objects, saved, memo):
+        """Returns func, acting on the copies rather than on the objects.
+
+        Bound methods are bound to the copy of their object, and the variables
+        that functions take from the enclosing scope are replaced by copies.
+        """
+
+        if isinstance(func, types.MethodType) and func.im_self is not None:
+            return types.MethodType(func.im_func, self._detach(func.im_self, objects, saved, memo), func.im_class)
+        elif isinstance(func, types.FunctionType) and func.func_closure is not None:
+            cells = tuple(_cell(self._detach(cell.cell_contents, objects, saved, memo)) for cell in func.func_closure)
+            return types.FunctionType(func.func_code, func.func_globals, func.func_name, func.func_defaults, cells)
+        return func
+
+
+def _cell(value):
+    """Returns a closure cell holding value."""
+
+    return (lambda: value).func_closure[0]
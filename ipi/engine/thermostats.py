@@ -198,12 +198,19 @@ class ThermoLangevin(Thermostat):
 class ThermoPILE_L(Thermostat):
     """Represents a PILE thermostat with a local centroid thermostat.
 
+    Each normal mode is coupled to a Langevin thermostat with its own friction.
+    Rather than using one ThermoLangevin object per mode, the drift and noise
+    coefficients of all the modes are kept in two arrays, so that a step is
+    done with a handful of array operations and a single draw of the Gaussian
+    noise for all the modes. The random numbers are drawn in the same order
+    as by a sequence of Langevin thermostats, one per mode.
+
     Attributes:
-       _thermos: The list of the different thermostats for all the ring polymer
-          normal modes.
        nm: A normal modes object to attach the thermostat to.
        prng: Random number generator used in the stochastic integration
           algorithms.
+       bindcentroid: Whether the centroid mode is thermostatted here (True),
+          or by a different thermostat (False, as in PILE_G).
 
     Depend objects:
        tau: Centroid thermostat damping time scale. Larger values give a
@@ -213,6 +220,11 @@ class ThermoPILE_L(Thermostat):
           temperature.
        pilescale: A float used to reduce the intensity of the PILE thermostat if
           required.
+       T: The drift coefficients of the normal modes. Depends on tau, tauk
+          and the time step.
+       S: The noise coefficients of the normal modes. Depends on T and the
+          temperature.
+       sm: The square root of the dynamical masses of the normal modes.
     """
 
     def __init__(self, temp=1.0, dt=1.0, tau=1.0, ethermo=0.0, scale=1.0):
@@ -241,10 +253,10 @@ class ThermoPILE_L(Thermostat):
     def bind(self, beads=None, atoms=None, pm=None, nm=None, prng=None, bindcentroid=True, fixdof=None):
         """Binds the appropriate degrees of freedom to the thermostat.
 
-        This takes a beads object with degrees of freedom, and makes its momentum
-        and mass vectors members of the thermostat. It also then creates the
-        objects that will hold the data needed in the thermostat algorithms
-        and the dependency network.
+        This takes a normal modes object with degrees of freedom, and makes
+        its momentum and mass vectors members of the thermostat. It also then
+        creates the objects that will hold the data needed in the thermostat
+        algorithms and the dependency network.
 
         Gives the interface for both the PILE_L and PILE_G thermostats, which
         only differ in their treatment of the centroid coordinate momenta.
@@ -275,61 +287,17 @@ class ThermoPILE_L(Thermostat):
         else:
             self.prng = prng
 
-        prev_ethermo = self.ethermo
-
-        # creates a set of thermostats to be applied to individual normal modes
-        self._thermos = [ThermoLangevin(temp=1, dt=1, tau=1) for b in range(nm.nbeads)]
-        # optionally does not bind the centroid, so we can re-use all of this
-        # in the PILE_G case
-        if not bindcentroid:
-            self._thermos[0] = None
-
         self.nm = nm
+        self.bindcentroid = bindcentroid
 
         dself.tauk = depend_array(name="tauk", value=np.zeros(nm.nbeads - 1, float),
                                   func=self.get_tauk, dependencies=[dself.pilescale, dd(nm).dynomegak])
-
-        # must pipe all the dependencies in such a way that values for the nm thermostats
-        # are automatically updated based on the "master" thermostat
-        def make_taugetter(k):
-            return lambda: self.tauk[k - 1]
-        it = 0
-        nm.pnm.hold()
-        for t in self._thermos:
-            if t is None:
-                it += 1
-                continue
-            if it > 0:
-                fixdof = None  # only the centroid thermostat may have constraints
-
-            # bind thermostat t to the it-th bead
-
-            t.bind(pm=(nm.pnm[it, :], nm.dynm3[it, :]), prng=self.prng, fixdof=fixdof)
-            # pipes temp and dt
-            dpipe(dself.temp, dd(t).temp)
-            dpipe(dself.dt, dd(t).dt)
-
-            # for tau it is slightly more complex
-            if it == 0:
-                dpipe(dself.tau, dd(t).tau)
-            else:
-                # Here we manually connect _thermos[i].tau to tauk[i].
-                # Simple and clear.
-                dd(t).tau.add_dependency(dself.tauk)
-                dd(t).tau._func = make_taugetter(it)
-            dself.ethermo.add_dependency(dd(t).ethermo)
-            dself.ethermo.hold()  # will manually update ethermo when needed!
-            it += 1
-
-        # since the ethermo will be "delegated" to the normal modes thermostats,
-        # one has to split
-        # any previously-stored value between the sub-thermostats
-        if bindcentroid:
-            for t in self._thermos:
-                t.ethermo = prev_ethermo / nm.nbeads
-            dself.ethermo._func = self.get_ethermo;
-            # if we are not binding the centroid just yet, this bit of the piping
-            # is delegated to the function which is actually calling this
+        dself.T = depend_array(name="T", value=np.zeros(nm.nbeads, float),
+                               func=self.get_T, dependencies=[dself.tau, dself.tauk, dself.dt])
+        dself.S = depend_array(name="S", value=np.zeros(nm.nbeads, float),
+                               func=self.get_S, dependencies=[dself.temp, dself.T])
+        dself.sm = depend_array(name="sm", value=np.zeros((nm.nbeads, 3 * nm.natoms), float),
+                                func=self.get_sm, dependencies=[dd(nm).dynm3])
 
     def get_tauk(self):
         """Computes the thermostat damping time scale for the non-centroid
@@ -340,27 +308,56 @@ class ThermoPILE_L(Thermostat):
         """
 
         # Also include an optional scaling factor to reduce the intensity of NM thermostats
-        return np.array([1.0 / (2 * self.pilescale * self.nm.dynomegak[k]) for k in range(1, len(self._thermos))])
+        return np.array([1.0 / (2 * self.pilescale * self.nm.dynomegak[k]) for k in range(1, self.nm.nbeads)])
 
-    def get_ethermo(self):
-        """Computes the total energy transferred to the heat bath for all the
-        thermostats.
-        """
+    def get_T(self):
+        """Calculates the coefficients of the drift of the normal mode
+        velocities, the centroid first."""
 
-        et = 0.0;
-        for t in self._thermos:
-            et += t.ethermo
-        return et
+        tau = np.concatenate(([self.tau], dstrip(self.tauk)))
+        return np.exp(-0.5 * self.dt / tau)
+
+    def get_S(self):
+        """Calculates the coefficients of the white noise of the normal modes."""
+
+        return np.sqrt(Constants.kb * self.temp * (1 - dstrip(self.T)**2))
+
+    def get_sm(self):
+        """Retrieves the square root of the dynamical masses."""
+
+        return np.sqrt(dstrip(self.nm.dynm3))
 
     def step(self):
         """Updates the bound momentum vector with a PILE thermostat."""
 
-        self.nm.pnm.hold()
-        # super-cool! just loop over the thermostats! it's as easy as that!
-        for t in self._thermos:
-            t.step()
-        self.nm.pnm.resume()
-        dd(self).ethermo.resume()
+        pnm = dstrip(self.nm.pnm).copy()
+        self.pnm_step(pnm)
+        self.nm.pnm = pnm
+
+    def pnm_step(self, pnm):
+        """Applies the PILE thermostat in place to a raw array of normal mode
+        momenta, rather than to nm.pnm.
+
+        Args:
+           pnm: A plain (nbeads, 3*natoms) array of normal mode momenta.
+        """
+
+        k0 = 0 if self.bindcentroid else 1
+        p = pnm[k0:]
+        sm = dstrip(self.sm)[k0:]
+        T = dstrip(self.T)[k0:, np.newaxis]
+        S = dstrip(self.S)[k0:, np.newaxis]
+
+        p /= sm
+
+        et = np.dot(p.reshape(-1), p.reshape(-1)) * 0.5
+        p *= T
+        p += S * self.prng.gvec(p.shape)
+        et -= np.dot(p.reshape(-1), p.reshape(-1)) * 0.5
+
+        p *= sm
+
+        self.ethermo += et
 
 
 class ThermoSVR(Thermostat):
@@ -437,6 +434,9 @@ class ThermoPILE_G(ThermoPILE_L):
 
     Simply replaces the Langevin thermostat for the centroid normal mode with
     a global velocity rescaling thermostat.
+
+    Attributes:
+       _centroid: The SVR thermostat attached to the centroid mode.
     """
 
     def __init__(self, temp=1.0, dt=1.0, tau=1.0, ethermo=0.0, scale=1.0):
@@ -478,25 +478,72 @@ class ThermoPILE_G(ThermoPILE_L):
 
         """
 
-        # first binds as a local PILE, then substitutes the thermostat on the centroid
-        prev_ethermo = self.ethermo
+        # first binds as a local PILE, then adds the thermostat on the centroid
         super(ThermoPILE_G, self).bind(nm=nm, prng=prng, bindcentroid=False, fixdof=fixdof)
         dself = dd(self)
 
-        # centroid thermostat
-        self._thermos[0] = ThermoSVR(temp=1, dt=1, tau=1)
+        # centroid thermostat. the heat it exchanges is moved to ethermo after
+        # each step, so it always starts from zero
+        self._centroid = ThermoSVR(temp=1, dt=1, tau=1)
 
-        t = self._thermos[0]
+        t = self._centroid
         t.bind(pm=(nm.pnm[0, :], nm.dynm3[0, :]), prng=self.prng, fixdof=fixdof)
         dpipe(dself.temp, dd(t).temp)
         dpipe(dself.dt, dd(t).dt)
         dpipe(dself.tau, dd(t).tau)
-        dself.ethermo.add_dependency(dd(t).ethermo)
 
-        # splits any previous ethermo between the thermostats, and finishes to bind ethermo to the sum function
-        for t in self._thermos:
-            t.ethermo = prev_ethermo / nm.nbeads
-        dself.ethermo._func = self.get_ethermo;
+    def step(self):
+        """Updates the bound momentum vector with a PILE thermostat, with a
+        global thermostat on the centroid."""
+
+        t = self._centroid
+        t.step()
+        et = t.ethermo
+        t.ethermo = 0.0
+
+        super(ThermoPILE_G, self).step()
+        self.ethermo += et
+
+
+def gle_buffers(shape):
+    """Allocates the work arrays needed by gle_propagate.
+
+    The arrays are returned in a tuple, as they are scratch space rather than
+    part of the state of the thermostat.
+
+    Args:
+       shape: The shape of the array of the extended momenta.
+    """
+
+    return (np.zeros(shape, float), np.zeros(shape, float))
+
+
+def gle_propagate(T, S, s, prng, work):
+    """Applies in place the GLE propagator to the extended momenta.
+
+    Computes s = T.s + S.xi, where xi are Gaussian random numbers. Works both
+    for a single GLE, with T and S of shape (ns+1, ns+1) and s of shape
+    (ns+1, n), and for a stack of independent GLEs, e.g. one per normal mode,
+    with T and S of shape (nb, ns+1, ns+1) and s of shape (nb, ns+1, n). In
+    the latter case the random numbers are drawn in the same order as by
+    a sequence of single GLE steps.
+
+    Args:
+       T: The drift matrix (or matrices) of the propagator.
+       S: The noise matrix (or matrices) of the propagator.
+       s: The array of the extended momenta.
+       prng: The random number generator.
+       work: A tuple of two arrays with the same shape as s, as returned by
+          gle_buffers.
+    """
+
+    if s.ndim == 2:
+        np.dot(T, s, out=work[0])
+        np.dot(S, prng.gvec(s.shape), out=work[1])
+    else:
+        np.matmul(T, s, out=work[0])
+        np.matmul(S, prng.gvec(s.shape), out=work[1])
+    np.add(work[0], work[1], out=s)
 
 
 class ThermoGLE(Thermostat):
@@ -635,18 +682,19 @@ class ThermoGLE(Thermostat):
         else:
             info("GLE additional DOFs initialised from input.", verbosity.medium)
 
+        self._work = gle_buffers(self.s.shape)
+
     def step(self):
         """Updates the bound momentum vector with a GLE thermostat"""
 
-        p = dstrip(self.p).copy()
-
-        self.s[0, :] = self.p / self.sm
+        s = self.s
+        s[0, :] = dstrip(self.p) / dstrip(self.sm)
 
-        self.ethermo += np.dot(self.s[0], self.s[0]) * 0.5
-        self.s[:] = np.dot(self.T, self.s) + np.dot(self.S, self.prng.gvec(self.s.shape))
-        self.ethermo -= np.dot(self.s[0], self.s[0]) * 0.5
+        self.ethermo += np.dot(s[0], s[0]) * 0.5
+        gle_propagate(dstrip(self.T), dstrip(self.S), s, self.prng, self._work)
+        self.ethermo -= np.dot(s[0], s[0]) * 0.5
 
-        self.p = self.s[0] * self.sm
+        self.p = s[0] * dstrip(self.sm)
 
 
 class ThermoNMGLE(Thermostat):
@@ -654,13 +702,16 @@ class ThermoNMGLE(Thermostat):
 
     An extension to the GLE thermostat which is applied in the
     normal modes representation, and which allows to use a different
-    GLE for each normal mode
+    GLE for each normal mode. The propagators of all the modes are kept in
+    stacked arrays, so that all the modes are propagated with one batched
+    matrix product.
 
     Attributes:
        ns: The number of auxilliary degrees of freedom.
        nb: The number of beads.
        s: An array holding all the momenta, including the ones for the
-          auxilliary degrees of freedom.
+          auxilliary degrees of freedom, with shape (nb, ns+1, 3*natoms).
+       nm: The normal modes object the thermostat is attached to.
 
     Depend objects:
        A: Drift matrix giving the damping time scales for all the different
@@ -670,6 +721,10 @@ class ThermoNMGLE(Thermostat):
           diffusion matrix, giving the strength of the coupling of the system
           with the heat bath, and thus the size of the stochastic
           contribution of the thermostat.
+       T: The drift matrices of all the normal modes. Depends on A and the
+          time step.
+       S: The noise matrices of all the normal modes. Depends on C and T.
+       sm: The square root of the dynamical masses of the normal modes.
     """
 
     def get_C(self):
@@ -680,6 +735,26 @@ class ThermoNMGLE(Thermostat):
             rv[b] = np.identity(self.ns + 1, float) * self.temp
         return rv[:]
 
+    def get_T(self):
+        """Calculates the matrices for the overall drift of the velocities."""
+
+        return np.array([matrix_exp(-0.5 * self.dt * self.A[b]) for b in range(self.nb)])
+
+    def get_S(self):
+        """Calculates the matrices for the coloured noise."""
+
+        rv = np.zeros((self.nb, self.ns + 1, self.ns + 1), float)
+        for b in range(self.nb):
+            T = self.T[b]
+            SST = Constants.kb * (self.C[b] - np.dot(T, np.dot(self.C[b], T.T)))
+            rv[b] = root_herm(SST)
+        return rv
+
+    def get_sm(self):
+        """Retrieves the square root of the dynamical masses."""
+
+        return np.sqrt(dstrip(self.nm.dynm3))
+
     def __init__(self, temp=1.0, dt=1.0, A=None, C=None, ethermo=0.0):
         """Initialises ThermoGLE.
 
@@ -714,6 +789,13 @@ class ThermoNMGLE(Thermostat):
         else:
             dself.C = depend_value(value=C.copy(), name='C')
 
+        dself.T = depend_value(name="T", func=self.get_T,
+                               dependencies=[dself.A, dself.dt])
+        dself.S = depend_value(name="S", func=self.get_S,
+                               dependencies=[dself.C, dself.T])
+
+        self.s = np.zeros(0)
+
     def bind(self, beads=None, atoms=None, pm=None, nm=None, prng=None, fixdof=None):
         """Binds the appropriate degrees of freedom to the thermostat.
 
@@ -762,61 +844,26 @@ class ThermoNMGLE(Thermostat):
         else:
             info("GLE additional DOFs initialised from input.", verbosity.medium)
 
-        prev_ethermo = self.ethermo
-
-        # creates a set of thermostats to be applied to individual normal modes
-        self._thermos = [ThermoGLE(temp=1, dt=1, A=self.A[b], C=self.C[b]) for b in range(self.nb)]
-
-        # must pipe all the dependencies in such a way that values for the nm
-        # thermostats are automatically updated based on the "master" thermostat
-        def make_Agetter(k):
-            return lambda: self.A[k]
-
-        def make_Cgetter(k):
-            return lambda: self.C[k]
-
-        it = 0
-        for t in self._thermos:
-            t.s = self.s[it]  # gets the s's as a slice of self.s
-            t.bind(pm=(nm.pnm[it, :], nm.dynm3[it, :]), prng=self.prng)  # bind thermostat t to the it-th normal mode
-
-            # pipes temp and dt
-            dpipe(dself.temp, dd(t).temp)
-            dpipe(dself.dt, dd(t).dt)
-
-            # here we pipe the A and C of individual NM to the "master" arrays
-            dd(t).A.add_dependency(dself.A)
-            dd(t).A._func = make_Agetter(it)
-            dd(t).C.add_dependency(dself.C)
-            dd(t).C._func = make_Cgetter(it)
-            dself.ethermo.add_dependency(dd(t).ethermo)
-            it += 1
-
-        # since the ethermo will be "delegated" to the normal modes thermostats,
-        # one has to split
-        # any previously-stored value between the sub-thermostats
-        for t in self._thermos:
-            t.ethermo = prev_ethermo / self.nb
-
-        dself.ethermo._func = self.get_ethermo;
+        self.nm = nm
+        dself.sm = depend_array(name="sm", value=np.zeros((self.nb, 3 * nm.natoms), float),
+                                func=self.get_sm, dependencies=[dd(nm).dynm3])
+        self._work = gle_buffers(self.s.shape)
 
     def step(self):
-        """Updates the thermostat in NM representation by looping over the
-        individual DOFs.
+        """Updates the thermostat in NM representation, propagating all the
+        normal modes at once.
         """
 
-        for t in self._thermos:
-            t.step()
+        s = self.s
+        sm = dstrip(self.sm)
+        s[:, 0, :] = dstrip(self.nm.pnm) / sm
 
-    def get_ethermo(self):
-        """Computes the total energy transferred to the heat bath for all the nm
-        thermostats.
-        """
+        et = np.dot(s[:, 0, :].reshape(-1), s[:, 0, :].reshape(-1)) * 0.5
+        gle_propagate(dstrip(self.T), dstrip(self.S), s, self.prng, self._work)
+        et -= np.dot(s[:, 0, :].reshape(-1), s[:, 0, :].reshape(-1)) * 0.5
 
-        et = 0.0;
-        for t in self._thermos:
-            et += t.ethermo
-        return et
+        self.nm.pnm = s[:, 0, :] * sm
+        self.ethermo += et
 
 
 class ThermoNMGLEG(ThermoNMGLE):
@@ -826,6 +873,9 @@ class ThermoNMGLEG(ThermoNMGLE):
     velocity rescaling to the centroid. Allows kinetic energy as well as
     potential energy sampling optimization.
 
+    Attributes:
+       _centroid: The SVR thermostat attached to the centroid mode.
+
     Depend objects:
        tau: Thermostat damping time scale. Larger values give a less strongly
           coupled thermostat.
@@ -834,6 +884,7 @@ class ThermoNMGLEG(ThermoNMGLE):
     def __init__(self, temp=1.0, dt=1.0, A=None, C=None, tau=1.0, ethermo=0.0):
 
         super(ThermoNMGLEG, self).__init__(temp, dt, A, C, ethermo)
+        dself = dd(self)
         dself.tau = depend_value(value=tau, name='tau')
 
     def bind(self, beads=None, atoms=None, pm=None, nm=None, prng=None, fixdof=None):
@@ -855,6 +906,7 @@ class ThermoNMGLEG(ThermoNMGLE):
         """
 
         super(ThermoNMGLEG, self).bind(nm=nm, prng=prng, fixdof=fixdof)
+        dself = dd(self)
 
         t = ThermoSVR(self.temp, self.dt, self.tau)
 
@@ -865,8 +917,21 @@ class ThermoNMGLEG(ThermoNMGLE):
         dpipe(dself.dt, dd(t).dt)
         dpipe(dself.tau, dd(t).tau)
 
-        dd(self).ethermo.add_dependency(dd(t).ethermo)
-        self._thermos.append(t)
+        # the heat exchanged by the centroid thermostat is moved to ethermo
+        # after each step, so it always starts from zero
+        self._centroid = t
+
+    def step(self):
+        """Updates the thermostat in NM representation, then applies the global
+        thermostat to the centroid.
+        """
+
+        super(ThermoNMGLEG, self).step()
+
+        t = self._centroid
+        t.step()
+        self.ethermo += t.ethermo
+        t.ethermo = 0.0
 
 
 class ThermoCL(Thermostat):
@@ -1028,7 +1093,7 @@ class MultiThermo(Thermostat):
             t.bind(beads=beads, atoms=atoms, pm=pm, nm=nm, prng=prng, fixdof=fixdof)
             dd(self).ethermo.add_dependency(dd(t).ethermo)
 
-        dd(self).ethermo._func = self.get_ethermo
+        dd(self).ethermo.set_func(self.get_ethermo)
 
     def step(self):
         """Steps through all sub-thermostats."""
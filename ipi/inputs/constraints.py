@@ -0,0 +1,83 @@
+"""Creates objects that deal with holonomic constraints."""
+
+# This file is part of i-PI.
+# i-PI Copyright (C) 2014-2017 i-PI developers
+# See the "licenses" directory for full license information.
+
+
+import numpy as np
+
+from ipi.engine.constraints import Constraints
+from ipi.utils.inputvalue import *
+
+
+__all__ = ['InputConstraints']
+
+
+class InputConstraints(Input):
+    """Holonomic constraints input class.
+
+    Handles generating the constraints object from the xml input file, and
+    generating the xml checkpoint tags and data from an instance of the object.
+
+    Fields:
+       bonds: An optional array with the pairs of atom indices whose distance
+          is constrained.
+       lengths: An optional array with the constrained bond lengths.
+       angles: An optional array with the triplets of atom indices that make
+          up the constrained angles.
+       values: An optional array with the constrained angles, in radians.
+       tolerance: The relative tolerance on the constrained distances.
+       maxcycles: The maximum number of iterations of the SHAKE solver.
+    """
+
+    fields = {"bonds": (InputArray, {"dtype": int,
+                                     "default": input_default(factory=np.zeros, args=(0, int)),
+                                     "help": "The indices of the pairs of atoms whose distance is kept fixed, as a flat list [i1, j1, i2, j2, ...]."}),
+              "lengths": (InputArray, {"dtype": float,
+                                       "default": input_default(factory=np.zeros, args=(0,)),
+                                       "help": "The lengths of the constrained bonds. If not given, they are taken from the initial centroid positions.",
+                                       "dimension": "length"}),
+              "angles": (InputArray, {"dtype": int,
+                                      "default": input_default(factory=np.zeros, args=(0, int)),
+                                      "help": "The indices of the triplets of atoms whose angle is kept fixed, as a flat list [i1, j1, k1, i2, j2, k2, ...], the central atom being the second of each triplet. The bonds i-j and j-k must be constrained as well."}),
+              "values": (InputArray, {"dtype": float,
+                                      "default": input_default(factory=np.zeros, args=(0,)),
+                                      "help": "The values of the constrained angles, in radians. If not given, they are taken from the initial centroid positions."}),
+              "tolerance": (InputValue, {"dtype": float,
+                                         "default": 1e-8,
+                                         "help": "The relative tolerance on the constrained distances."}),
+              "maxcycles": (InputValue, {"dtype": int,
+                                         "default": 100,
+                                         "help": "The maximum number of iterations used to satisfy the constraints on the positions."})
+              }
+
+    default_help = "Holonomic constraints on bond lengths and angles, enforced with the RATTLE algorithm. Only supported by the nve and nvt dynamics modes."
+    default_label = "CONSTRAINTS"
+
+    def store(self, constraints):
+        """Takes a constraints instance and stores a minimal representation of it.
+
+        Args:
+           constraints: A constraints object.
+        """
+
+        super(InputConstraints, self).store(constraints)
+        self.bonds.store(constraints.bonds.flatten())
+        self.lengths.store(constraints.lengths)
+        self.angles.store(constraints.angles.flatten())
+        self.values.store(constraints.values)
+        self.tolerance.store(constraints.tolerance)
+        self.maxcycles.store(constraints.maxcycles)
+
+    def fetch(self):
+        """Creates a constraints object.
+
+        Returns:
+           A constraints object with the bonds and angles given in the input.
+        """
+
+        super(InputConstraints, self).fetch()
+        return Constraints(bonds=self.bonds.fetch(), lengths=self.lengths.fetch(),
+                           angles=self.angles.fetch(), values=self.values.fetch(),
+                           tolerance=self.tolerance.fetch(), maxcycles=self.maxcycles.fetch())
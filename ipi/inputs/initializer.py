@@ -152,8 +152,8 @@ class InputInitPositions(InputInitIndexed):
 
     attribs = deepcopy(InputInitIndexed.attribs)
     attribs["mode"][1]["default"] = "chk"
-    attribs["mode"][1]["options"] = ["manual", "xyz", "pdb", "chk"]
-    attribs["mode"][1]["help"] = "The input data format. 'xyz' and 'pdb' stand for xyz and pdb input files respectively. 'chk' stands for initialization from a checkpoint file. 'manual' means that the value to initialize from is giving explicitly as a vector."
+    attribs["mode"][1]["options"] = ["manual", "xyz", "pdb", "chk", "npy"]
+    attribs["mode"][1]["help"] = "The input data format. 'xyz' and 'pdb' stand for xyz and pdb input files respectively. 'chk' stands for initialization from a checkpoint file. 'manual' means that the value to initialize from is giving explicitly as a vector. 'npy' means that the vector is read from a numpy binary file, or from a numpy archive if the file name is followed by ':key'."
 
     default_label = "INITPOSITIONS"
     default_help = "This is the class to initialize positions."
@@ -165,7 +165,7 @@ class InputInitMomenta(InputInitPositions):
 
     attribs = deepcopy(InputInitPositions.attribs)
     attribs["mode"][1]["options"].append("thermal")
-    attribs["mode"][1]["help"] = "The input data format. 'xyz' and 'pdb' stand for xyz and pdb input files respectively. 'chk' stands for initialization from a checkpoint file. 'manual' means that the value to initialize from is giving explicitly as a vector. 'thermal' means that the data is to be generated from a Maxwell-Boltzmann distribution at the given temperature."
+    attribs["mode"][1]["help"] = "The input data format. 'xyz' and 'pdb' stand for xyz and pdb input files respectively. 'chk' stands for initialization from a checkpoint file. 'manual' means that the value to initialize from is giving explicitly as a vector. 'npy' means that the vector is read from a numpy binary file, or from a numpy archive if the file name is followed by ':key'. 'thermal' means that the data is to be generated from a Maxwell-Boltzmann distribution at the given temperature."
 
     default_label = "INITMOMENTA"
     default_help = "This is the class to initialize momenta."
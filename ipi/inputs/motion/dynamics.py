@@ -10,6 +10,8 @@ import ipi.engine.barostats
 from ipi.utils.inputvalue import InputDictionary, InputAttribute, InputValue, InputArray, input_default
 from ipi.inputs.barostats import InputBaro
 from ipi.inputs.thermostats import InputThermo
+from ipi.inputs.constraints import InputConstraints
+import ipi.engine.constraints
 
 
 __all__ = ['InputDynamics']
@@ -25,6 +27,8 @@ class InputDynamics(InputDictionary):
     Attributes:
         mode: An optional string giving the mode (ensemble) to be simulated.
             Defaults to 'unknown'.
+        fused: An optional boolean giving whether the integrator should work
+            on raw normal mode arrays. Defaults to False.
 
     Fields:
         thermostat: The thermostat to be used for constant temperature dynamics.
@@ -32,13 +36,17 @@ class InputDynamics(InputDictionary):
             dynamics.
         timestep: An optional float giving the size of the timestep in atomic
             units. Defaults to 1.0.
+        constraints: The holonomic constraints on bond lengths and angles.
     """
 
     attribs = {
         "mode": (InputAttribute, {"dtype": str,
                                   "default": 'nve',
                                   "help": "The ensemble that will be sampled during the simulation. ",
-                                  "options": ['nve', 'nvt', 'npt', 'nst', 'mts', 'sc']})
+                                  "options": ['nve', 'nvt', 'npt', 'nst', 'mts', 'sc']}),
+        "fused": (InputAttribute, {"dtype": bool,
+                                   "default": False,
+                                   "help": "Whether each step of the nve and nvt integrators should work on raw normal mode arrays rather than through the dependency network. Faster, and equivalent up to round-off errors. Only supports the pile_l thermostat and a single MTS level."})
     }
 
     fields = {
@@ -52,7 +60,9 @@ class InputDynamics(InputDictionary):
                                   "dimension": "time"}),
         "nmts": (InputArray, {"dtype": int,
                               "default": np.zeros(0, int),
-                              "help": "Number of iterations for each MTS level (including the outer loop, that should in most cases have just one iteration)."})
+                              "help": "Number of iterations for each MTS level (including the outer loop, that should in most cases have just one iteration)."}),
+        "constraints": (InputConstraints, {"default": input_default(factory=ipi.engine.constraints.Constraints),
+                                           "help": InputConstraints.default_help})
     }
 
     dynamic = {}
@@ -71,10 +81,12 @@ class InputDynamics(InputDictionary):
             return
 
         self.mode.store(dyn.enstype)
+        self.fused.store(dyn.fused)
         self.timestep.store(dyn.dt)
         self.thermostat.store(dyn.thermostat)
         self.barostat.store(dyn.barostat)
         self.nmts.store(dyn.nmts)
+        self.constraints.store(dyn.constraints)
 
     def fetch(self):
         """Creates an ensemble object.
@@ -86,4 +98,5 @@ class InputDynamics(InputDictionary):
 
         rv = super(InputDynamics, self).fetch()
         rv["mode"] = self.mode.fetch()
+        rv["fused"] = self.fused.fetch()
         return rv
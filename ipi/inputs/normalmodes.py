@@ -76,13 +76,17 @@ class InputNormalModes(Input):
             when creating the mass matrix.
         transform: Specifies whether the normal mode calculation will be
             done using a FFT transform or a matrix multiplication.
+        n_threads: The number of threads used by the FFT transform.
     """
 
     attribs = {
         "transform": (InputValue, {"dtype": str,
                                    "default": "fft",
                                    "help": "Specifies whether to calculate the normal mode transform using a fast Fourier transform or a matrix multiplication. For small numbers of beads the matrix multiplication may be faster.",
-                                   "options": ['fft', 'matrix']})
+                                   "options": ['fft', 'matrix']}),
+        "n_threads": (InputValue, {"dtype": int,
+                                   "default": 1,
+                                   "help": "The number of threads used by the fast Fourier transform. Only used if PyFFTW is available."})
     }
 
     fields = {
@@ -97,9 +101,17 @@ class InputNormalModes(Input):
 
     def store(self, nm):
         self.transform.store(nm.transform_method)
+        self.n_threads.store(nm.n_threads)
         self.frequencies.store((nm.mode, nm.nm_freqs))
         self.open_paths.store(nm.open_paths)
 
+    def check(self):
+        """Checks for optional parameters."""
+
+        super(InputNormalModes, self).check()
+        if self.n_threads.fetch() < 1:
+            raise ValueError("The number of threads for the normal mode transform must be positive.")
+
     def fetch(self):
         mode, freqs = self.frequencies.fetch()
-        return NormalModes(mode, self.transform.fetch(), freqs, open_paths=self.open_paths.fetch())
+        return NormalModes(mode, self.transform.fetch(), freqs, open_paths=self.open_paths.fetch(), n_threads=self.n_threads.fetch())
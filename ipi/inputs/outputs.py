@@ -12,6 +12,7 @@ import numpy as np
 from ipi.utils.depend import *
 from ipi.utils.inputvalue import *
 from ipi.engine.properties import getkey
+from ipi.utils.io import COMPRESSION
 import ipi.engine.outputs as eoutputs
 
 
@@ -31,6 +32,10 @@ class InputProperties(InputArray):
        flush: An integer describing how often the output streams are flushed,
           so that it doesn't wait for the buffer to fill before outputting to
           file.
+       background: Whether the output is written by a background thread.
+       durability: How the output is pushed to disk.
+       sync_interval: The minimum time between syncs, for periodic durability.
+       format: Whether the file is written as text or binary.
     """
 
     default_help = """This class deals with the output of properties to one file. Between each property tag there should be an array of strings, each of which specifies one property to be output."""
@@ -43,6 +48,16 @@ class InputProperties(InputArray):
                                           "help": "The number of steps between successive writes."})
     attribs["flush"] = (InputAttribute, {"dtype": int, "default": 1,
                                          "help": "How often should streams be flushed. 1 means each time, zero means never."})
+    attribs["background"] = (InputAttribute, {"dtype": bool, "default": False,
+                                              "help": "If true, the output is formatted and written to disk by a background thread, so that the simulation does not have to wait for the file system. Soft exits wait for all the pending output to be written."})
+    attribs["durability"] = (InputAttribute, {"dtype": str, "default": "fsync",
+                                              "options": eoutputs.DURABILITY,
+                                              "help": "How the output is pushed to disk. 'none' leaves it in a large buffer, that is written when full. 'flush' hands it to the operating system every 'flush' writes, and 'fsync' also waits for it to reach the disk. 'periodic' syncs it to disk at most once every 'sync_interval' seconds."})
+    attribs["sync_interval"] = (InputAttribute, {"dtype": float, "default": 10.0,
+                                                 "help": "The minimum time, in seconds, between two syncs of the output when durability is 'periodic'."})
+    attribs["format"] = (InputAttribute, {"dtype": str, "default": "text",
+                                          "options": ["text", "binary"],
+                                          "help": "The format of the file. 'text' writes one line per frame, after a header that describes the columns. 'binary' writes one record of float64 values per frame, after a header that holds the names, units and dimensions of the properties. Binary files are smaller, faster to write, and can be read through a memory map with the PropertyFile class in ipi/utils/io/io_properties.py or by the tools."})
 
     def __init__(self, help=None, default=None, dtype=None, dimension=None):
         """Initializes InputProperties.
@@ -56,7 +71,9 @@ class InputProperties(InputArray):
         """Returns a PropertyOutput object."""
 
         return eoutputs.PropertyOutput(filename=self.filename.fetch(),
-                                       stride=self.stride.fetch(), flush=self.flush.fetch(), outlist=super(InputProperties, self).fetch())
+                                       stride=self.stride.fetch(), flush=self.flush.fetch(), outlist=super(InputProperties, self).fetch(),
+                                       background=self.background.fetch(), durability=self.durability.fetch(),
+                                       sync_interval=self.sync_interval.fetch(), format=self.format.fetch())
 
     def store(self, prop):
         """Stores a PropertyOutput object."""
@@ -65,6 +82,10 @@ class InputProperties(InputArray):
         self.stride.store(prop.stride)
         self.flush.store(prop.flush)
         self.filename.store(prop.filename)
+        self.background.store(prop.background)
+        self.durability.store(prop.durability)
+        self.sync_interval.store(prop.sync_interval)
+        self.format.store(prop.format)
 
     def check(self):
         """Checks for optional parameters."""
@@ -72,6 +93,8 @@ class InputProperties(InputArray):
         super(InputProperties, self).check()
         if self.stride.fetch() < 0:
             raise ValueError("The stride length for the properties file output must be positive.")
+        if self.sync_interval.fetch() < 0:
+            raise ValueError("The sync interval for the properties file output must be positive.")
 
 
 class InputTrajectory(InputValue):
@@ -91,6 +114,13 @@ class InputTrajectory(InputValue):
        flush: An integer describing how often the output streams are flushed,
           so that it doesn't wait for the buffer to fill before outputting to
           file.
+       background: Whether the output is written by a background thread.
+       durability: How the output is pushed to disk.
+       sync_interval: The minimum time between syncs, for periodic durability.
+       compression: The compression of the output file.
+       precision: The resolution of the data in the 'fixed' format. It has
+          no default, and must be given for 'fixed' trajectories.
+       bundle: Whether all the beads are written to a single file.
     """
 
     default_help = """This class defines how one trajectory file should be output. Between each trajectory tag one string should be given, which specifies what data is to be output."""
@@ -102,14 +132,28 @@ class InputTrajectory(InputValue):
     attribs["stride"] = (InputAttribute, {"dtype": int, "default": 1,
                                           "help": "The number of steps between successive writes."})
     attribs["format"] = (InputAttribute, {"dtype": str, "default": "xyz",
-                                          "help": "The output file format.",
-                                          "options": ['xyz', 'pdb']})
+                                          "help": "The output file format. 'binary' stores the data in double precision, in records that can be located without reading the data, so that the frames can be accessed directly through a memory map with the BinaryTrajectory class in ipi/utils/io/backends/io_binary.py. 'fixed' is a lossy binary format, that stores the data rounded to 'precision' in a few bytes per value. All formats are read back transparently by the i-PI tools and by replay, also when compressed.",
+                                          "options": ['xyz', 'pdb', 'binary', 'fixed']})
     attribs["cell_units"] = (InputAttribute, {"dtype": str, "default": "",
                                               "help": "The units for the cell dimensions."})
     attribs["bead"] = (InputAttribute, {"dtype": int, "default": -1,
                                         "help": "Print out only the specified bead. A negative value means print all."})
     attribs["flush"] = (InputAttribute, {"dtype": int, "default": 1,
                                          "help": "How often should streams be flushed. 1 means each time, zero means never."})
+    attribs["background"] = (InputAttribute, {"dtype": bool, "default": False,
+                                              "help": "If true, the output is formatted and written to disk by a background thread, so that the simulation does not have to wait for the file system. Soft exits wait for all the pending output to be written."})
+    attribs["durability"] = (InputAttribute, {"dtype": str, "default": "fsync",
+                                              "options": eoutputs.DURABILITY,
+                                              "help": "How the output is pushed to disk. 'none' leaves it in a large buffer, that is written when full. 'flush' hands it to the operating system every 'flush' writes, and 'fsync' also waits for it to reach the disk. 'periodic' syncs it to disk at most once every 'sync_interval' seconds."})
+    attribs["sync_interval"] = (InputAttribute, {"dtype": float, "default": 10.0,
+                                                 "help": "The minimum time, in seconds, between two syncs of the output when durability is 'periodic'."})
+    attribs["compression"] = (InputAttribute, {"dtype": str, "default": "none",
+                                               "options": COMPRESSION,
+                                               "help": "Compresses the output file, which gets the extension of the compression appended to its name. Compressed output is always written by the background thread. 'xz' requires the lzma module."})
+    attribs["precision"] = (InputAttribute, {"dtype": float, "default": 0.0,
+                                             "help": "The resolution with which the data are stored in the 'fixed' format, in the units of the output. It must be given for 'fixed' trajectories, as a suitable value depends on the quantity that is output and on its units: 1e-3 is a fine resolution for positions in angstrom, but rounds forces in atomic units to almost nothing."})
+    attribs["bundle"] = (InputAttribute, {"dtype": bool, "default": False,
+                                          "help": "If true, a per-bead trajectory is written to a single file rather than to one file per bead. Each step is written as one block holding all the beads: a single record in the 'binary' format, and one frame per bead, tagged with its index, in the 'xyz' format. Only 'xyz' and 'binary' can be bundled. The tools read bundles as well as separate files."})
 
     def __init__(self, help=None, default=None, dtype=None, dimension=None):
         """Initializes InputTrajectory.
@@ -124,7 +168,10 @@ class InputTrajectory(InputValue):
 
         return eoutputs.TrajectoryOutput(filename=self.filename.fetch(), stride=self.stride.fetch(),
                                          flush=self.flush.fetch(), what=super(InputTrajectory, self).fetch(),
-                                         format=self.format.fetch(), cell_units=self.cell_units.fetch(), ibead=self.bead.fetch())
+                                         format=self.format.fetch(), cell_units=self.cell_units.fetch(), ibead=self.bead.fetch(),
+                                         background=self.background.fetch(), durability=self.durability.fetch(),
+                                         sync_interval=self.sync_interval.fetch(), compression=self.compression.fetch(),
+                                         precision=self.precision.fetch(), bundle=self.bundle.fetch())
 
     def store(self, traj):
         """Stores a PropertyOutput object."""
@@ -136,6 +183,12 @@ class InputTrajectory(InputValue):
         self.format.store(traj.format)
         self.cell_units.store(traj.cell_units)
         self.bead.store(traj.ibead)
+        self.background.store(traj.background)
+        self.durability.store(traj.durability)
+        self.sync_interval.store(traj.sync_interval)
+        self.compression.store(traj.compression)
+        self.precision.store(traj.precision)
+        self.bundle.store(traj.bundle)
 
     def check(self):
         """Checks for optional parameters."""
@@ -143,6 +196,12 @@ class InputTrajectory(InputValue):
         super(InputTrajectory, self).check()
         if self.stride.fetch() < 0:
             raise ValueError("The stride length for the trajectory file output must be positive.")
+        if self.sync_interval.fetch() < 0:
+            raise ValueError("The sync interval for the trajectory file output must be positive.")
+        if self.format.fetch() == "fixed" and self.precision.fetch() <= 0:
+            raise ValueError("A positive precision must be given for the fixed trajectory format, in the units of the output.")
+        if self.bundle.fetch() and self.format.fetch() not in ["xyz", "binary"]:
+            raise ValueError("Only the xyz and binary trajectory formats can be bundled.")
 
 
 class InputCheckpoint(InputValue):
@@ -156,6 +215,10 @@ class InputCheckpoint(InputValue):
           data to file.
        overwrite: whether checkpoints should be overwritten, or multiple
           files output.
+       format: Whether large arrays are written in the xml file or in a
+          binary sidecar file.
+       durability: How the checkpoint is pushed to disk.
+       sync_interval: The minimum time between syncs, for periodic durability.
     """
 
     default_help = """This class defines how a checkpoint file should be output. Optionally, between the checkpoint tags, you can specify one integer giving the current step of the simulation. By default this integer will be zero."""
@@ -168,6 +231,14 @@ class InputCheckpoint(InputValue):
                                           "help": "The number of steps between successive writes."})
     attribs["overwrite"] = (InputAttribute, {"dtype": bool, "default": True,
                                              "help": "This specifies whether or not each consecutive checkpoint file will overwrite the old one."})
+    attribs["format"] = (InputAttribute, {"dtype": str, "default": "xml",
+                                          "options": ["xml", "npz"],
+                                          "help": "The checkpoint format. 'xml' writes everything to the checkpoint file. 'npz' writes the large arrays to a numpy archive named as the checkpoint file with the step and a '.npz' extension added, which is much faster to write and read for large systems. Both formats can be used to restart a simulation, and the archive must be kept with the checkpoint file. When the checkpoint file is overwritten, the archive of the previous checkpoint is removed once the new one is complete."})
+    attribs["durability"] = (InputAttribute, {"dtype": str, "default": "fsync",
+                                              "options": eoutputs.DURABILITY,
+                                              "help": "How the checkpoint is pushed to disk. The checkpoint is always written to a temporary file that then replaces the old one, so that a crash never leaves a truncated checkpoint. 'fsync' makes sure that each checkpoint reaches the disk before it replaces the old one, 'periodic' does so at most once every 'sync_interval' seconds, while 'none' and 'flush' leave it to the operating system."})
+    attribs["sync_interval"] = (InputAttribute, {"dtype": float, "default": 10.0,
+                                                 "help": "The minimum time, in seconds, between two syncs of the output when durability is 'periodic'."})
 
     def __init__(self, help=None, default=None, dtype=None, dimension=None):
         """Initializes InputCheckpoint.
@@ -181,7 +252,8 @@ class InputCheckpoint(InputValue):
         """Returns a CheckpointOutput object."""
 
         step = super(InputCheckpoint, self).fetch()
-        return eoutputs.CheckpointOutput(self.filename.fetch(), self.stride.fetch(), self.overwrite.fetch(), step=step)
+        return eoutputs.CheckpointOutput(self.filename.fetch(), self.stride.fetch(), self.overwrite.fetch(), step=step, format=self.format.fetch(),
+                                         durability=self.durability.fetch(), sync_interval=self.sync_interval.fetch())
 
     def parse(self, xml=None, text=""):
         """Overwrites the standard parse function so that we can specify this tag
@@ -209,6 +281,9 @@ class InputCheckpoint(InputValue):
         self.stride.store(chk.stride)
         self.filename.store(chk.filename)
         self.overwrite.store(chk.overwrite)
+        self.format.store(chk.format)
+        self.durability.store(chk.durability)
+        self.sync_interval.store(chk.sync_interval)
 
     def check(self):
         """Checks for optional parameters."""
@@ -216,6 +291,8 @@ class InputCheckpoint(InputValue):
         super(InputCheckpoint, self).check()
         if self.stride.fetch() < 0:
             raise ValueError("The stride length for the checkpoint file output must be positive.")
+        if self.sync_interval.fetch() < 0:
+            raise ValueError("The sync interval for the checkpoint file output must be positive.")
 
 
 class InputOutputs(Input):
@@ -5,6 +5,8 @@
 # See the "licenses" directory for full license information.
 
 
+import timeit
+
 import numpy as np
 
 import ipi.engine.atoms
@@ -44,6 +46,21 @@ def test_dot():
     assert isinstance(c, np.ndarray)
 
 
+def test_dot_out():
+    """Depend: Dot test with an output array"""
+    x = dp.depend_array(name="x", value=np.arange(4.0).reshape((2, 2)))
+    y = dp.depend_array(name="y", value=np.arange(4.0, 8.0).reshape((2, 2)))
+    out = np.zeros((2, 2))
+    c = np.dot(x, y, out=out)
+    assert c is out
+    assert (out == np.dot(dp.dstrip(x), dp.dstrip(y))).all()
+
+    dout = dp.depend_array(name="dout", value=np.zeros((2, 2)))
+    c = np.dot(x, y, out=dout)
+    assert np.may_share_memory(c, dout)
+    assert (dp.dstrip(dout) == out).all()
+
+
 def test_dotf():
     """Depend: Dot-f test"""
 
@@ -63,3 +80,117 @@ def test_readonly():
     """Depend: read-only flag"""
     atoms = ipi.engine.atoms.Atoms(2)
     atoms.q = np.zeros(2 * 3)
+
+
+class DObj(dp.dobject):
+    """Minimal dobject used to test the attribute dispatch."""
+
+    label = "class-level"
+
+    def __init__(self, depend=True):
+        self.plain = 1.0
+        if depend:
+            dself = dp.dd(self)
+            dself.x = dp.depend_value(name="x", value=2.0)
+            dself.y = dp.depend_value(name="y", func=self.get_y, dependencies=[dself.x])
+            dself.label = dp.depend_value(name="label", value="instance-level")
+        else:
+            self.x = "not a depend object"
+
+    def get_y(self):
+        return 2 * self.x
+
+
+def test_dobject_access():
+    """Depend: dobject get/set dispatch"""
+    obj = DObj()
+    assert obj.plain == 1.0
+    assert obj.x == 2.0
+    assert obj.y == 4.0
+    obj.x = 3.0
+    assert isinstance(dp.dd(obj).x, dp.depend_value)
+    assert obj.y == 6.0
+    try:
+        obj.y = 1.0
+    except NameError:
+        pass
+    else:
+        raise AssertionError("Computed depend object was set manually")
+
+
+def test_dobject_mixed():
+    """Depend: dobject members that are not depend objects in all instances"""
+    obj = DObj()
+    other = DObj(depend=False)
+    assert other.x == "not a depend object"
+    other.x = 5
+    assert other.x == 5
+    assert obj.x == 2.0
+    assert other.label == "class-level"
+    assert obj.label == "instance-level"
+    assert DObj.label == "class-level"
+
+
+def test_slice_views():
+    """Depend: memoised slice views"""
+    c = dp.depend_array(name="c", value=np.zeros((3, 4), float))
+    s = dp.depend_value(name="s", func=lambda: c.sum(), dependencies=[c])
+    assert s.get() == 0.0
+    v = c[1]
+    assert v is c[1]
+    assert c[1, 1:3] is c[1, 1:3]
+    assert c[1] is not c[2]
+    v[2] = 1.0
+    assert c[1, 2] == 1.0
+    assert s.get() == 1.0
+    c[1:3, ::2][:] = 2.0
+    assert s.get() == 8.0
+    assert isinstance(c[[0, 1]], dp.depend_array)
+    assert not isinstance(c[0, 0], dp.depend_array)
+
+
+def test_slice_views_full():
+    """Depend: memoised slice views beyond the cache size"""
+    c = dp.depend_array(name="c", value=np.zeros((8, 3), float))
+    maxviews = dp.depend_array.maxviews
+    dp.depend_array.maxviews = 4
+    try:
+        first = [c[i] for i in range(4)]
+        others = [c[i] for i in range(4, 8)]
+        # the cache is kept, and the slices that do not fit are built anew
+        assert all(c[i] is first[i] for i in range(4))
+        assert all(c[i + 4] is not others[i] for i in range(4))
+        others[0][:] = 1.0
+        assert c[4, 0] == 1.0
+    finally:
+        dp.depend_array.maxviews = maxviews
+
+
+def time_slices(q, indices, maxviews):
+    """Returns the best time taken to slice q with each of indices."""
+
+    old = dp.depend_array.maxviews
+    dp.depend_array.maxviews = maxviews
+    try:
+        q.clearviews()
+        return min(timeit.repeat(lambda: [q[i] for i in indices], number=3, repeat=5))
+    finally:
+        dp.depend_array.maxviews = old
+        q.clearviews()
+
+
+def test_slice_views_benchmark():
+    """Depend: memoised slice views save time on a large system"""
+    q = dp.depend_array(name="q", value=np.zeros((32, 3 * 4096), float))
+
+    # the usual loop over the beads, with the slices taken over and over
+    beads = [b for i in range(64) for b in range(32)]
+    cached, uncached = time_slices(q, beads, 1024), time_slices(q, beads, 0)
+    print "beads: %.4fs memoised, %.4fs not memoised" % (cached, uncached)
+    assert cached < 0.5 * uncached
+
+    # a loop over beads and atoms touches more slices than are memoised
+    atoms = [(b, slice(3 * i, 3 * i + 3)) for b in range(32) for i in range(64)]
+    cached, uncached = time_slices(q, atoms, 1024), time_slices(q, atoms, 0)
+    print "beads x atoms: %.4fs memoised, %.4fs not memoised" % (cached, uncached)
+    assert cached < 1.2 * uncached
@@ -178,6 +178,25 @@ class depend_base(object):
         if self._synchro is not None and self._name not in self._synchro.synced:
             self._synchro.synced[self._name] = self
             self._synchro.manual = self._name
+        self.clearviews()
+
+    def set_func(self, func):
+        """Rebinds the function used to compute self.
+
+        Args:
+            func: The new function, in any of the forms accepted by __init__.
+        """
+
+        self._func = func
+        self.clearviews()
+
+    def clearviews(self):
+        """Discards the views of self that carry a copy of its dependencies.
+
+        Only depend arrays keep such views, see depend_array.clearviews().
+        """
+
+        pass
 
     def add_dependant(self, newdep, tainted=True):
         """Adds a dependant property.
@@ -322,10 +341,12 @@ class depend_value(depend_base):
         is recalculated if tainted.
         """
 
-        with self._threadlock:
-            if self._tainted[0]:
-                self.update_auto()
-                self.taint(taintme=False)
+        # the lock is only needed when an update is due
+        if self._tainted[0]:
+            with self._threadlock:
+                if self._tainted[0]:
+                    self.update_auto()
+                    self.taint(taintme=False)
 
         return self._value
 
@@ -354,6 +375,18 @@ class depend_value(depend_base):
         self.set(value)
 
 
+class _arraymemory(object):
+    """Exposes a block of memory through the numpy array interface.
+
+    Used to create plain ndarray views that keep alive the owner of the
+    memory, but not the array they have been sliced from.
+    """
+
+    def __init__(self, interface, owner):
+        self.__array_interface__ = interface
+        self.owner = owner
+
+
 class depend_array(np.ndarray, depend_base):
     """Depend class for arrays.
 
@@ -361,9 +394,20 @@ class depend_array(np.ndarray, depend_base):
     way to scalar quantities, and as there needs to be support for slicing an
     array. Initialisation is also done in a different way for ndarrays.
 
+    Slicing a depend_array with basic indices (integers, slices, Ellipsis
+    and np.newaxis) returns a view that shares the taint flag and the
+    dependency network of the parent. These views are memoised, so that
+    repeated accesses with the same index, e.g. beads.q[b] in a loop over
+    the beads, return the same lightweight object rather than building a new
+    depend_array every time. When the dependencies are not needed, e.g. to
+    read values inside a tight loop, dstrip(array)[index] remains the fastest
+    way of accessing a slice.
+
     Attributes:
         _bval: The base deparray storage space. Equal to dstrip(self) unless
             self is a slice.
+        _views: A dictionary of the memoised slices of self, of the form
+            {index key: depend_array}. None until the first slice is taken.
     """
 
     def __new__(cls, value, name, synchro=None, func=None, dependants=None, dependencies=None, tainted=None, base=None, active=None):
@@ -427,6 +471,7 @@ class depend_array(np.ndarray, depend_base):
         """
 
         depend_base.__init__(self, name="")
+        self._views = None
 
         if type(obj) is depend_array:
             # We are in a view cast or in new from template. Unfortunately
@@ -486,6 +531,10 @@ class depend_array(np.ndarray, depend_base):
     # whenever possible in compound operations just return a regular ndarray
     __array_priority__ = -1.0
 
+    # maximum number of slices memoised for each array. Once it is reached,
+    # further slices are built anew at each access, and the cache is kept
+    maxviews = 1024
+
     def reshape(self, newshape):
         """Changes the shape of the base array.
 
@@ -539,6 +588,61 @@ class depend_array(np.ndarray, depend_base):
             return True
         return False
 
+    @staticmethod
+    def __viewkey(index):
+        """Converts an index into a hashable key for the views cache.
+
+        Arguments:
+            index: the index to be converted.
+
+        Returns:
+            A tuple that identifies uniquely a basic index, or None if the
+            index involves advanced indexing and its result cannot be cached.
+        """
+
+        if not isinstance(index, tuple):
+            index = (index,)
+        key = []
+        for i in index:
+            if isinstance(i, slice):
+                for j in (i.start, i.stop, i.step):
+                    if not (j is None or isinstance(j, (int, long, np.integer))):
+                        return None
+                key.append((i.start, i.stop, i.step))
+            elif isinstance(i, (int, long, np.integer)) and not isinstance(i, (bool, np.bool_)):
+                key.append(int(i))
+            elif i is Ellipsis or i is None:
+                key.append(i)
+            else:
+                return None
+        return tuple(key)
+
+    def __newview(self, index):
+        """Creates a depend_array view of a slice of self.
+
+        The view shares the taint flag and the dependency network of self.
+        Its memory is referenced through the object that owns the data, rather
+        than through self, so that self and the views it caches do not form a
+        reference cycle.
+
+        Args:
+           index: A basic index giving the slice.
+        """
+
+        value = dstrip(self)[index]
+        owner = value
+        while isinstance(owner, np.ndarray) and owner.base is not None:
+            owner = owner.base
+        view = np.asarray(_arraymemory(value.__array_interface__, owner)).view(depend_array)
+        view._name = self._name
+        view._synchro = self._synchro
+        view._func = self._func
+        view._dependants = self._dependants
+        view._tainted = self._tainted
+        view._active = self._active
+        view._bval = self._bval
+        return view
+
     def __getitem__(self, index):
         """Returns value[index], after recalculating if necessary.
 
@@ -547,23 +651,53 @@ class depend_array(np.ndarray, depend_base):
         so without depend machinery. If you need a "scalar depend" which
         behaves as a slice, just create a 1x1 matrix, e.g b=a(7,1:2)
 
+        Slices taken with basic indices are memoised in self._views, and
+        subsequent calls with the same index return the cached view. Only the
+        first maxviews distinct slices are memoised, so that a loop over many
+        slices does not keep refilling and discarding the cache.
+
         Args:
            index: A slice variable giving the appropriate slice to be read.
         """
 
-        with self._threadlock:
-            if self._tainted[0]:
-                self.update_auto()
-                self.taint(taintme=False)
+        # the lock is only needed when an update is due
+        if self._tainted[0]:
+            with self._threadlock:
+                if self._tainted[0]:
+                    self.update_auto()
+                    self.taint(taintme=False)
+
+        key = self.__viewkey(index)
+        if key is not None and self._views is not None:
+            view = self._views.get(key)
+            if view is not None:
+                return view
 
         if self.__scalarindex(index, self.ndim):
             return dstrip(self)[index]
-        else:
+        elif key is None:
             return depend_array(dstrip(self)[index], name=self._name,
                                 synchro=self._synchro, func=self._func,
                                 dependants=self._dependants,
                                 tainted=self._tainted, base=self._bval,
                                 active=self._active)
+        else:
+            view = self.__newview(index)
+            if self._views is None:
+                self._views = {}
+            if len(self._views) < depend_array.maxviews:
+                self._views[key] = view
+            return view
+
+    def clearviews(self):
+        """Discards the memoised slices of self.
+
+        The views hold a copy of the dependency attributes of self, so this
+        must be called whenever those are rebound rather than modified in
+        place. add_synchro(), set_func(), dpipe() and dcopy() do so.
+        """
+
+        self._views = None
 
     def __getslice__(self, i, j):
         """Overwrites standard get function."""
@@ -581,10 +715,12 @@ class depend_array(np.ndarray, depend_base):
         # It is worth duplicating this code that is also used in __getitem__ as this
         # is called most of the time, and we avoid creating a load of copies pointing to the same depend_array
 
-        with self._threadlock:
-            if self._tainted[0]:
-                self.update_auto()
-                self.taint(taintme=False)
+        # the lock is only needed when an update is due
+        if self._tainted[0]:
+            with self._threadlock:
+                if self._tainted[0]:
+                    self.update_auto()
+                    self.taint(taintme=False)
 
         return self
 
@@ -643,11 +779,13 @@ class depend_array(np.ndarray, depend_base):
 __dp_dot = np.dot
 
 
-def dep_dot(da, db):
+def dep_dot(da, db, out=None):
     a = dstrip(da)
     b = dstrip(db)
 
-    return __dp_dot(a, b)
+    if out is None:
+        return __dp_dot(a, b)
+    return __dp_dot(a, b, dstrip(out))
 
 np.dot = dep_dot
 
@@ -697,9 +835,9 @@ def dpipe(dfrom, dto, item=-1):
     """
 
     if item < 0:
-        dto._func = lambda: dfrom.get()
+        dto.set_func(lambda: dfrom.get())
     else:
-        dto._func = lambda i=item: dfrom.__getitem__(i)
+        dto.set_func(lambda i=item: dfrom.__getitem__(i))
     dto.add_dependency(dfrom)
 
 
@@ -716,18 +854,124 @@ def dcopy(dfrom, dto):
     dto._func = dfrom._func
     if hasattr(dfrom, "_bval"):
         dto._bval = dfrom._bval
+    dto.clearviews()
 
 
 def depraise(exception):
     raise exception
 
 
+_noshadow = object()
+
+
+class dattr(object):
+    """Class-level accessor for a member of a dobject that can hold a depend
+    object.
+
+    Installed in the class of a dobject the first time a depend object is
+    stored under a given name, it is a data descriptor and so it takes
+    precedence over the instance dictionary. Reading the attribute then calls
+    the __get__() function of the depend object, and writing it calls its
+    __set__() function, while ordinary members of the dobject are accessed with
+    the standard (fast) Python lookup, rather than through an override of
+    __getattribute__(). Instances that store a plain value under the same name
+    are handled transparently.
+
+    Attributes:
+        _name: The name of the member this descriptor dispatches.
+        _shadow: The class attribute with the same name that was found when
+            the descriptor was installed, if any. Used as a fallback when an
+            instance does not define the member itself.
+    """
+
+    __slots__ = ("_name", "_shadow")
+
+    def __init__(self, name, shadow=_noshadow):
+        """Initialises dattr.
+
+        Args:
+            name: The name of the dobject member.
+            shadow: An optional class attribute to be returned when the instance
+                does not hold a value for name.
+        """
+
+        self._name = name
+        self._shadow = shadow
+
+    def __get__(self, instance, owner):
+        """Returns the value of the member, calling the depend __get__() if
+        the instance holds a depend object."""
+
+        if instance is None:
+            if self._shadow is _noshadow:
+                return self
+            return self._shadow.__get__(None, owner) if hasattr(self._shadow, "__get__") else self._shadow
+
+        try:
+            value = instance.__dict__[self._name]
+        except KeyError:
+            if self._shadow is _noshadow:
+                raise AttributeError("'" + owner.__name__ + "' object has no attribute '" + self._name + "'")
+            if hasattr(self._shadow, "__get__"):
+                return self._shadow.__get__(instance, owner)
+            return self._shadow
+
+        if isinstance(value, depend_base):
+            return value.__get__(instance, owner)
+        return value
+
+    def __set__(self, instance, value):
+        """Sets the member, calling the depend __set__() if the instance holds
+        a depend object."""
+
+        idict = instance.__dict__
+        obj = idict.get(self._name, None)
+        if isinstance(obj, depend_base):
+            obj.__set__(instance, value)
+        else:
+            idict[self._name] = value
+
+    def __delete__(self, instance):
+        """Removes the member from the instance."""
+
+        try:
+            del instance.__dict__[self._name]
+        except KeyError:
+            raise AttributeError(self._name)
+
+
+def _dattr_lookup(cls, name):
+    """Returns the first entry for name along the MRO of cls, if any."""
+
+    for base in cls.__mro__:
+        if name in base.__dict__:
+            return base.__dict__[name]
+    return _noshadow
+
+
+def _dattr_install(cls, name):
+    """Makes sure that cls dispatches the member name through a dattr.
+
+    Nothing is done if a dattr is already available for name, or if name is
+    a data descriptor (e.g. a property) that would take precedence anyway.
+    """
+
+    shadow = _dattr_lookup(cls, name)
+    if isinstance(shadow, dattr):
+        return
+    if shadow is not _noshadow and hasattr(shadow, "__set__"):
+        return
+    setattr(cls, name, dattr(name, shadow))
+
+
 class dobject(object):
     """Class that allows standard notation to be used for depend objects.
 
-    An extension of the standard library object that overloads __getattribute__
-    and __setattribute__, so that we can use the standard syntax for setting
-    and getting the depend object, i.e. foo = value, not foo.set(value).
+    An extension of the standard library object that installs a dattr
+    descriptor in its class for each member holding a depend object, so that
+    we can use the standard syntax for setting and getting the depend object,
+    i.e. foo = value, not foo.set(value). All the other members are accessed
+    with the standard Python mechanism.
     """
 
     def __new__(cls, *args, **kwds):
@@ -738,35 +982,17 @@ class dobject(object):
         obj._direct = ddirect(obj)
         return obj
 
-    def __getattribute__(self, name):
-        """Overrides standard __getattribute__().
-
-        This changes the standard __getattribute__() function of any class that
-        subclasses dobject such that depend objects are called with their own
-        __get__() function rather than the standard one.
-        """
-
-        value = super(dobject, self).__getattribute__(name)
-        if issubclass(value.__class__, depend_base):
-            value = value.__get__(self, self.__class__)
-        return value
-
     def __setattr__(self, name, value):
         """Overrides standard __setattribute__().
 
-        This changes the standard __setattribute__() function of any class that
-        subclasses dobject such that depend objects are called with their own
-        __set__() function rather than the standard one.
+        Members that hold a depend object are set through its own __set__()
+        function (this is done by the dattr descriptor). When a depend object
+        is stored under a new name, the corresponding descriptor is installed.
         """
 
-        try:
-            obj = super(dobject, self).__getattribute__(name)
-        except AttributeError:
-            pass
-        else:
-            if issubclass(obj.__class__, depend_base):
-                return obj.__set__(self, value)
-        return super(dobject, self).__setattr__(name, value)
+        object.__setattr__(self, name, value)
+        if isinstance(value, depend_base):
+            _dattr_install(type(self), name)
 
 
 def dd(dobj):
@@ -788,10 +1014,20 @@ class ddirect(object):
         """Overrides the dobject value access mechanism and returns the actual
         member objects."""
 
-        return object.__getattribute__(object.__getattribute__(self, "dobj"), name)
+        dobj = object.__getattribute__(self, "dobj")
+        try:
+            return dobj.__dict__[name]
+        except KeyError:
+            return object.__getattribute__(dobj, name)
 
     def __setattr__(self, name, value):
         """Overrides the dobject value access mechanism and returns the actual
         member objects."""
 
-        return object.__setattr__(object.__getattribute__(self, "dobj"), name, value)
+        dobj = object.__getattribute__(self, "dobj")
+        if isinstance(_dattr_lookup(type(dobj), name), dattr):
+            dobj.__dict__[name] = value
+        else:
+            object.__setattr__(dobj, name, value)
+        if isinstance(value, depend_base):
+            _dattr_install(type(dobj), name)
@@ -18,15 +18,18 @@ bad data types, and failure to input required fields.
 # See the "licenses" directory for full license information.
 
 
+import threading
 from copy import copy
 
 import numpy as np
 
 from ipi.utils.io.inputs.io_xml import *
+from ipi.utils.io import read_npy
 from ipi.utils.units import unit_to_internal, unit_to_user
 
 
-__all__ = ['Input', 'InputDictionary', 'InputValue', 'InputRaw', 'InputAttribute', 'InputArray', 'input_default']
+__all__ = ['Input', 'InputDictionary', 'InputValue', 'InputRaw', 'InputAttribute', 'InputArray', 'input_default',
+           'ArraySidecar']
 
 
 class input_default(object):
@@ -916,6 +919,85 @@ class InputRaw(InputValue):
 
 ELPERLINE = 5
 
+# numerical arrays with at least this many elements are written to the
+# binary sidecar file, when one is active
+SIDECARMIN = 32
+
+# the sidecar that is active in each thread, if any
+_sidecar = threading.local()
+
+
+class ArraySidecar(object):
+    """Collects the large arrays of an input tree while it is written to xml.
+
+    While the sidecar is active (i.e. within a with statement), the write()
+    method of InputArray replaces the content of large numerical arrays with a
+    reference of the form 'filename:key', and sets the array mode to 'npz'.
+    The arrays are then saved together in a single numpy archive, which is
+    read back when the xml file is parsed. This keeps checkpoint files of
+    large systems small, and avoids converting the arrays to and from text.
+
+    Attributes:
+       filename: The name of the npz file the arrays will be saved to.
+       minsize: The minimum number of elements of an array to be saved in the
+          sidecar rather than written as text.
+       arrays: A dictionary of the arrays to be saved, indexed by key.
+       _keys: A dictionary giving the key assigned to each InputArray object,
+          so that an array that is written twice is saved only once.
+    """
+
+    def __init__(self, filename, minsize=SIDECARMIN):
+        """Initialises ArraySidecar.
+
+        Args:
+           filename: The name of the npz file the arrays will be saved to.
+           minsize: The minimum number of elements of the arrays to be saved.
+        """
+
+        self.filename = filename
+        self.minsize = minsize
+        self.arrays = {}
+        self._keys = {}
+
+    def __enter__(self):
+        _sidecar.current = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _sidecar.current = None
+
+    def accepts(self, value):
+        """Returns True if the flat array value should go in the sidecar."""
+
+        return len(value) >= self.minsize and value.dtype.kind in "biufc"
+
+    def add(self, owner, value):
+        """Adds an array to the sidecar.
+
+        Args:
+           owner: The InputArray object the array belongs to.
+           value: The array to be saved.
+
+        Returns:
+           The key under which the array is saved.
+        """
+
+        key = self._keys.get(id(owner))
+        if key is None:
+            key = "arr_%d" % len(self._keys)
+            self._keys[id(owner)] = key
+        self.arrays[key] = value
+        return key
+
+    def save(self, stream):
+        """Saves the collected arrays.
+
+        Args:
+           stream: An open binary file object.
+        """
+
+        np.savez(stream, **self.arrays)
+
 
 class InputArray(InputValue):
     """Class for handling array input.
@@ -937,8 +1019,8 @@ class InputArray(InputValue):
     attribs["shape"] = (InputAttribute, {"dtype": tuple, "help": "The shape of the array.", "default": (0,)})
     attribs["mode"] = (InputAttribute, {"dtype": str,
                                         "default": "manual",
-                                        "options": ["manual", "file"],
-                                        "help": "If 'mode' is 'manual', then the array is read from the content of 'cell' takes a 9-elements vector containing the cell matrix (row-major). If 'mode' is 'abcABC', then 'cell' takes an array of 6 floats, the first three being the length of the sides of the system parallelopiped, and the last three being the angles (in degrees) between those sides. Angle A corresponds to the angle between sides b and c, and so on for B and C. If mode is 'abc', then this is the same as for 'abcABC', but the cell is assumed to be orthorhombic. 'pdb' and 'chk' read the cell from a PDB or a checkpoint file, respectively."})
+                                        "options": ["manual", "file", "npy", "npz"],
+                                        "help": "If 'mode' is 'manual', then the array is read from the content of 'cell' takes a 9-elements vector containing the cell matrix (row-major). If 'mode' is 'abcABC', then 'cell' takes an array of 6 floats, the first three being the length of the sides of the system parallelopiped, and the last three being the angles (in degrees) between those sides. Angle A corresponds to the angle between sides b and c, and so on for B and C. If mode is 'abc', then this is the same as for 'abcABC', but the cell is assumed to be orthorhombic. 'pdb' and 'chk' read the cell from a PDB or a checkpoint file, respectively. If 'mode' is 'npy', the content is the name of a numpy binary file, which is memory-mapped, or of a numpy archive followed by ':key' to select one of the arrays it contains. If 'shape' is not given, the shape of the stored array is used. 'npz' is the same as 'npy', and is used by binary checkpoints."})
 
     def __init__(self, help=None, default=None, dtype=None, dimension=None):
         """Initialises InputArray.
@@ -991,6 +1073,8 @@ class InputArray(InputValue):
         that only ELPERLINE values are printed on each line if there are more
         than this in the array. If the values are floats, or another data type
         with a fixed width of data output, then they are aligned in columns.
+        If an ArraySidecar is active, large numerical arrays are added to it,
+        and only a reference to them is written.
 
         Args:
            name: An optional string giving the tag name. Defaults to "".
@@ -1001,16 +1085,20 @@ class InputArray(InputValue):
            A string giving the stored value in the appropriate xml format.
         """
 
-        rstr = ""
+        sidecar = getattr(_sidecar, "current", None)
+        if sidecar is not None and sidecar.accepts(self.value):
+            key = sidecar.add(self, self.value)
+            mode = self.mode.fetch()
+            self.mode.store("npz")
+            try:
+                return Input.write(self, name=name, indent=indent, text=" " + sidecar.filename + ":" + key + " ")
+            finally:
+                self.mode.store(mode)
+
         if (len(self.value) > ELPERLINE):
-            rstr += "\n" + indent + " [ "
+            rstr = "\n" + indent + " [ " + write_array(self.type, self.value, ELPERLINE, "\n" + indent + "   ")
         else:
-            rstr += " [ "  # inlines the array if it is small enough
-
-        for i, v in enumerate(self.value):
-            if (len(self.value) > ELPERLINE and i > 0 and i % ELPERLINE == 0):
-                rstr += "\n" + indent + "   "
-            rstr += write_type(self.type, v) + ", "
+            rstr = " [ " + write_array(self.type, self.value, ELPERLINE)  # inlines the array if it is small enough
 
         rstr = rstr.rstrip(", ")  # get rid of trailing commas
         if (len(self.value) > ELPERLINE):
@@ -1036,6 +1124,12 @@ class InputArray(InputValue):
             self.value = read_array(self.type, self._text)
         elif mode == "file":
             self.value = np.loadtxt(self._text.strip(), comments="#", dtype=self.type).flatten()
+        elif mode == "npy" or mode == "npz":
+            # copy-on-write, as fetch() may scale the values in place
+            value = read_npy(self._text, mmap_mode="c")
+            if self.shape.fetch() == (0,):
+                self.shape.store(value.shape)
+            self.value = np.asarray(value, dtype=self.type).reshape(-1)
         else:
             raise ValueError("Unsupported array reading mode")
 
@@ -13,13 +13,33 @@ units from the file, but it can be overridden.
 
 import sys
 import os
+import re
+import io
+import gzip
+import weakref
+from itertools import izip
+
+import numpy as np
 
 from ipi.utils.messages import info, verbosity
 from ipi.utils.units import unit_to_user
 from ipi.external import importlib
 from ipi.utils.decorators import cached
 
-__all__ = ["io_units", "iter_file", "print_file_path", "print_file", "read_file"]
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+__all__ = ["io_units", "iter_file", "print_file_path", "print_file", "read_file", "read_npy", "format_block",
+           "COMPRESSION", "read_stream", "iter_bundle_raw", "iter_path", "count_beads"]
+
+
+# the compressions that output streams can use. "xz" needs the lzma module.
+COMPRESSION = ["none", "gz", "xz"]
 
 
 mode_map = {
@@ -107,10 +127,10 @@ def print_file_path(mode, beads, cell, filedesc=sys.stdout, title="", key="", di
 
     title = title + ("%s{%s}  cell{%s}" % (key, units, cell_units))
 
-    return _get_io_function(mode, "print_path")(beads=beads, cell=cell, filedesc=filedesc, cell_conv=cell_conv, atoms_conv=atoms_conv)
+    return print_file_path_raw(mode=mode, beads=beads, cell=cell, filedesc=filedesc, title=title, cell_conv=cell_conv, atoms_conv=atoms_conv)
 
 
-def print_file_raw(mode, atoms, cell, filedesc=sys.stdout, title="", cell_conv=1.0, atoms_conv=1.0):
+def print_file_raw(mode, atoms, cell, filedesc=sys.stdout, title="", cell_conv=1.0, atoms_conv=1.0, **kwargs):
     """Prints atom positions, or atom-vector properties, into a `mode` formatted file, 
        providing atoms and cell in the internal i-PI representation but doing no conversion.
 
@@ -121,12 +141,14 @@ def print_file_raw(mode, atoms, cell, filedesc=sys.stdout, title="", cell_conv=1
         title: This contains the string that will be used for the comment line.
         cell_conv: Conversion factor for the cell parameters
         atoms_conv: Conversion factors for the atomic properties
+
+        All other args are passed directly to the responsible io function.
     """
 
-    return _get_io_function(mode, "print")(atoms=atoms, cell=cell, filedesc=filedesc, title=title, cell_conv=cell_conv, atoms_conv=atoms_conv)
+    return _get_io_function(mode, "print")(atoms=atoms, cell=cell, filedesc=filedesc, title=title, cell_conv=cell_conv, atoms_conv=atoms_conv, **kwargs)
 
 
-def print_file(mode, atoms, cell, filedesc=sys.stdout, title="", key="", dimension="length", units="automatic", cell_units="automatic"):
+def print_file(mode, atoms, cell, filedesc=sys.stdout, title="", key="", dimension="length", units="automatic", cell_units="automatic", **kwargs):
     """Prints atom positions, or atom-vector properties, into a `mode` formatted file, 
        using i-PI internal representation of atoms & cell. Does conversion and prepares 
        formatted title line. 
@@ -141,6 +163,8 @@ def print_file(mode, atoms, cell, filedesc=sys.stdout, title="", key="", dimensi
         dimension: Dimensions of the property (e.g. "length")
         units: Units for the output (e.g. "angstrom")
         cell_units: Units for the cell (dimension length, e.g. "angstrom")
+
+        All other args are passed directly to the responsible io function.
     """
     if mode == "pdb":   # special case for PDB
         if dimension != "length":
@@ -156,20 +180,87 @@ def print_file(mode, atoms, cell, filedesc=sys.stdout, title="", key="", dimensi
     atoms_conv = unit_to_user(dimension, units, 1.0)
 
     title = title + ("%s{%s}  cell{%s}" % (key, units, cell_units))
-    print_file_raw(mode=mode, atoms=atoms, cell=cell, filedesc=filedesc, title=title, cell_conv=cell_conv, atoms_conv=atoms_conv)
+    print_file_raw(mode=mode, atoms=atoms, cell=cell, filedesc=filedesc, title=title, cell_conv=cell_conv, atoms_conv=atoms_conv, **kwargs)
+
+
+# matches the first bytes of the streams that read_stream decodes
+magic_gz = "\x1f\x8b"
+magic_xz = "\xfd7zXZ\x00"
+# the number of bytes that are needed to recognize a file
+magic_size = 8
+
+# the streams that read_stream has prepared, for each file object
+_streams = weakref.WeakKeyDictionary()
+
+
+def read_stream(filedesc):
+    """Prepares a file object for reading trajectory frames.
+
+    Compressed files are decompressed on the fly, and files in the binary
+    and in the lossy fixed-precision formats are recognized, so that the
+    readers can be used on any trajectory file without having to know how it
+    was written.
+
+    The file is inspected the first time it is passed, and the same stream
+    is returned on subsequent calls.
+
+    Args:
+        filedesc: An open readable file object.
+
+    Returns:
+        A tuple with the stream the frames must be read from, and the format
+        of the frames if it is given by the content of the file, None if not.
+    """
+
+    try:
+        return _streams[filedesc]
+    except KeyError:
+        pass
+    except TypeError:
+        return filedesc, None   # cannot be tracked, so it is read as it is
+
+    stream = filedesc
+    try:
+        pos = filedesc.tell()
+        magic = filedesc.read(magic_size)
+        filedesc.seek(pos)
+    except (AttributeError, IOError, ValueError):
+        magic = ""   # not seekable, e.g. a pipe
+    if magic.startswith(magic_gz):
+        stream = io.BufferedReader(gzip.GzipFile(fileobj=filedesc, mode="rb"))
+    elif magic.startswith(magic_xz):
+        if lzma is None:
+            raise ValueError("Reading xz compressed files requires the lzma module")
+        stream = io.BufferedReader(lzma.LZMAFile(filedesc))
+    if stream is not filedesc:
+        magic = stream.peek(magic_size)
+
+    # late import, as the backends import this module
+    from .backends.io_fixed import MAGIC as magic_fixed
+    from .backends.io_binary import MAGIC as magic_binary
+    mode = None
+    if magic.startswith(magic_fixed):
+        mode = "fixed"
+    elif magic.startswith(magic_binary):
+        mode = "binary"
+
+    _streams[filedesc] = (stream, mode)
+    return stream, mode
 
 
 def read_file_raw(mode, filedesc):
     """ Reads atom positions, or atom-vector properties, from a file of mode "mode", 
         returns positions and cell parameters in raw array format, without creating i-PI
-        internal objects. 
+        internal objects. Compressed, binary and fixed-precision files are
+        read transparently.
 
     Args:
         mode: I/O file format (e.g. "xyz")
         filedesc: An open readable file object.
 
     """
-    reader = _get_io_function(mode, "read")
+    filedesc, detected = read_stream(filedesc)
+    reader = _get_io_function(detected or mode, "read")
 
     comment, cell, atoms, names, masses = reader(filedesc=filedesc)
 
@@ -207,6 +298,16 @@ def read_file(mode, filedesc, dimension="automatic", units="automatic", cell_uni
     return process_units(dimension=dimension, units=units, cell_units=cell_units, mode=mode, **raw_read)
 
 
+def _file_mode(filename):
+    """Returns the extension that gives the format of a file, skipping the
+    one of the compression, if any."""
+
+    root, ext = os.path.splitext(filename)
+    if ext[1:] in COMPRESSION:
+        ext = os.path.splitext(root)[1]
+    return ext
+
+
 def read_file_name(filename):
     """Read one frame from file, guessing its format from the extension.
 
@@ -217,7 +318,7 @@ def read_file_name(filename):
         A dictionary with 'atoms', 'cell' and 'comment'.
     """
 
-    return read_file(os.path.splitext(filename)[1], open(filename))
+    return read_file(_file_mode(filename), open(filename))
 
 
 def iter_file_raw(mode, filedesc):
@@ -230,7 +331,8 @@ def iter_file_raw(mode, filedesc):
         Generator of frames dictionaries, as returned by `process_units`.
     """
 
-    reader = _get_io_function(mode, "read")
+    filedesc, detected = read_stream(filedesc)
+    reader = _get_io_function(detected or mode, "read")
 
     try:
         while True:
@@ -273,7 +375,7 @@ def iter_file_name(filename):
         Generator of frames (dictionary with 'atoms', 'cell' and 'comment') from the trajectory in `filename`.
     """
 
-    return iter_file(os.path.splitext(filename)[1], open(filename))
+    return iter_file(_file_mode(filename), open(filename))
 
 
 def iter_file_name_raw(filename):
@@ -286,10 +388,202 @@ def iter_file_name_raw(filename):
         Raw  I/O iterator
     """
 
-    return iter_file_raw(os.path.splitext(filename)[1], open(filename))
+    return iter_file_raw(_file_mode(filename), open(filename))
+
+
+# matches the bead index in the comment line of a frame
+bead_re = re.compile(r"[Bb]ead:\s*(\d+)")
+
+
+def iter_bundle_raw(mode, filedesc):
+    """Takes an open file holding the trajectory of all the beads of a path,
+    and yields for each step the list of the frames of the beads.
+
+    The file can be a bundle written by a trajectory output with bundle="True",
+    where each record of a binary file holds all the beads, and each frame
+    of a text file gives the index of its bead. A file with the frames of a
+    single bead is read as a path of one bead.
+
+    Args:
+        mode: I/O file format (e.g. "xyz")
+        filedesc: An open readable file object.
+
+    Returns:
+        Generator of lists of frame dictionaries, as returned by `iter_file_raw`.
+    """
+
+    frames = []
+    last = None
+    for frame in iter_file_raw(mode, filedesc):
+        if frame["data"].ndim == 2:
+            # a record of a binary bundle, where the replicas are the rows
+            yield [dict(frame, data=q) for q in frame["data"]]
+            continue
+
+        match = bead_re.search(frame["comment"])
+        ibead = int(match.group(1)) if match is not None else 0
+        if last is not None and ibead <= last:
+            yield frames
+            frames = []
+        frames.append(frame)
+        last = ibead
+    if len(frames) > 0:
+        yield frames
+
+
+def iter_path(filenames, dimension="automatic", units="automatic", cell_units="automatic"):
+    """Reads the trajectory of a path, written either as one file per bead
+    or as a single bundle, and yields for each step the list of the frames of
+    the beads.
 
+    Args:
+        filenames: A list with the names of the files of each bead, or with
+            the name of a bundle.
+        dimension: Dimensions of the property (e.g. "length")
+        units: Units for the output (e.g. "angstrom")
+        cell_units: Units for the cell (dimension length, e.g. "angstrom")
+
+    Returns:
+        Generator of lists of frames, as returned by `process_units`.
+    """
 
-def open_backup(filename, mode='r', buffering=-1):
+    from .io_units import process_units
+
+    if len(filenames) == 1:
+        steps = iter_bundle_raw(_file_mode(filenames[0]), open(filenames[0]))
+    else:
+        iters = [iter_file_name_raw(filename) for filename in filenames]
+        steps = (list(frames) for frames in izip(*iters))
+
+    for frames in steps:
+        yield [process_units(dimension=dimension, units=units, cell_units=cell_units, mode=_file_mode(filenames[0]), **frame)
+               for frame in frames]
+
+
+def count_beads(filenames):
+    """Returns the number of beads of a path written to filenames, either
+    one file per bead or a single bundle."""
+
+    if len(filenames) != 1:
+        return len(filenames)
+    for frames in iter_bundle_raw(_file_mode(filenames[0]), open(filenames[0])):
+        return len(frames)
+    return 0
+
+
+def read_npy(text, mmap_mode="r"):
+    """Reads an array from a numpy binary file.
+
+    Arrays in .npy files are memory-mapped, so that only the parts that are
+    actually used are read from disk.
+
+    Args:
+        text: The name of a .npy file, or the name of a .npz archive followed
+            by ':key' to select one of the arrays it contains. The key can be
+            omitted if the archive holds a single array.
+        mmap_mode: The memory-map mode, as for numpy.load. Arrays in .npz
+            archives are always read into memory.
+
+    Returns:
+        An array.
+    """
+
+    filename = text.strip()
+    key = None
+    if not os.path.isfile(filename) and ":" in filename:
+        filename, key = filename.rsplit(":", 1)
+
+    data = np.load(filename, mmap_mode=mmap_mode)
+    if not isinstance(data, np.lib.npyio.NpzFile):
+        if key is not None:
+            raise ValueError("Cannot select the array '" + key + "' from the .npy file " + filename)
+        return data
+
+    with data:
+        if key is None:
+            if len(data.files) != 1:
+                raise ValueError("The archive " + filename + " holds several arrays, one must be selected with '" + filename + ":key'")
+            key = data.files[0]
+        return data[key]
+
+
+# matches the conversion specifiers of a format string
+fmt_spec_re = re.compile(r"%[-+ #0-9.]*[a-zA-Z]")
+
+
+@cached
+def _split_format(fmt):
+    """Returns the conversion specifiers of the format string fmt, and the
+    text around them.
+
+    Only depends on fmt, which is fixed by each of the backends, so that the
+    cache does not grow as different data are formatted.
+    """
+
+    return fmt_spec_re.findall(fmt), fmt_spec_re.split(fmt)
+
+
+def _block_format(fmt, constants, nlines):
+    """Returns the format string for nlines lines with format fmt, in which
+    the fields that have a value in constants are already filled in."""
+
+    specs, parts = _split_format(fmt)
+    line = parts[0]
+    for spec, value, part in zip(specs, constants, parts[1:]):
+        if value is None:
+            line += spec
+        else:
+            line += (spec % value).replace("%", "%%")
+        line += part
+    return line * nlines
+
+
+def format_block(fmt, columns):
+    """Formats a block of lines at once.
+
+    Much faster than formatting the lines one at a time, as the whole block
+    is formatted by a single string operation, and gives the same result.
+
+    Args:
+        fmt: The format string of one line, with one conversion specifier
+            for each of the columns and no '%%'.
+        columns: A list with the values of each field. The values that are
+            the same for all the lines are given as scalars, the others as
+            arrays with one element per line. At least one must be an array.
+
+    Returns:
+        A string with all the lines.
+    """
+
+    arrays = [c for c in columns if np.ndim(c) > 0]
+    constants = tuple(None if np.ndim(c) > 0 else c for c in columns)
+    nlines = len(arrays[0])
+    data = np.empty((nlines, len(arrays)), object)
+    for i, c in enumerate(arrays):
+        data[:, i] = c
+    return _block_format(fmt, constants, nlines) % tuple(data.ravel())
+
+
+def backup_file(filename):
+    """Moves an existing file out of the way, keeping all previous backups.
+
+    Args:
+        filename: The name of the file to back up. Nothing is done if it
+            does not exist.
+    """
+
+    i = 0
+    fn_backup = filename
+    while os.path.isfile(fn_backup):
+        fn_backup = '#' + filename + '#%i#' % i
+        i += 1
+
+    if fn_backup != filename:
+        os.rename(filename, fn_backup)
+        info('Backup performed: {0:s} -> {1:s}'.format(filename, fn_backup), verbosity.low)
+
+
+def open_backup(filename, mode='r', buffering=-1, compression="none"):
     """A wrapper around `open` which saves backup files.
 
     If the file is opened in write mode and already exists, it is first
@@ -299,29 +593,27 @@ def open_backup(filename, mode='r', buffering=-1):
     For reference: https://docs.python.org/2/library/functions.html#open
 
     Args:
-        The same as for `open`.
+        The same as for `open`, and
+        compression: One of COMPRESSION. If not "none", the file is opened
+            as a compressed stream, and buffering is ignored. Appending adds
+            a new compressed stream, which is read as a continuation of the
+            previous ones.
 
     Returns:
-        An open file as returned by `open`.
+        An open file as returned by `open`, or a compressed file object.
     """
 
     if mode.startswith('w'):
-
         # If writing, make sure nothing is overwritten.
-
-        i = 0
-        fn_backup = filename
-        while os.path.isfile(fn_backup):
-            fn_backup = '#' + filename + '#%i#' % i
-            i += 1
-
-        if fn_backup != filename:
-            os.rename(filename, fn_backup)
-            info('Backup performed: {0:s} -> {1:s}'.format(filename, fn_backup), verbosity.low)
-
-    else:
-        # There is no need to back up.
-        # `open` will sort out whether `mode` is valid.
-        pass
+        backup_file(filename)
+
+    if compression == "gz":
+        return gzip.open(filename, mode[0] + "b")
+    elif compression == "xz":
+        if lzma is None:
+            raise ValueError("xz compression requires the lzma module")
+        return lzma.LZMAFile(filename, mode[0] + "b")
+    elif compression != "none":
+        raise ValueError("Unknown compression " + compression)
 
     return open(filename, mode, buffering)
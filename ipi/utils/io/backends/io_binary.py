@@ -1,5 +1,14 @@
 """Functions used to print the trajectories and read input configurations
 (or even full status dump) as unformatted binary.
+
+Each frame is stored as a self-contained record: a header giving the number
+of atoms, of replicas, and the lengths of the comment line and of the atom
+labels, followed by the cell, the atomic data of all the replicas, the
+comment and the labels. Records are padded to a multiple of 8 bytes and all
+numbers are little-endian, so that the frames of a file can be located by
+hopping from header to header, and their data read through a memory map.
+BinaryTrajectory does this, and gives the cells and data of all the frames
+as arrays that are views of the file.
 """
 
 # This file is part of i-PI.
@@ -7,51 +16,222 @@
 # See the "licenses" directory for full license information.
 
 
+import os
 import sys
+import struct
+
 import numpy as np
 
+from ipi.utils.depend import dstrip
+from ipi.utils.units import Elements
+
+
+__all__ = ['print_binary_path', 'print_binary', 'read_binary', 'BinaryTrajectory']
+
+
+# each record starts with MAGIC, which is also used to recognize the format
+MAGIC = "IPIBIN02"
+# number of atoms, number of replicas, length of the comment and of the labels
+fmt_header = "<" + str(len(MAGIC)) + "sIIII"
+header_size = struct.calcsize(fmt_header)
+RECORD = np.dtype("<f8")
+
+
+def _padding(size):
+    """Returns the padding that aligns a block of size bytes to a record."""
+
+    return "\0" * (-size % RECORD.itemsize)
+
+
+def _record_size(natoms, nbeads, ltitle, lnames):
+    """Returns the size in bytes of a record and of its data blocks."""
+
+    text = ltitle + lnames
+    return header_size + RECORD.itemsize * (9 + 3 * natoms * nbeads) + text + (-text % RECORD.itemsize)
+
+
+def _print_record(qs, nbeads, names, cell, filedesc, title, cell_conv):
+    """Writes a record, with the data of nbeads replicas in qs."""
 
-__all__ = ['print_binary', 'read_binary']
+    names = "|".join(names)
+    text = title + names
+    filedesc.write(struct.pack(fmt_header, MAGIC, len(qs) // (3 * nbeads), nbeads, len(title), len(names)) +
+                   (dstrip(cell.h) * cell_conv).astype(RECORD).tostring() + qs.astype(RECORD).tostring() + text + _padding(len(text)))
+
+
+def print_binary_path(beads, cell, filedesc=sys.stdout, title="", cell_conv=1.0, atoms_conv=1.0):
+    """Prints all the bead configurations into a single binary record.
+
+    Args:
+        beads: A beads object giving the bead positions.
+        cell: A cell object giving the system box.
+        filedesc: An open writable file object. Defaults to standard output.
+        title: This gives a string to be appended to the comment line.
+        cell_conv: Conversion factor for the cell parameters.
+        atoms_conv: Conversion factor for the atomic data.
+    """
+
+    _print_record(dstrip(beads.q).flatten() * atoms_conv, beads.nbeads, dstrip(beads.names), cell, filedesc, title, cell_conv)
 
 
 def print_binary(atoms, cell, filedesc=sys.stdout, title="", cell_conv=1.0, atoms_conv=1.0):
     """Prints an atomic configuration into a binary file.
 
     Args:
-        beads: An atoms object giving the centroid positions.
+        atoms: An atoms object giving the centroid positions.
         cell: A cell object giving the system box.
         filedesc: An open writable file object. Defaults to standard output.
         title: This gives a string to be appended to the comment line.
+        cell_conv: Conversion factor for the cell parameters.
+        atoms_conv: Conversion factor for the atomic data.
     """
 
-    buff = filedesc
-    # applies conversion of units to the cell and saves to file.
-    (cell.h.flatten() * cell_conv).tofile(buff)
-    nat = np.asarray([atoms.natoms])
-    nat.tofile(buff)
-    # applies conversion of units to the atoms and saves to file.
-    (atoms.q * atoms_conv).tofile(buff)
-    # concatenates names, assuming none contains '|'
-    names = "|".join(atoms.names)
-    nat[0] = len(names)
-    nat.tofile(buff)
-    np.asarray([names]).tofile(buff)
-    # also saves the title to the file.
-    np.asarray([title]).tofile(buff)
+    _print_record(dstrip(atoms.q) * atoms_conv, 1, dstrip(atoms.names), cell, filedesc, title, cell_conv)
+
+
+def _read(filedesc, size):
+    """Reads exactly size bytes from filedesc, or raises an EOFError."""
+
+    text = filedesc.read(size)
+    if len(text) < size:
+        raise EOFError("Incomplete frame in binary file")
+    return text
+
+
+def _parse_text(text, ltitle, lnames):
+    """Splits the text of a record in the comment and the atom labels."""
+
+    names = np.array(text[ltitle:ltitle + lnames].split("|"), dtype='|S4')
+    masses = np.array([Elements.mass(n) for n in names], float)
+    return text[:ltitle], names, masses
 
 
 def read_binary(filedesc):
-    try:
-        cell = np.fromfile(filedesc, dtype=float, count=9)
-        cell.shape = (3, 3)
-        nat = np.fromfile(filedesc, dtype=int, count=1)[0]
-        qatoms = np.fromfile(filedesc, dtype=float, count=3 * nat)
-        nat = np.fromfile(filedesc, dtype=int, count=1)[0]
-        names = np.fromfile(filedesc, dtype='|S1', count=nat)
-        names = "".join(names)
-        names = names.split('|')
-        masses = np.zeros(len(names))
-        title = ''.join(np.fromfile(filedesc, dtype='|S1', count=-1))
-    except (StopIteration, ValueError):
+    """Reads the next frame of a binary file.
+
+    Args:
+        filedesc: An open readable file object.
+
+    Returns:
+        i-PI comment line, cell array, data (positions, forces, etc.), atoms
+        names and masses. For a record holding several replicas, the data are
+        a (nbeads, 3*natoms) array.
+    """
+
+    header = filedesc.read(header_size)
+    if len(header) == 0:
         raise EOFError
-    return (title, cell, qatoms, names, masses)
+    if not header.startswith(MAGIC[:len(header)]):
+        raise ValueError("Invalid frame in binary file")
+    if len(header) < header_size:
+        raise EOFError("Incomplete frame in binary file")
+
+    magic, natoms, nbeads, ltitle, lnames = struct.unpack(fmt_header, header)
+    body = _read(filedesc, _record_size(natoms, nbeads, ltitle, lnames) - header_size)
+    values = np.frombuffer(body, RECORD, 9 + 3 * natoms * nbeads)
+    cell = values[:9].reshape((3, 3)).astype(float)
+    qatoms = values[9:].astype(float)
+    if nbeads > 1:
+        qatoms.shape = (nbeads, 3 * natoms)
+
+    comment, names, masses = _parse_text(body[len(values) * RECORD.itemsize:], ltitle, lnames)
+    return comment, cell, qatoms, names, masses
+
+
+class BinaryTrajectory(object):
+    """Random access to the frames of a binary trajectory file.
+
+    The file is memory mapped, and only the headers of the records are read
+    to locate the frames. When all the frames have the same size, as is the
+    case for an i-PI trajectory, cell and data are arrays spanning all the
+    frames that are views of the file, so that a frame, or a strided slice of
+    frames, is read from disk only when it is used. An incomplete record at
+    the end of a file that is still being written is ignored.
+
+    Attributes:
+       filename: The name of the file.
+       offsets: The position in the file of each record.
+       cell: A (nframes, 3, 3) array with the cell of each frame, or None if
+          the frames do not all have the same size.
+       data: A (nframes, 3*natoms) array with the data of each frame, or a
+          (nframes, nbeads, 3*natoms) array if each record holds several
+          replicas. None if the frames do not all have the same size.
+    """
+
+    def __init__(self, filename):
+        """Maps a binary file and locates its frames.
+
+        Args:
+           filename: The name of the file.
+        """
+
+        self.filename = filename
+        self.cell = None
+        self.data = None
+
+        size = os.path.getsize(filename)
+        if size > 0:
+            self._map = np.memmap(filename, dtype=np.uint8, mode="r")
+        else:
+            self._map = np.zeros(0, np.uint8)
+
+        self.offsets = []
+        self._headers = []
+        pos = 0
+        while pos + header_size <= size:
+            header = struct.unpack(fmt_header, self._map[pos:pos + header_size].tostring())
+            if header[0] != MAGIC:
+                raise ValueError("Invalid frame at byte %d of binary file %s" % (pos, filename))
+            end = pos + _record_size(*header[1:])
+            if end > size:
+                break
+            self.offsets.append(pos)
+            self._headers.append(header[1:])
+            pos = end
+
+        if len(self.offsets) > 0 and all(h == self._headers[0] for h in self._headers):
+            records = np.ndarray((len(self.offsets),), dtype=self._record_dtype(*self._headers[0]), buffer=self._map)
+            self.cell = records["cell"]
+            self.data = records["data"]
+
+    @staticmethod
+    def _record_dtype(natoms, nbeads, ltitle, lnames):
+        """Returns the structured type of a record."""
+
+        text = _record_size(natoms, nbeads, ltitle, lnames) - header_size - RECORD.itemsize * (9 + 3 * natoms * nbeads)
+        if nbeads > 1:
+            shape = (nbeads, 3 * natoms)
+        else:
+            shape = (3 * natoms,)
+        fields = [("header", "V%d" % header_size), ("cell", RECORD, (3, 3)), ("data", RECORD, shape)]
+        if text > 0:
+            fields.append(("text", "V%d" % text))
+        return np.dtype(fields)
+
+    def __len__(self):
+        """Returns the number of frames in the file."""
+
+        return len(self.offsets)
+
+    def __getitem__(self, index):
+        """Returns a frame of the trajectory.
+
+        Args:
+           index: The index of the frame.
+
+        Returns:
+           A dictionary with the same content as the frames of iter_file_raw,
+           where the cell and data are views of the file.
+        """
+
+        pos = self.offsets[index]
+        natoms, nbeads, ltitle, lnames = self._headers[index]
+        record = np.ndarray((), dtype=self._record_dtype(natoms, nbeads, ltitle, lnames), buffer=self._map, offset=pos)
+        text = pos + header_size + RECORD.itemsize * (9 + 3 * natoms * nbeads)
+        comment, names, masses = _parse_text(self._map[text:text + ltitle + lnames].tostring(), ltitle, lnames)
+        return {"comment": comment,
+                "data": record["data"],
+                "masses": masses,
+                "names": names,
+                "natoms": natoms,
+                "cell": record["cell"]}
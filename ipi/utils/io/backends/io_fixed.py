@@ -0,0 +1,116 @@
+"""Functions used to print trajectories, and read them back, in a lossy
+fixed-precision binary format.
+
+Each frame is stored as a header, followed by the cell, the comment line,
+the atom labels and the atomic data. The data are rounded to a multiple of
+a given precision, and the resulting integers are stored with the smallest
+number of bytes that can hold their range within the frame. Positions
+written with a precision of 1e-3 angstrom typically take 2 bytes per
+coordinate instead of the 12 characters of an xyz file. The precision is an
+absolute resolution in the units of the output, so there is no default: a
+value suited to positions would wipe out forces or velocities.
+"""
+
+# This file is part of i-PI.
+# i-PI Copyright (C) 2014-2017 i-PI developers
+# See the "licenses" directory for full license information.
+
+
+import sys
+import struct
+
+import numpy as np
+
+from ipi.utils.depend import dstrip
+from ipi.utils.units import Elements
+
+
+__all__ = ['print_fixed', 'read_fixed']
+
+
+# each frame starts with MAGIC, which is also used to recognize the format
+MAGIC = "IPIFIX"
+# number of atoms, length of the comment and of the labels, precision,
+# offset and type code of the stored integers
+fmt_header = "<iiidq1s"
+fmt_cell = "<9d"
+# the unsigned types used for the data, from the most compact
+int_types = [np.dtype("<u1"), np.dtype("<u2"), np.dtype("<u4"), np.dtype("<u8")]
+
+
+def print_fixed(atoms, cell, filedesc=sys.stdout, title="", cell_conv=1.0, atoms_conv=1.0, precision=None):
+    """Prints an atomic configuration in the fixed-precision binary format.
+
+    Args:
+        atoms: An atoms object giving the centroid positions.
+        cell: A cell object giving the system box.
+        filedesc: An open writable file object. Defaults to standard output.
+        title: This gives a string to be appended to the comment line.
+        cell_conv: Conversion factor for the cell parameters.
+        atoms_conv: Conversion factor for the atomic data.
+        precision: The resolution with which the data are stored, in the
+            output units. Values that are not finite are stored exactly.
+            Must be given.
+    """
+
+    if not precision > 0:
+        raise ValueError("The fixed format needs a positive precision, in the units of the output.")
+
+    qs = dstrip(atoms.q) * atoms_conv
+    names = " ".join(dstrip(atoms.names))
+
+    if np.isfinite(qs).all():
+        iq = np.rint(qs / precision).astype(np.int64)
+        offset = iq.min() if len(iq) > 0 else 0
+        iq -= offset
+        span = iq.max() if len(iq) > 0 else 0
+        dtype = [t for t in int_types if span <= np.iinfo(t).max][0]
+        data = iq.astype(dtype)
+    else:
+        offset = 0
+        data = qs.astype("<f8")
+
+    filedesc.write(MAGIC + struct.pack(fmt_header, atoms.natoms, len(title), len(names), precision, offset, data.dtype.char) +
+                   struct.pack(fmt_cell, *(dstrip(cell.h) * cell_conv).flatten()) + title + names + data.tostring())
+
+
+def _read(filedesc, size):
+    """Reads exactly size bytes from filedesc, or raises an EOFError."""
+
+    text = filedesc.read(size)
+    if len(text) < size:
+        raise EOFError("Incomplete frame in fixed-precision file")
+    return text
+
+
+def read_fixed(filedesc):
+    """Reads a frame written in the fixed-precision binary format.
+
+    Args:
+        filedesc: An open readable file object.
+
+    Returns:
+        i-PI comment line, cell array, data (positions, forces, etc.), atoms
+        names and masses, as read_xyz.
+    """
+
+    magic = filedesc.read(len(MAGIC))
+    if len(magic) == 0:
+        raise EOFError
+    if magic != MAGIC:
+        raise ValueError("Invalid frame in fixed-precision file")
+
+    natoms, ltitle, lnames, precision, offset, code = struct.unpack(fmt_header, _read(filedesc, struct.calcsize(fmt_header)))
+    cell = np.array(struct.unpack(fmt_cell, _read(filedesc, struct.calcsize(fmt_cell)))).reshape((3, 3))
+    comment = _read(filedesc, ltitle)
+    names = np.array(_read(filedesc, lnames).split(), dtype='|S4')
+
+    dtype = np.dtype(code).newbyteorder("<")
+    data = np.frombuffer(_read(filedesc, 3 * natoms * dtype.itemsize), dtype)
+    if dtype.kind == "f":
+        qatoms = data.astype(float)
+    else:
+        qatoms = (data.astype(np.int64) + offset) * precision
+
+    masses = np.array([Elements.mass(n) for n in names], float)
+    return comment, cell, qatoms, names, masses
@@ -15,12 +15,13 @@ import numpy as np
 import ipi.utils.mathtools as mt
 from ipi.utils.depend import dstrip
 from ipi.utils.units import Elements
+from ipi.utils.io import format_block
 
 
 __all__ = ['print_pdb_path', 'print_pdb', 'read_pdb']
 
 
-def print_pdb_path(beads, cell, filedesc=sys.stdout, cell_conv=1.0, atoms_conv=1.0):
+def print_pdb_path(beads, cell, filedesc=sys.stdout, title="", cell_conv=1.0, atoms_conv=1.0):
     """Prints all the bead configurations, into a pdb formatted file.
 
     Prints the ring polymer springs as well as the bead positions using the
@@ -31,12 +32,16 @@ def print_pdb_path(beads, cell, filedesc=sys.stdout, cell_conv=1.0, atoms_conv=1
         beads: A beads object giving the bead positions.
         cell: A cell object giving the system box.
         filedesc: An open writable file object. Defaults to standard output.
+        title: An optional string of max. 70 characters.
     """
 
     fmt_cryst = "CRYST1%9.3f%9.3f%9.3f%7.2f%7.2f%7.2f%s%4i\n"
     fmt_atom = "ATOM  %5i %4s%1s%3s %1s%4i%1s  %8.3f%8.3f%8.3f%6.2f%6.2f          %2s%2i\n"
     fmt_conect = "CONECT%5i%5i\n"
 
+    if title != "":
+        filedesc.write("TITLE   %70s\n" % (title))
+
     a, b, c, alpha, beta, gamma = mt.h2abc_deg(cell.h * cell_conv)
 
     z = 1   # What even is this parameter?
@@ -44,20 +49,17 @@ def print_pdb_path(beads, cell, filedesc=sys.stdout, cell_conv=1.0, atoms_conv=1
 
     natoms = beads.natoms
     nbeads = beads.nbeads
-    for j in range(nbeads):
-        for i in range(natoms):
-            qs = dstrip(beads.q) * atoms_conv
-            lab = dstrip(beads.names)
-            data = (j * natoms + i + 1, lab[i], ' ', '  1', ' ', 1, ' ',
-                    qs[j][3 * i], qs[j][3 * i + 1], qs[j][3 * i + 2], 0.0, 0.0, '  ', 0)
-            filedesc.write(fmt_atom % data)
+    qs = (dstrip(beads.q) * atoms_conv).reshape((nbeads * natoms, 3))
+    lab = np.tile(dstrip(beads.names), nbeads)
+    iatom = np.arange(1, nbeads * natoms + 1)
+    filedesc.write(format_block(fmt_atom, [iatom, lab, ' ', '  1', ' ', 1, ' ',
+                                           qs[:, 0], qs[:, 1], qs[:, 2], 0.0, 0.0, '  ', 0]))
 
     if nbeads > 1:
-        for i in range(natoms):
-            filedesc.write(fmt_conect % (i + 1, (nbeads - 1) * natoms + i + 1))
-        for j in range(nbeads - 1):
-            for i in range(natoms):
-                filedesc.write(fmt_conect % (j * natoms + i + 1, (j + 1) * natoms + i + 1))
+        # each replica of an atom is connected to the one in the next bead,
+        # and the last bead to the first
+        filedesc.write(format_block(fmt_conect, [iatom[:natoms], iatom[(nbeads - 1) * natoms:]]))
+        filedesc.write(format_block(fmt_conect, [iatom[:(nbeads - 1) * natoms], iatom[natoms:]]))
 
     filedesc.write("END\n")
 
@@ -87,14 +89,11 @@ def print_pdb(atoms, cell, filedesc=sys.stdout, title="", cell_conv=1.0, atoms_c
     filedesc.write(fmt_cryst % (a, b, c, alpha, beta, gamma, " P 1        ", z))
 
     natoms = atoms.natoms
-    qs = dstrip(atoms.q) * atoms_conv
+    qs = (dstrip(atoms.q) * atoms_conv).reshape((natoms, 3))
     lab = dstrip(atoms.names)
-    for i in range(natoms):
-        data = (i + 1, lab[i], ' ', '  1', ' ', 1, ' ',
-                qs[3 * i], qs[3 * i + 1], qs[3 * i + 2], 0.0, 0.0, '  ', 0)
-        filedesc.write(fmt_atom % data)
-
-    filedesc.write("END\n")
+    # the atoms are formatted at once, and written with a single call
+    filedesc.write(format_block(fmt_atom, [np.arange(1, natoms + 1), lab, ' ', '  1', ' ', 1, ' ',
+                                           qs[:, 0], qs[:, 1], qs[:, 2], 0.0, 0.0, '  ', 0]) + "END\n")
 
 
 def read_pdb(filedesc):
@@ -15,6 +15,7 @@ import numpy as np
 import ipi.utils.mathtools as mt
 from ipi.utils.depend import dstrip
 from ipi.utils.units import Elements
+from ipi.utils.io import format_block
 
 
 __all__ = ['print_xyz_path', 'print_xyz', 'read_xyz', 'iter_xyz']
@@ -22,7 +23,7 @@ __all__ = ['print_xyz_path', 'print_xyz', 'read_xyz', 'iter_xyz']
 deg2rad = np.pi / 180.0
 
 
-def print_xyz_path(beads, cell, filedesc=sys.stdout, cell_conv=1.0, atoms_conv=1.0):
+def print_xyz_path(beads, cell, filedesc=sys.stdout, title="", cell_conv=1.0, atoms_conv=1.0):
     """Prints all the bead configurations into a XYZ formatted file.
 
     Prints all the replicas for each time step separately, rather than all at
@@ -32,19 +33,20 @@ def print_xyz_path(beads, cell, filedesc=sys.stdout, cell_conv=1.0, atoms_conv=1
         beads: A beads object giving the bead positions.
         cell: A cell object giving the system box.
         filedesc: An open writable file object. Defaults to standard output.
+        title: This gives a string to be appended to the comment lines.
     """
 
     a, b, c, alpha, beta, gamma = mt.h2abc_deg(cell.h * cell_conv)
 
-    fmt_header = "%d\n# bead: %d CELL(abcABC): %10.5f  %10.5f  %10.5f  %10.5f  %10.5f  %10.5f \n"
+    fmt_header = "%d\n# bead: %d CELL(abcABC): %10.5f  %10.5f  %10.5f  %10.5f  %10.5f  %10.5f %s\n"
     natoms = beads.natoms
     nbeads = beads.nbeads
-    for j in range(nbeads):
-        filedesc.write(fmt_header % (natoms, j, a, b, c, alpha, beta, gamma))
-        for i in range(natoms):
-            qs = dstrip(beads.q) * atoms_conv
-            lab = dstrip(beads.names)
-            filedesc.write("%8s %12.5e %12.5e %12.5e\n" % (lab[i], qs[j][3 * i], qs[j][3 * i + 1], qs[j][3 * i + 2]))
+    qs = (dstrip(beads.q) * atoms_conv).reshape((nbeads, natoms, 3))
+    lab = dstrip(beads.names)
+    # all the replicas are written with a single call
+    filedesc.write("".join(fmt_header % (natoms, j, a, b, c, alpha, beta, gamma, title) +
+                           format_block("%8s %12.5e %12.5e %12.5e\n", [lab, qs[j, :, 0], qs[j, :, 1], qs[j, :, 2]])
+                           for j in range(nbeads)))
 
 
 def print_xyz(atoms, cell, filedesc=sys.stdout, title="", cell_conv=1.0, atoms_conv=1.0):
@@ -61,12 +63,12 @@ def print_xyz(atoms, cell, filedesc=sys.stdout, title="", cell_conv=1.0, atoms_c
 
     natoms = atoms.natoms
     fmt_header = "%d\n# CELL(abcABC): %10.5f  %10.5f  %10.5f  %10.5f  %10.5f  %10.5f  %s\n"
-    filedesc.write(fmt_header % (natoms, a, b, c, alpha, beta, gamma, title))
     # direct access to avoid unnecessary slow-down
-    qs = dstrip(atoms.q) * atoms_conv
+    qs = (dstrip(atoms.q) * atoms_conv).reshape((natoms, 3))
     lab = dstrip(atoms.names)
-    for i in range(natoms):
-        filedesc.write("%8s %12.5e %12.5e %12.5e\n" % (lab[i], qs[3 * i], qs[3 * i + 1], qs[3 * i + 2]))
+    # the whole frame is formatted at once, and written with a single call
+    filedesc.write(fmt_header % (natoms, a, b, c, alpha, beta, gamma, title) +
+                   format_block("%8s %12.5e %12.5e %12.5e\n", [lab, qs[:, 0], qs[:, 1], qs[:, 2]]))
 
 
 # Cell type patterns
@@ -17,7 +17,7 @@ import numpy as np
 __all__ = ['xml_node', 'xml_handler', 'xml_parse_string', 'xml_parse_file', 'xml_write',
            'read_type', 'read_float', 'read_int', 'read_bool', 'read_list',
            'read_array', 'read_tuple', 'read_dict', 'write_type', 'write_list',
-           'write_tuple', 'write_float', 'write_bool', 'write_dict']
+           'write_array', 'write_tuple', 'write_float', 'write_bool', 'write_dict']
 
 
 class xml_node(object):
@@ -348,6 +348,11 @@ def read_array(dtype, data):
     [array[0], array[1], ... , array[n]]. Note the use of comma separators, and
     the use of square brackets.
 
+    Numerical arrays are converted with a single call to numpy, which accepts
+    the same strings as float() and int(). If that fails, e.g. because the
+    elements are quoted, the array is read element by element, so that the
+    accepted format and the errors are the same in both cases.
+
     Args:
         data: The string to be read in.
         dtype: The data type of the elements of the target array.
@@ -359,6 +364,17 @@ def read_array(dtype, data):
         An array of data type dtype.
     """
 
+    if dtype in (float, int):
+        try:
+            begin = data.index("[")
+            end = data.index("]")
+        except ValueError:
+            raise ValueError("Error in list syntax: could not locate delimiters")
+        try:
+            return np.array(data[begin + 1:end].split(","), dtype=dtype)
+        except ValueError:
+            pass
+
     rlist = read_list(data)
     for i in range(len(rlist)):
         rlist[i] = read_type(dtype, rlist[i])
@@ -490,6 +506,40 @@ def write_list(data, delims="[]"):
     return rstr
 
 
+def write_array(dtype, data, perline=5, newline="\n"):
+    """Writes a formatted string from the elements of a 1D array.
+
+    The elements are formatted as by write_type and separated by commas, with
+    perline elements on each line. Floats are formatted a whole block at a time.
+
+    For example [1.0, 2.0, 3.0] with perline=2 -->
+    '  1.00000000e+00,   2.00000000e+00, ' + newline + '  3.00000000e+00'
+
+    Args:
+        dtype: The data type of the elements.
+        data: The array to be written.
+        perline: The number of elements on each line.
+        newline: The string written between two lines.
+
+    Returns:
+        A formatted string.
+    """
+
+    nfull = (len(data) // perline) * perline
+    rows = []
+    if dtype is float:
+        fmt = ", ".join(["%16.8e"] * perline)
+        if nfull > 0:
+            rows.append((", " + newline).join([fmt] * (nfull // perline)) % tuple(data[:nfull]))
+        if nfull < len(data):
+            rows.append(", ".join(["%16.8e"] * (len(data) - nfull)) % tuple(data[nfull:]))
+    else:
+        items = [write_type(dtype, v) for v in data]
+        for i in range(0, len(items), perline):
+            rows.append(", ".join(items[i:i + perline]))
+    return (", " + newline).join(rows)
+
+
 def write_tuple(data):
     """Writes a formatted string from a tuple.
 
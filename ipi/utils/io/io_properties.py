@@ -0,0 +1,253 @@
+"""Functions used to write and read the property output files.
+
+Properties are written either as text, one line per frame preceded by a
+commented header describing the columns, or in a binary format made of a
+header followed by one fixed-width record of float64 values per frame.
+
+The binary file starts with the 8 bytes 'IPIPROPS', followed by two 32-bit
+unsigned integers giving the version of the format and the length of the
+header, and by the header itself, a JSON dictionary padded with spaces so
+that the records are aligned to 8 bytes. The records are little-endian, so
+the data can be read directly through a memory map.
+"""
+
+# This file is part of i-PI.
+# i-PI Copyright (C) 2014-2017 i-PI developers
+# See the "licenses" directory for full license information.
+
+
+import os
+import json
+import struct
+
+import numpy as np
+
+from ipi.engine.properties import getkey, getall
+
+
+__all__ = ["PropertyFile", "is_binary_properties", "print_properties_header", "print_properties_record"]
+
+
+MAGIC = "IPIPROPS"
+VERSION = 1
+RECORD = np.dtype("<f8")
+
+
+def is_binary_properties(filename):
+    """Tells whether filename is a binary property file."""
+
+    with open(filename, "rb") as filedesc:
+        return filedesc.read(len(MAGIC)) == MAGIC
+
+
+def print_properties_header(properties, filedesc):
+    """Writes the header of a binary property file.
+
+    Args:
+       properties: A list of dictionaries describing the properties in the
+          order in which they are output. Each has the name used in the input
+          file, and its "dimension", "unit", "size" and "help".
+       filedesc: An open writable file object.
+    """
+
+    columns = []
+    icol = 0
+    for prop in properties:
+        column = dict(prop)
+        column["key"] = getkey(prop["name"])
+        column["column"] = icol
+        icol += prop["size"]
+        columns.append(column)
+
+    header = json.dumps({"ncols": icol, "properties": columns})
+    header += " " * (-(len(MAGIC) + 8 + len(header)) % RECORD.itemsize)
+    filedesc.write(MAGIC + struct.pack("<II", VERSION, len(header)) + header)
+
+
+def print_properties_record(values, filedesc):
+    """Writes one frame of a binary property file.
+
+    Args:
+       values: A list with the value of each of the properties, either
+          scalars or arrays.
+       filedesc: An open writable file object.
+    """
+
+    filedesc.write(np.hstack(values).astype(RECORD).tostring())
+
+
+def property_size(value):
+    """Returns the number of columns that a property value takes."""
+
+    if hasattr(value, "__len__"):
+        return len(value)
+    return 1
+
+
+class PropertyFile(object):
+    """Read-only access to the columns of a property file.
+
+    Both text and binary files can be read. The data of binary files are
+    memory mapped, so that only the columns that are used are read from disk,
+    and an incomplete record at the end of a file that is still being written
+    is ignored. Text files are only loaded in full if all the values of a
+    property are requested, and iter_frames() reads them one line at a time.
+
+    Attributes:
+       filename: The name of the file.
+       binary: True if the file is in the binary format.
+       properties: A list of dictionaries describing the properties in the
+          file, with their "name", "key", "unit", "size" and first "column".
+          The "dimension" and "help" are only known for binary files.
+       data: A (nframes, ncols) array with the values in the file. For text
+          files it is loaded the first time it is used.
+       offset: The size in bytes of the header of a binary file, which is
+          followed by the records.
+    """
+
+    def __init__(self, filename):
+        """Reads the header of a property file, and maps its data.
+
+        Args:
+           filename: The name of the file.
+        """
+
+        self.filename = filename
+        self.offset = 0
+        self._data = None
+        self.binary = is_binary_properties(filename)
+        if self.binary:
+            self._read_binary()
+        else:
+            self._read_text()
+
+    def _read_binary(self):
+        """Reads a binary file, mapping its records."""
+
+        with open(self.filename, "rb") as filedesc:
+            filedesc.seek(len(MAGIC))
+            version, hlen = struct.unpack("<II", filedesc.read(8))
+            if version > VERSION:
+                raise ValueError("Unsupported version %d of the binary property format in %s" % (version, self.filename))
+            header = json.loads(filedesc.read(hlen))
+
+        self.properties = header["properties"]
+        ncols = header["ncols"]
+        self.offset = len(MAGIC) + 8 + hlen
+        nframes = (os.path.getsize(self.filename) - self.offset) // (ncols * RECORD.itemsize)
+        if nframes > 0 and ncols > 0:
+            self._data = np.memmap(self.filename, dtype=RECORD, mode="r", offset=self.offset, shape=(nframes, ncols))
+        else:
+            self._data = np.zeros((0, ncols), RECORD)
+
+    def _read_text(self):
+        """Reads a text file, parsing the column descriptions in its header."""
+
+        self.properties = []
+        with open(self.filename, "r") as filedesc:
+            for line in filedesc:
+                if not line.startswith("#"):
+                    break
+                if "-->" not in line:
+                    continue
+                cols, name = line[1:].split("-->", 1)
+                cols = cols.split()[-1].split("-")
+                name = name.split(" : ", 1)[0].strip()
+                unit = getall(name)[1]
+                self.properties.append({"name": name, "key": getkey(name), "unit": unit,
+                                        "column": int(cols[0]) - 1, "size": int(cols[-1]) - int(cols[0]) + 1})
+
+    def _iter_text(self):
+        """Iterates over the lines of values of a text file, split in columns."""
+
+        with open(self.filename, "r") as filedesc:
+            for line in filedesc:
+                if line.startswith("#"):
+                    continue
+                values = line.split()
+                if len(values) > 0:
+                    yield values
+
+    def get_data(self):
+        """Returns the values in the file, loading them if necessary."""
+
+        if self._data is None:
+            self._data = np.loadtxt(self.filename, ndmin=2)
+        return self._data
+
+    data = property(get_data)
+
+    def iter_frames(self, names):
+        """Iterates over the values of some properties, one frame at a time.
+
+        Text files are read one line at a time, rather than loaded in full,
+        and binary files are read through the memory map.
+
+        Args:
+           names: A list of property names, as in find().
+
+        Returns:
+           A generator giving, for each frame, a tuple with the values of the
+           properties, as floats or, for the properties that take several
+           columns, as arrays.
+        """
+
+        props = [self.find(name) for name in names]
+        if self.binary:
+            rows = iter(self.data)
+        else:
+            rows = self._iter_text()
+        for row in rows:
+            yield tuple(float(row[p["column"]]) if p["size"] == 1 else
+                        np.array(row[p["column"]:p["column"] + p["size"]], float) for p in props)
+
+    def __len__(self):
+        """Returns the number of frames in the file."""
+
+        return len(self.data)
+
+    def find(self, name):
+        """Returns the description of a property.
+
+        Args:
+           name: The name of the property, as given in the input file. If
+              no property has exactly this name, it is matched against the
+              property keywords, stripped of units and arguments.
+
+        Raises:
+           KeyError: Raised if the property is not found in the file, or
+              if several properties match name.
+        """
+
+        found = [p for p in self.properties if p["name"] == name]
+        if len(found) == 0:
+            found = [p for p in self.properties if p["key"] == getkey(name)]
+        if len(found) == 0:
+            raise KeyError("Could not find " + name + " in file " + self.filename)
+        if len(found) > 1:
+            raise KeyError("Multiple instances of the property " + name + " have been found in file " + self.filename)
+        return found[0]
+
+    def unit(self, name):
+        """Returns the unit a property is written in.
+
+        Properties written without an explicit unit are in atomic units.
+        """
+
+        return self.find(name)["unit"] or "atomic_unit"
+
+    def __getitem__(self, name):
+        """Returns the values of a property in all the frames.
+
+        Args:
+           name: The name of the property, as in find().
+
+        Returns:
+           An array with one value per frame, or a (nframes, size) array if
+           the property takes several columns.
+        """
+
+        prop = self.find(name)
+        if prop["size"] == 1:
+            return self.data[:, prop["column"]]
+        return self.data[:, prop["column"]:prop["column"] + prop["size"]]
@@ -5,6 +5,8 @@
 # See the "licenses" directory for full license information.
 
 
+import threading
+
 import numpy as np
 
 from ipi.utils.messages import verbosity, info
@@ -60,6 +62,19 @@ def mk_o_nm_matrix(nbeads):
     return b2o_nm / np.sqrt(nbeads)
 
 
+def open_columns(open_paths):
+    """Returns the indices of the columns of a (nbeads, 3*natoms) array that
+    correspond to the atoms with open paths, so that they can be transformed
+    with a single matrix product.
+
+    Args:
+       open_paths: A list of the indices of the atoms with open paths.
+    """
+
+    open_paths = np.asarray(open_paths, int).reshape(-1)
+    return (3 * open_paths[:, np.newaxis] + np.arange(3)).flatten()
+
+
 def mk_rs_matrix(nb1, nb2):
     """Makes a matrix that transforms a path with `nb1` beads to one with `nb2` beads.
 
@@ -138,6 +153,7 @@ class nm_trans(object):
           representations.
        _nm2b: The matrix to transform between the normal mode and bead
           representations.
+       _open: The indices of the columns of the atoms with open paths.
     """
 
     def __init__(self, nbeads, open_paths=None):
@@ -145,43 +161,42 @@ class nm_trans(object):
 
         Args:
            nbeads: The number of beads.
+           open_paths: An optional list of the atoms with open paths.
         """
 
         self._b2nm = mk_nm_matrix(nbeads)
         self._nm2b = self._b2nm.T
         if open_paths is None:
             open_paths = []
-        self._open = open_paths
+        self._open = open_columns(open_paths)
         # definition of the transformation also with the open path matrx
         self._b2o_nm = mk_o_nm_matrix(nbeads)
         self._o_nm2b = self._b2o_nm.T
 
-    def b2nm(self, q):
+    def b2nm(self, q, out=None):
         """Transforms a matrix to the normal mode representation.
 
         Args:
            q: A matrix with nbeads rows, in the bead representation.
+           out: An optional array in which the result is written.
         """
 
-        qnm = np.dot(self._b2nm, q)
-        for io in self._open:  # does separately the transformation for the atom that are marked as open paths
-            qnm[:, 3 * io] = np.dot(self._b2o_nm, q[:, 3 * io])
-            qnm[:, 3 * io + 1] = np.dot(self._b2o_nm, q[:, 3 * io + 1])
-            qnm[:, 3 * io + 2] = np.dot(self._b2o_nm, q[:, 3 * io + 2])
+        qnm = np.dot(self._b2nm, q, out=out)
+        if len(self._open) > 0:  # does separately the transformation for the atom that are marked as open paths
+            qnm[:, self._open] = np.dot(self._b2o_nm, q[:, self._open])
         return qnm
 
-    def nm2b(self, qnm):
+    def nm2b(self, qnm, out=None):
         """Transforms a matrix to the bead representation.
 
         Args:
-           q: A matrix with nbeads rows, in the normal mode representation.
+           qnm: A matrix with nbeads rows, in the normal mode representation.
+           out: An optional array in which the result is written.
         """
 
-        q = np.dot(self._nm2b, qnm)
-        for io in self._open:  # does separately the transformation for the atom that are marked as open paths
-            q[:, 3 * io] = np.dot(self._o_nm2b, qnm[:, 3 * io])
-            q[:, 3 * io + 1] = np.dot(self._o_nm2b, qnm[:, 3 * io + 1])
-            q[:, 3 * io + 2] = np.dot(self._o_nm2b, qnm[:, 3 * io + 2])
+        q = np.dot(self._nm2b, qnm, out=out)
+        if len(self._open) > 0:  # does separately the transformation for the atom that are marked as open paths
+            q[:, self._open] = np.dot(self._o_nm2b, qnm[:, self._open])
         return q
 
 
@@ -194,6 +209,7 @@ class nm_rescale(object):  # !! TODO - make compatible with a open path formulat
           beads and another with 'nbeads2' beads.
        _b2tob1: The matrix to transform between a ring polymer with 'nbeads2'
           beads and another with 'nbeads1' beads.
+       _open: The indices of the columns of the atoms with open paths.
     """
 
     def __init__(self, nbeads1, nbeads2, open_paths=None):
@@ -202,6 +218,7 @@ class nm_rescale(object):  # !! TODO - make compatible with a open path formulat
         Args:
            nbeads1: The initial number of beads.
            nbeads2: The rescaled number of beads.
+           open_paths: An optional list of the atoms with open paths.
         """
 
         self._b1tob2 = mk_rs_matrix(nbeads1, nbeads2)
@@ -209,7 +226,7 @@ class nm_rescale(object):  # !! TODO - make compatible with a open path formulat
         # definition of the scaling also using the open case normal mode matrixtransformations
         if open_paths is None:
             open_paths = []
-        self._open = open_paths
+        self._open = open_columns(open_paths)
         self._o_b1tob2 = mk_o_rs_matrix(nbeads1, nbeads2)
         self._o_b2tob1 = self._o_b1tob2.T * (float(nbeads1) / float(nbeads2))
 
@@ -219,33 +236,34 @@ class nm_rescale(object):  # !! TODO - make compatible with a open path formulat
         Args:
            q: A matrix with nbeads1 rows, in the bead representation.
         """
+
         q_scal = np.dot(self._b1tob2, q)
-        for io in self._open:  # does separately the transformation for the atom that are marked as open paths
-            q_scal[:, 3 * io] = np.dot(self._o_b1tob2, q[:, 3 * io])
-            q_scal[:, 3 * io + 1] = np.dot(self._o_b1tob2, q[:, 3 * io + 1])
-            q_scal[:, 3 * io + 2] = np.dot(self._o_b1tob2, q[:, 3 * io + 2])
+        if len(self._open) > 0:  # does separately the transformation for the atom that are marked as open paths
+            q_scal[:, self._open] = np.dot(self._o_b1tob2, q[:, self._open])
         return q_scal
 
-#      return np.dot(self._b1tob2,q)
-
     def b2tob1(self, q):
         """Transforms a matrix from one value of beads to another.
 
         Args:
            q: A matrix with nbeads2 rows, in the bead representation.
         """
+
         q_scal = np.dot(self._b2tob1, q)
-        for io in self._open:  # does separately the transformation for the atom that are marked as open paths
-            q_scal[:, 3 * io] = np.dot(self._o_b2tob1, q[:, 3 * io])
-            q_scal[:, 3 * io + 1] = np.dot(self._o_b2tob1, q[:, 3 * io + 1])
-            q_scal[:, 3 * io + 2] = np.dot(self._o_b2tob1, q[:, 3 * io + 2])
+        if len(self._open) > 0:  # does separately the transformation for the atom that are marked as open paths
+            q_scal[:, self._open] = np.dot(self._o_b2tob1, q[:, self._open])
         return q_scal
-#      return np.dot(self._b2tob1,q)
 
 
-class nm_fft(object):  # ! TODO add (matrix-version) of the open path transformation here
+class nm_fft(object):
     """Uses Fast Fourier transforms to do normal mode transformations.
 
+    The transforms are done in double precision, on work buffers that are
+    allocated once. If PyFFTW is available, the transforms are planned once
+    and can use several threads, otherwise the NumPy FFT is used, and the
+    work buffers are replaced by its results. The work buffers are shared,
+    so the transforms are serialised by a lock.
+
     Attributes:
        fft: The fast-Fourier transform function to transform between the
           bead and normal mode representations.
@@ -257,114 +275,118 @@ class nm_fft(object):  # ! TODO add (matrix-version) of the open path transforma
           them to the bead representation.
        nbeads: The number of beads.
        natoms: The number of atoms.
+       _open: The indices of the columns of the atoms with open paths.
+       _lock: A lock protecting the work buffers.
     """
 
-    def __init__(self, nbeads, natoms, open_paths=None):
-        """Initializes nm_trans.
+    def __init__(self, nbeads, natoms, open_paths=None, n_threads=1):
+        """Initializes nm_fft.
 
         Args:
            nbeads: The number of beads.
            natoms: The number of atoms.
+           open_paths: An optional list of the atoms with open paths.
+           n_threads: The number of threads used by PyFFTW.
         """
 
         self.nbeads = nbeads
         self.natoms = natoms
         if open_paths is None:
             open_paths = []
-        self._open = open_paths
+        self._open = open_columns(open_paths)
         # for atoms with open path we still use the matrix transformation
         self._b2o_nm = mk_o_nm_matrix(nbeads)
         self._o_nm2b = self._b2o_nm.T
+        self._lock = threading.Lock()
         try:
             import pyfftw
             info("Import of PyFFTW successful", verbosity.medium)
-            self.qdummy = pyfftw.n_byte_align_empty((nbeads, 3 * natoms), 16, 'float32')
-            self.qnmdummy = pyfftw.n_byte_align_empty((nbeads // 2 + 1, 3 * natoms), 16, 'complex64')
-            self.fft = pyfftw.FFTW(self.qdummy, self.qnmdummy, axes=(0,), direction='FFTW_FORWARD')
-            self.ifft = pyfftw.FFTW(self.qnmdummy, self.qdummy, axes=(0,), direction='FFTW_BACKWARD')
+            self.qdummy = pyfftw.empty_aligned((nbeads, 3 * natoms), dtype='float64')
+            self.qnmdummy = pyfftw.empty_aligned((nbeads // 2 + 1, 3 * natoms), dtype='complex128')
+            self.fft = pyfftw.FFTW(self.qdummy, self.qnmdummy, axes=(0,), direction='FFTW_FORWARD', threads=n_threads)
+            self.ifft = pyfftw.FFTW(self.qnmdummy, self.qdummy, axes=(0,), direction='FFTW_BACKWARD', threads=n_threads)
         except ImportError:  # Uses standard numpy fft library if nothing better
                             # is available
             info("Import of PyFFTW unsuccessful, using NumPy library instead", verbosity.medium)
-            self.qdummy = np.zeros((nbeads, 3 * natoms), dtype='float32')
-            self.qnmdummy = np.zeros((nbeads // 2 + 1, 3 * natoms), dtype='complex64')
+            self.qdummy = np.zeros((nbeads, 3 * natoms), dtype='float64')
+            self.qnmdummy = np.zeros((nbeads // 2 + 1, 3 * natoms), dtype='complex128')
 
-            def dummy_fft(self):
+            # numpy cannot write the transforms in place, so the buffers
+            # are rebound to their results rather than copied into
+            def dummy_fft():
                 self.qnmdummy = np.fft.rfft(self.qdummy, axis=0)
 
-            def dummy_ifft(self):
+            def dummy_ifft():
                 self.qdummy = np.fft.irfft(self.qnmdummy, n=self.nbeads, axis=0)
-            self.fft = lambda: dummy_fft(self)
-            self.ifft = lambda: dummy_ifft(self)
+            self.fft = dummy_fft
+            self.ifft = dummy_ifft
 
-    def b2nm(self, q):
+    def b2nm(self, q, out=None):
         """Transforms a matrix to the normal mode representation.
 
         Args:
            q: A matrix with nbeads rows and 3*natoms columns,
               in the bead representation.
+           out: An optional array in which the result is written.
         """
 
         if self.nbeads == 1:
-            return q
-        self.qdummy[:] = q
-        self.fft()
-        if self.nbeads == 2:
-            return self.qnmdummy.real / np.sqrt(self.nbeads)
+            if out is None:
+                return q
+            out[:] = q
+            return out
 
+        qnm = np.empty(q.shape) if out is None else out
         nmodes = self.nbeads / 2
-
-        self.qnmdummy /= np.sqrt(self.nbeads)
-        qnm = np.zeros(q.shape)
-        qnm[0, :] = self.qnmdummy[0, :].real
-
-        if self.nbeads % 2 == 0:
-            self.qnmdummy[1:-1, :] *= np.sqrt(2)
-            (qnm[1:nmodes, :], qnm[self.nbeads:nmodes:-1, :]) = (self.qnmdummy[1:-1, :].real, self.qnmdummy[1:-1, :].imag)
-            qnm[nmodes, :] = self.qnmdummy[nmodes, :].real
-        else:
-            self.qnmdummy[1:, :] *= np.sqrt(2)
-            (qnm[1:nmodes + 1, :], qnm[self.nbeads:nmodes:-1, :]) = (self.qnmdummy[1:, :].real, self.qnmdummy[1:, :].imag)
-
-        for io in self._open:  # does separately the transformation for the atom that are marked as open paths
-            qnm[:, 3 * io] = np.dot(self._b2o_nm, q[:, 3 * io])
-            qnm[:, 3 * io + 1] = np.dot(self._b2o_nm, q[:, 3 * io + 1])
-            qnm[:, 3 * io + 2] = np.dot(self._b2o_nm, q[:, 3 * io + 2])
+        scale = 1.0 / np.sqrt(self.nbeads)
+        with self._lock:
+            self.qdummy[:] = q
+            self.fft()
+            cnm = self.qnmdummy
+            np.multiply(cnm[0].real, scale, out=qnm[0])
+            if self.nbeads % 2 == 0:
+                np.multiply(cnm[1:-1].real, scale * np.sqrt(2), out=qnm[1:nmodes])
+                np.multiply(cnm[1:-1].imag, scale * np.sqrt(2), out=qnm[self.nbeads:nmodes:-1])
+                np.multiply(cnm[nmodes].real, scale, out=qnm[nmodes])
+            else:
+                np.multiply(cnm[1:].real, scale * np.sqrt(2), out=qnm[1:nmodes + 1])
+                np.multiply(cnm[1:].imag, scale * np.sqrt(2), out=qnm[self.nbeads:nmodes:-1])
+
+        if len(self._open) > 0:  # does separately the transformation for the atom that are marked as open paths
+            qnm[:, self._open] = np.dot(self._b2o_nm, q[:, self._open])
         return qnm
 
-    def nm2b(self, qnm):
+    def nm2b(self, qnm, out=None):
         """Transforms a matrix to the bead representation.
 
         Args:
            qnm: A matrix with nbeads rows and 3*natoms columns,
               in the normal mode representation.
+           out: An optional array in which the result is written.
         """
 
         if self.nbeads == 1:
-            return qnm
-        if self.nbeads == 2:
-            self.qnmdummy[:] = qnm
-            self.ifft()
-            return self.qdummy * np.sqrt(self.nbeads)
+            if out is None:
+                return qnm
+            out[:] = qnm
+            return out
 
+        q = np.empty(qnm.shape) if out is None else out
         nmodes = self.nbeads / 2
-        odd = self.nbeads - 2 * nmodes  # 0 if even, 1 if odd
-
-        qnm_complex = np.zeros((nmodes + 1, len(qnm[0, :])), complex)
-        qnm_complex[0, :] = qnm[0, :]
-        if not odd:
-            (qnm_complex[1:-1, :].real, qnm_complex[1:-1, :].imag) = (qnm[1:nmodes, :], qnm[self.nbeads:nmodes:-1, :])
-            qnm_complex[1:-1, :] /= np.sqrt(2)
-            qnm_complex[nmodes, :] = qnm[nmodes, :]
-        else:
-            (qnm_complex[1:, :].real, qnm_complex[1:, :].imag) = (qnm[1:nmodes + 1, :], qnm[self.nbeads:nmodes:-1, :])
-            qnm_complex[1:, :] /= np.sqrt(2)
-
-        self.qnmdummy[:] = qnm_complex
-        self.ifft()
-        q = np.zeros(qnm.shape)
-        q = self.qdummy * np.sqrt(self.nbeads)
-        for io in self._open:  # does separately the transformation for the atom that are marked as open paths
-            q[:, 3 * io] = np.dot(self._o_nm2b, qnm[:, 3 * io])
-            q[:, 3 * io + 1] = np.dot(self._o_nm2b, qnm[:, 3 * io + 1])
-            q[:, 3 * io + 2] = np.dot(self._o_nm2b, qnm[:, 3 * io + 2])
+        scale = 1.0 / np.sqrt(2)
+        with self._lock:
+            cnm = self.qnmdummy
+            cnm[0] = qnm[0]
+            if self.nbeads % 2 == 0:
+                np.multiply(qnm[1:nmodes], scale, out=cnm[1:-1].real)
+                np.multiply(qnm[self.nbeads:nmodes:-1], scale, out=cnm[1:-1].imag)
+                cnm[nmodes] = qnm[nmodes]
+            else:
+                np.multiply(qnm[1:nmodes + 1], scale, out=cnm[1:].real)
+                np.multiply(qnm[self.nbeads:nmodes:-1], scale, out=cnm[1:].imag)
+            self.ifft()
+            np.multiply(self.qdummy, np.sqrt(self.nbeads), out=q)
+
+        if len(self._open) > 0:  # does separately the transformation for the atom that are marked as open paths
+            q[:, self._open] = np.dot(self._o_nm2b, qnm[:, self._open])
         return q
@@ -0,0 +1,314 @@
+"""A persistent pool of worker threads.
+
+Used to run concurrently the per-step tasks of a simulation (e.g. the motion
+step of each system, or the output writers) without creating and joining a
+new thread for each of them at every step, and to move slow tasks (e.g.
+writing to disk) off the critical path of the simulation.
+"""
+
+# This file is part of i-PI.
+# i-PI Copyright (C) 2014-2017 i-PI developers
+# See the "licenses" directory for full license information.
+
+
+import sys
+import threading
+import Queue
+
+
+__all__ = ['ThreadPool', 'SerialQueue', 'Job']
+
+
+# seconds between checks of the completion of a batch of jobs. waiting
+# without a timeout would prevent the main thread from receiving signals.
+POOLLATENCY = 2.0
+
+
+class Job(object):
+    """A task submitted to a ThreadPool, similar to a future.
+
+    Attributes:
+       func: The function to be called.
+       kwargs: A dictionary with the keyword arguments of func.
+       result: The value returned by func, once it has been called.
+       excinfo: The exception information if func raised an exception,
+          None otherwise.
+       _done: An event that is set once func has been called.
+    """
+
+    def __init__(self, func, kwargs=None):
+        """Initialises Job.
+
+        Args:
+           func: The function to be called.
+           kwargs: An optional dictionary of keyword arguments for func.
+        """
+
+        self.func = func
+        self.kwargs = {} if kwargs is None else kwargs
+        self.result = None
+        self.excinfo = None
+        self._done = threading.Event()
+
+    def execute(self, catchexit=True):
+        """Calls the function and stores the result.
+
+        Args:
+           catchexit: If True, a SystemExit raised by func (e.g. when a soft
+              exit is triggered from within a worker) is swallowed, as it would
+              be by a standard thread. Otherwise it is propagated.
+        """
+
+        try:
+            self.result = self.func(**self.kwargs)
+        except SystemExit:
+            if not catchexit:
+                raise
+        except BaseException:
+            self.excinfo = sys.exc_info()
+        finally:
+            self._done.set()
+
+    def done(self):
+        """Returns True if the job has been executed."""
+
+        return self._done.is_set()
+
+    def join(self):
+        """Waits for the job to be executed.
+
+        The wait is done in chunks of POOLLATENCY seconds, so that the
+        calling thread stays responsive to signals.
+        """
+
+        while not self._done.is_set():
+            self._done.wait(POOLLATENCY)
+
+    def wait(self):
+        """Waits for the job to be executed, and returns its result.
+
+        Raises:
+           The exception raised by func, if any.
+        """
+
+        self.join()
+        if self.excinfo is not None:
+            raise self.excinfo[0], self.excinfo[1], self.excinfo[2]
+        return self.result
+
+
+class ThreadPool(object):
+    """A pool of persistent daemon worker threads.
+
+    Jobs are handed to the workers through a queue. The pool grows on demand
+    so that all the jobs of a batch can run at the same time, which is
+    necessary when they depend on each other (e.g. several systems that share
+    a forcefield which waits for all of them).
+
+    Attributes:
+       name: A string used as a prefix for the names of the worker threads.
+       _queue: The queue of jobs waiting to be executed.
+       _threads: The list of worker threads.
+    """
+
+    def __init__(self, name="worker"):
+        """Initialises ThreadPool.
+
+        Args:
+           name: An optional prefix for the names of the worker threads.
+        """
+
+        self.name = name
+        self._queue = Queue.Queue()
+        self._threads = []
+
+    def _worker(self):
+        """Main loop of a worker thread: executes jobs until a None is
+        retrieved from the queue."""
+
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            job.execute()
+
+    def resize(self, nthreads):
+        """Makes sure that the pool has at least nthreads workers.
+
+        Args:
+           nthreads: The minimum number of worker threads.
+        """
+
+        while len(self._threads) < nthreads:
+            st = threading.Thread(target=self._worker, name=self.name + "_" + str(len(self._threads)))
+            st.daemon = True
+            st.start()
+            self._threads.append(st)
+
+    def submit(self, func, **kwargs):
+        """Queues a call to func for execution by the workers.
+
+        Args:
+           func: The function to be called.
+           kwargs: The keyword arguments of func.
+
+        Returns:
+           A Job object that can be used to wait for the result.
+        """
+
+        if len(self._threads) == 0:
+            self.resize(1)
+        job = Job(func, kwargs)
+        self._queue.put(job)
+        return job
+
+    def run(self, jobs):
+        """Executes a batch of jobs concurrently and waits for all of them.
+
+        The first job is run in the calling thread, and the others by the
+        workers, so that a batch of a single job has no threading overhead.
+        Must be called from one thread at a time.
+
+        Args:
+           jobs: A list of Job objects.
+
+        Returns:
+           A list with the results of the jobs.
+
+        Raises:
+           The first exception raised by one of the jobs, if any.
+        """
+
+        if len(jobs) == 0:
+            return []
+
+        self.resize(len(jobs) - 1)
+        for job in jobs[1:]:
+            self._queue.put(job)
+        jobs[0].execute(catchexit=False)
+
+        for job in jobs:
+            job.join()
+        return [job.wait() for job in jobs]
+
+    def close(self):
+        """Stops all the worker threads once the queued jobs are done."""
+
+        for st in self._threads:
+            self._queue.put(None)
+        self._threads = []
+
+
+class SerialQueue(object):
+    """A single daemon worker thread fed through a bounded queue.
+
+    Jobs are executed one at a time in the order in which they have been
+    submitted. When the queue is full, submit() blocks until the worker has
+    caught up, so that a slow worker cannot accumulate an unbounded backlog.
+    If a job fails, the following ones are discarded and the exception is
+    raised in the submitting thread at the next call to submit() or drain().
+
+    Attributes:
+       name: The name of the worker thread.
+       maxsize: The maximum number of jobs waiting in the queue.
+       excinfo: The exception information of the first failed job, None if
+          no job has failed.
+       _queue: The queue of jobs waiting to be executed.
+       _thread: The worker thread, None until the first job is submitted.
+    """
+
+    def __init__(self, name="serial", maxsize=64):
+        """Initialises SerialQueue.
+
+        Args:
+           name: An optional name for the worker thread.
+           maxsize: The maximum number of jobs waiting in the queue.
+        """
+
+        self.name = name
+        self.maxsize = maxsize
+        self.excinfo = None
+        self._queue = Queue.Queue(maxsize)
+        self._thread = None
+
+    def _worker(self):
+        """Main loop of the worker thread: executes jobs until a None is
+        retrieved from the queue."""
+
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    break
+                if self.excinfo is None:
+                    job.execute()
+                    if job.excinfo is not None:
+                        self.excinfo = job.excinfo
+            finally:
+                self._queue.task_done()
+
+    def _check(self):
+        """Raises the exception of the first failed job, if any."""
+
+        if self.excinfo is not None:
+            excinfo = self.excinfo
+            self.excinfo = None
+            raise excinfo[0], excinfo[1], excinfo[2]
+
+    def submit(self, func, **kwargs):
+        """Queues a call to func, waiting for a free slot if the queue is full.
+
+        The wait is done in chunks of POOLLATENCY seconds, so that the
+        calling thread stays responsive to signals.
+
+        Args:
+           func: The function to be called.
+           kwargs: The keyword arguments of func.
+
+        Returns:
+           A Job object that can be used to wait for the result.
+
+        Raises:
+           The exception raised by a previously submitted job, if any.
+        """
+
+        self._check()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._worker, name=self.name)
+            self._thread.daemon = True
+            self._thread.start()
+
+        job = Job(func, kwargs)
+        while True:
+            try:
+                self._queue.put(job, True, POOLLATENCY)
+                break
+            except Queue.Full:
+                pass
+        return job
+
+    def drain(self):
+        """Waits until all the submitted jobs have been executed.
+
+        Raises:
+           The exception raised by one of the jobs, if any.
+        """
+
+        if self._thread is threading.currentThread():
+            return  # the worker would wait for itself
+        cond = self._queue.all_tasks_done
+        cond.acquire()
+        try:
+            while self._queue.unfinished_tasks > 0:
+                cond.wait(POOLLATENCY)
+        finally:
+            cond.release()
+        self._check()
+
+    def close(self):
+        """Stops the worker thread once the queued jobs are done."""
+
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread = None
+            self.drain()
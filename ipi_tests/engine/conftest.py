@@ -0,0 +1,54 @@
+#!/usr/bin/env python2
+# pylint: disable=C0111,W0621,R0914,C0301
+#+easier to find important problems
+
+"""Fixtures shared by the tests of the engine.
+
+The fixtures return factories, so that each test can choose the size of the
+system it works on. The random number generator of numpy is seeded each time
+a system is created, so that two systems made with the same arguments are
+identical.
+"""
+
+import pytest
+
+import numpy as np
+
+from ipi.engine.beads import Beads
+from ipi.engine.ensembles import Ensemble
+from ipi.engine.motion import Motion
+from ipi.engine.normalmodes import NormalModes
+
+
+@pytest.fixture
+def make_beads():
+    """Returns a function make_beads(nbeads=4, natoms=3, mass=1.0) that
+    creates beads with random positions and momenta, and random masses
+    between mass and 10 * mass."""
+
+    def make(nbeads=4, natoms=3, mass=1.0):
+        np.random.seed(12345)
+        beads = Beads(natoms, nbeads)
+        beads.m = np.random.uniform(1.0, 10.0, natoms) * mass
+        beads.q = np.random.standard_normal((nbeads, 3 * natoms))
+        beads.p = np.random.standard_normal((nbeads, 3 * natoms))
+        return beads
+
+    return make
+
+
+@pytest.fixture
+def make_nm(make_beads):
+    """Returns a function make_nm(nbeads=4, natoms=3, mass=1.0, dt=1.0,
+    **kwargs) that creates beads as make_beads, and binds them to normal
+    modes created with kwargs. Returns the normal modes and the beads."""
+
+    def make(nbeads=4, natoms=3, mass=1.0, dt=1.0, **kwargs):
+        beads = make_beads(nbeads, natoms, mass)
+        nm = NormalModes(**kwargs)
+        motion = Motion()
+        motion.dt = dt
+        nm.bind(Ensemble(temp=1e-3), motion, beads)
+        return nm, beads
+
+    return make
@@ -0,0 +1,121 @@
+#!/usr/bin/env python2
+# pylint: disable=C0111,W0621,R0914,C0301
+#+easier to find important problems
+
+import os
+
+import pytest
+import numpy as np
+import numpy.testing as npt
+
+from ipi.utils.depend import dstrip
+from ipi.engine.simulation import Simulation
+
+
+init_xyz = """6
+# CELL(abcABC): 30 30 30 90 90 90 positions{angstrom}
+Ar -0.143845 -0.120759 0.120298
+Ar 0.187305 -0.074630 3.876929
+Ar 0.150556 3.957843 -0.165982
+Ar -0.184378 3.667932 3.951257
+Ar 3.639339 -0.031557 0.183156
+Ar 3.813266 0.076751 3.726206
+"""
+
+input_xml = """<simulation verbosity='quiet'>
+  <output prefix='%(prefix)s'/>
+  <total_steps>10</total_steps>
+  <prng><seed>3848</seed></prng>
+  <fflj name='lj' pbc='False'><parameters>{eps: 0.000380, sigma: 6.4}</parameters></fflj>
+  <system>
+    <initialize nbeads='4'>
+      <file mode='xyz'> %(xyz)s </file>
+      <velocities mode='thermal' units='kelvin'> 80 </velocities>
+    </initialize>
+    <forces><force forcefield='lj'/></forces>
+    <ensemble><temperature units='kelvin'>40</temperature></ensemble>
+    <motion mode='dynamics'>
+      <dynamics mode='%(mode)s' fused='%(fused)s'>
+        %(thermostat)s
+        %(constraints)s
+        <timestep units='femtosecond'>2.0</timestep>
+      </dynamics>
+      <fixcom>True</fixcom>
+      <fixatoms>%(fixatoms)s</fixatoms>
+    </motion>
+  </system>
+</simulation>
+"""
+
+
+def run_steps(tmpdir, fused, mode, fixatoms, nsteps=10, constraints=""):
+    xyz = str(tmpdir.join("init.xyz"))
+    with open(xyz, "w") as f:
+        f.write(init_xyz)
+    fn = str(tmpdir.join("input_%s.xml" % fused))
+    thermostat = "<thermostat mode='pile_l'><tau units='femtosecond'>25</tau></thermostat>" if mode == "nvt" else ""
+    with open(fn, "w") as f:
+        f.write(input_xml % {"prefix": os.path.join(str(tmpdir), "sim"), "xyz": xyz, "mode": mode,
+                             "fused": fused, "thermostat": thermostat, "fixatoms": fixatoms,
+                             "constraints": constraints})
+    sim = Simulation.load_from_xml(fn)
+    for ff in sim.fflist.values():
+        ff.run()
+    try:
+        s = sim.syslist[0]
+        for i in range(nsteps):
+            s.motion.step(i)
+        return dstrip(s.beads.q).copy(), dstrip(s.beads.p).copy(), s.ensemble.econs
+    finally:
+        for ff in sim.fflist.values():
+            ff.stop()
+
+
+@pytest.mark.parametrize("mode", ["nve", "nvt"])
+@pytest.mark.parametrize("fixatoms", ["[]", "[1, 4]"])
+def test_fused_matches_standard(tmpdir, mode, fixatoms):
+    q, p, econs = run_steps(tmpdir, False, mode, fixatoms)
+    fq, fp, fecons = run_steps(tmpdir, True, mode, fixatoms)
+    npt.assert_allclose(fq, q, rtol=1e-10, atol=1e-12)
+    npt.assert_allclose(fp, p, rtol=1e-10, atol=1e-14)
+    npt.assert_allclose(fecons, econs, rtol=1e-10)
+
+
+def test_fused_unsupported(tmpdir):
+    with pytest.raises(ValueError):
+        run_steps(tmpdir, True, "npt", "[]", nsteps=0)
+
+
+constraints_xml = """<constraints>
+  <bonds>[0, 1, 0, 2, 3, 4]</bonds>
+  <lengths>[7.2, 7.6, 7.0]</lengths>
+  <angles>[1, 0, 2]</angles>
+  <values>[1.6]</values>
+</constraints>"""
+
+
+@pytest.mark.parametrize("mode", ["nve", "nvt"])
+@pytest.mark.parametrize("fixatoms", ["[]", "[1, 5]"])
+def test_constrained_dynamics(tmpdir, mode, fixatoms):
+    q0, p0, econs0 = run_steps(tmpdir, False, mode, fixatoms, nsteps=0, constraints=constraints_xml)
+    q, p, econs = run_steps(tmpdir, False, mode, fixatoms, constraints=constraints_xml)
+    d13 = np.sqrt(7.2**2 + 7.6**2 - 2 * 7.2 * 7.6 * np.cos(1.6))
+    for x in (q0, q):
+        x = x.reshape((len(x), -1, 3))
+        npt.assert_allclose(np.linalg.norm(x[:, 0] - x[:, 1], axis=1), 7.2, rtol=1e-8)
+        npt.assert_allclose(np.linalg.norm(x[:, 0] - x[:, 2], axis=1), 7.6, rtol=1e-8)
+        npt.assert_allclose(np.linalg.norm(x[:, 3] - x[:, 4], axis=1), 7.0, rtol=1e-8)
+        npt.assert_allclose(np.linalg.norm(x[:, 1] - x[:, 2], axis=1), d13, rtol=1e-8)
+    if fixatoms == "[]":
+        # the constraint forces do no work, and the momenta removed after the
+        # thermostat are accounted for in the conserved quantity
+        npt.assert_allclose(econs, econs0, rtol=1e-4)
+    else:
+        # fixed atoms behave as if they had an infinite mass
+        npt.assert_array_equal(q[:, 3:6], q0[:, 3:6])
+        npt.assert_array_equal(q[:, 15:18], q0[:, 15:18])
+
+
+def test_constraints_unsupported(tmpdir):
+    with pytest.raises(ValueError):
+        run_steps(tmpdir, False, "npt", "[]", nsteps=0, constraints=constraints_xml)
@@ -0,0 +1,45 @@
+#!/usr/bin/env python2
+# pylint: disable=C0111,W0621,R0914,C0301
+#+easier to find important problems
+
+import numpy as np
+import numpy.testing as npt
+
+
+def test_kinetic_matches_replicas(make_beads):
+    beads = make_beads()
+    kins = np.array([beads[b].kin for b in range(beads.nbeads)])
+    kstress = sum(beads[b].kstress for b in range(beads.nbeads))
+    npt.assert_allclose(beads.kins, kins, rtol=1e-13)
+    npt.assert_allclose(beads.kin, kins.sum(), rtol=1e-13)
+    npt.assert_allclose(beads.kstress, kstress, rtol=1e-13, atol=1e-15)
+
+
+def test_kinetic_follows_replica(make_beads):
+    beads = make_beads()
+    beads.kins, beads.kstress
+    beads[1].p = beads[1].p * 2.0
+    npt.assert_allclose(beads.kins[1], beads[1].kin, rtol=1e-13)
+    npt.assert_allclose(beads.kstress, sum(beads[b].kstress for b in range(beads.nbeads)), rtol=1e-13, atol=1e-15)
+
+
+def test_spring_terms(make_beads):
+    beads = make_beads(nbeads=5)
+    q = beads.q.copy()
+    m3 = beads.m3.copy()
+    vpath = 0.0
+    fpath = np.zeros(q.shape)
+    for b in range(beads.nbeads):
+        dq = q[b] - q[b - 1]
+        vpath += 0.5 * np.dot(dq, m3[b] * dq)
+        fpath[b] -= m3[b] * dq
+        fpath[b - 1] += m3[b] * dq
+    npt.assert_allclose(beads.vpath, vpath, rtol=1e-13)
+    npt.assert_allclose(beads.fpath, fpath, rtol=1e-13, atol=1e-13)
+    # the spring force is minus the gradient of the spring energy
+    dx = 1e-6
+    beads.q[2, 4] += dx
+    vplus = beads.vpath
+    beads.q[2, 4] -= 2 * dx
+    vminus = beads.vpath
+    npt.assert_allclose(-(vplus - vminus) / (2 * dx), fpath[2, 4], rtol=1e-6)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python2
+# pylint: disable=C0111,W0621,R0914,C0301
+#+easier to find important problems
+
+import pytest
+
+import numpy as np
+import numpy.testing as npt
+
+from ipi.utils.depend import dstrip
+from ipi.engine.beads import Beads
+from ipi.engine.constraints import Constraints
+
+
+# two bent triatomics, a chain of four atoms and an atom with no constraints
+bonds = [[0, 1], [0, 2], [3, 4], [3, 5], [6, 7], [7, 8], [8, 9]]
+angles = [[1, 0, 2], [4, 3, 5]]
+
+
+@pytest.fixture
+def make_constraints(make_beads):
+    """Constraints on heavy atoms, in replicas spread around a random
+    geometry rather than around the origin."""
+
+    def make(nbeads=3, fixatoms=None, **kwargs):
+        beads = make_beads(nbeads, 11, mass=1800.0)
+        q = np.random.uniform(0.0, 8.0, beads.natoms * 3)
+        beads.q = q + np.random.standard_normal(beads.q.shape) * 0.1
+        beads.p = dstrip(beads.p) * 10.0
+        constraints = Constraints(bonds=bonds, angles=angles, **kwargs)
+        constraints.bind(beads, fixatoms)
+        return constraints, beads
+
+    return make
+
+
+def distances(q, pairs):
+    q = q.reshape((len(q), -1, 3))
+    return np.sqrt(((q[:, pairs[:, 0]] - q[:, pairs[:, 1]])**2).sum(axis=2))
+
+
+def test_bind_from_geometry():
+    np.random.seed(12345)
+    beads = Beads(11, 1)
+    beads.m = np.ones(11)
+    beads.q = np.random.uniform(0.0, 8.0, (1, 33))
+    q0 = dstrip(beads.q).copy()
+    constraints = Constraints(bonds=bonds, angles=angles)
+    constraints.bind(beads)
+    # the constraints are taken from the initial positions, so nothing moves
+    npt.assert_array_equal(beads.q, q0)
+    npt.assert_allclose(constraints.lengths, distances(q0, np.asarray(bonds))[0], rtol=1e-12)
+    assert constraints.nconstraints == 9
+
+
+def test_shake(make_constraints):
+    reference, beads = make_constraints()
+    lengths = reference.lengths * np.linspace(0.95, 1.05, len(bonds))
+    values = reference.values + 0.05
+    constraints, beads = make_constraints(lengths=lengths, values=values)
+    pairs = constraints._pairs
+    target = np.sqrt(constraints._d2)
+    npt.assert_allclose(distances(dstrip(beads.q), pairs), np.tile(target, (beads.nbeads, 1)), rtol=1e-8)
+    d01, d02 = lengths[0:2]
+    npt.assert_allclose(target[-2], np.sqrt(d01**2 + d02**2 - 2 * d01 * d02 * np.cos(values[0])), rtol=1e-12)
+
+    q0 = dstrip(beads.q).copy()
+    q = q0 + np.random.standard_normal(q0.shape) * 0.05
+    qc = constraints.qconstrain(q0, q)
+    npt.assert_allclose(distances(qc, pairs), np.tile(target, (beads.nbeads, 1)), rtol=1e-8)
+    # unconstrained atoms are not moved, and the constraint forces are internal
+    npt.assert_array_equal(qc[:, 30:], q[:, 30:])
+    m3 = dstrip(beads.m3)
+    npt.assert_allclose(((qc - q) * m3).reshape((beads.nbeads, -1, 3)).sum(axis=1), 0.0, atol=1e-8)
+
+
+def test_rattle(make_constraints):
+    constraints, beads = make_constraints()
+    q = dstrip(beads.q)
+    p = dstrip(beads.p)
+    m3 = dstrip(beads.m3)
+    pc, dke = constraints.pconstrain(q, p)
+
+    r = constraints._vectors(q)
+    dv = constraints._vectors(pc / m3)
+    npt.assert_allclose((r * dv).sum(axis=2), 0.0, atol=1e-12)
+    npt.assert_allclose(dke, 0.5 * ((p * p - pc * pc) / m3).sum(), rtol=1e-12)
+    assert dke > 0.0
+    # the projection leaves the constrained momenta unchanged
+    pcc, dke = constraints.pconstrain(q, pc)
+    npt.assert_allclose(pcc, pc, rtol=1e-12, atol=1e-12)
+    npt.assert_allclose(dke, 0.0, atol=1e-14)
+
+
+def test_pthermal(make_constraints):
+    constraints, beads = make_constraints()
+    m3 = dstrip(beads.m3)
+    pc = constraints.pconstrain(dstrip(beads.q), dstrip(beads.p))[0]
+    dp = constraints.pthermal(2.5e-3)
+    kin = 0.5 * ((pc * pc) / m3).sum()
+    npt.assert_allclose(0.5 * (((pc + dp)**2) / m3).sum() - kin,
+                        0.5 * 2.5e-3 * constraints.nconstraints * beads.nbeads, rtol=1e-10)
+
+
+def test_fixed_atoms(make_constraints):
+    constraints, beads = make_constraints(fixatoms=[0, 8])
+    q0 = dstrip(beads.q).copy()
+    q = q0 + np.random.standard_normal(q0.shape) * 0.05
+    q[:, 0:3] = q0[:, 0:3]
+    q[:, 24:27] = q0[:, 24:27]
+    qc = constraints.qconstrain(q0, q)
+    npt.assert_array_equal(qc[:, 0:3], q0[:, 0:3])
+    npt.assert_array_equal(qc[:, 24:27], q0[:, 24:27])
+    npt.assert_allclose(distances(qc, constraints._pairs), distances(q0, constraints._pairs), rtol=1e-8)
+
+
+@pytest.mark.parametrize("kwargs", [{"bonds": [[0, 1]], "angles": [[1, 0, 2]]},
+                                    {"bonds": [[0, 1], [1, 0]]},
+                                    {"bonds": [[0, 11]]},
+                                    {"bonds": [[0, 1]], "lengths": [1.0, 2.0]}])
+def test_invalid(kwargs):
+    beads = Beads(11, 1)
+    beads.m = np.ones(11)
+    beads.q = np.random.uniform(0.0, 8.0, (1, 33))
+    with pytest.raises(ValueError):
+        Constraints(**kwargs).bind(beads)
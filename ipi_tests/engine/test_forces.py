@@ -0,0 +1,65 @@
+#!/usr/bin/env python2
+# pylint: disable=C0111,W0621,R0914,C0301
+#+easier to find important problems
+
+import pytest
+
+import numpy as np
+import numpy.testing as npt
+
+from ipi.utils.depend import dstrip
+from ipi.engine.cell import Cell
+from ipi.engine.forcefields import ForceField
+from ipi.engine.forces import Forces, ForceComponent, ForceBatch
+
+
+class FFHarmonic(ForceField):
+    """A harmonic forcefield that evaluates each request as soon as it is
+    queued, and records how many requests were pending at that time."""
+
+    def __init__(self):
+        super(FFHarmonic, self).__init__(latency=1e-4, name="harmonic", dopbc=False)
+        self.pending = []
+
+    def queue(self, atoms, cell, reqid=-1):
+        request = super(FFHarmonic, self).queue(atoms, cell, reqid)
+        self.pending.append(len(self.requests))
+        q = request["pos"]
+        request["result"] = [0.5 * np.dot(q, q), -q, np.zeros((3, 3)), ""]
+        request["status"] = "Done"
+        return request
+
+
+@pytest.fixture
+def make_forces(make_beads):
+
+    def make(nbeads=4, natoms=3):
+        ff = FFHarmonic()
+        forces = Forces()
+        forces.bind(make_beads(nbeads, natoms), Cell(np.identity(3) * 10.0), [ForceComponent("harmonic", mts_weights=[1.0])], {"harmonic": ff})
+        return forces, ff
+
+    return make
+
+
+@pytest.mark.parametrize("maxbatch", [1, 2, 5])
+def test_force_batch(make_forces, maxbatch):
+    forces, ff = make_forces()
+    q = dstrip(forces.beads.q).copy()
+    keys = range(5)
+    batch = ForceBatch(forces, maxbatch=maxbatch)
+
+    done = []
+    for key, dforces in batch.run(keys, lambda k: q * (k + 1)):
+        done.append(key)
+        npt.assert_allclose(dforces.f, -q * (key + 1), rtol=1e-12)
+        npt.assert_allclose(dforces.pot, 0.5 * (key + 1)**2 * (q * q).sum(), rtol=1e-12)
+    assert done == keys
+
+    # the requests for a whole batch are queued before any of them is collected
+    nbatch = min(maxbatch, len(keys))
+    assert max(ff.pending) == nbatch * forces.nbeads
+    assert len(batch._replicas) == nbatch
+    assert len(ff.requests) == 0
+    # the true beads are left untouched
+    npt.assert_array_equal(forces.beads.q, q)
@@ -86,3 +86,22 @@ def test_init_file(create_xyz_sample_file):
         npt.assert_array_almost_equal(expected_ratoms[_ii].m, atoms.m, 5)
 
     npt.assert_array_almost_equal(expected_cell.h, ret[1].h, 5)
+
+
+def test_init_vector_npy(tmpdir):
+    q = np.random.uniform(size=(4, 9))
+    fnpy = str(tmpdir.join("q.npy"))
+    np.save(fnpy, q)
+    fnpz = str(tmpdir.join("q.npz"))
+    np.savez(fnpz, pos=q, other=q[0])
+
+    for value in [fnpy, fnpz + ":pos"]:
+        iif = initializer.InitIndexed(value=value, mode="npy")
+        rq = initializer.init_vector(iif, 4, dimension="length", units="angstrom")
+        npt.assert_array_almost_equal(rq, q * 1.8897261)
+
+    # a single bead, given as a flat vector
+    np.save(fnpy, q[1])
+    iif = initializer.InitIndexed(value=fnpy, mode="npy", bead=1)
+    rq = initializer.init_vector(iif, 4)
+    npt.assert_array_equal(rq, q[1:2])
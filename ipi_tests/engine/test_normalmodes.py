@@ -0,0 +1,126 @@
+#!/usr/bin/env python2
+# pylint: disable=C0111,W0621,R0914,C0301
+#+easier to find important problems
+
+import pytest
+
+import numpy as np
+import numpy.testing as npt
+
+from ipi.engine.beads import Beads
+from ipi.engine.ensembles import Ensemble
+from ipi.engine.motion import Motion
+from ipi.engine.normalmodes import NormalModes
+from ipi.inputs.normalmodes import InputNormalModes
+from ipi.utils.depend import dstrip
+
+
+@pytest.mark.parametrize("nbeads", [1, 2, 5, 8])
+@pytest.mark.parametrize("open_paths", [None, [1]])
+@pytest.mark.parametrize("transform", ["fft", "matrix"])
+def test_vpath(make_nm, nbeads, open_paths, transform):
+    nm, beads = make_nm(nbeads, 4, open_paths=open_paths, transform_method=transform)
+    npt.assert_allclose(nm.vpath, beads.vpath, rtol=1e-12, atol=1e-14)
+    nm.qnm = nm.qnm * 1.5
+    npt.assert_allclose(nm.vpath, beads.vpath, rtol=1e-12, atol=1e-14)
+
+
+def test_view_before_bind():
+    # a slice taken before the beads are bound must not be reused afterwards
+    # with the dependencies it had at the time
+    beads = Beads(1, 2)
+    beads.m = np.ones(1)
+    beads.q = np.zeros((2, 3))
+    beads.q[0]
+    nm = NormalModes(transform_method="matrix")
+    motion = Motion()
+    motion.dt = 1.0
+    nm.bind(Ensemble(temp=1e-3), motion, beads)
+
+    for x in [1.0, 2.0]:
+        beads.q[0][:] = x
+        npt.assert_allclose(nm.qnm, np.sqrt(0.5) * x * np.ones((2, 3)), rtol=1e-12)
+        npt.assert_allclose(beads.q[0], x * np.ones(3), rtol=1e-12)
+
+
+@pytest.mark.parametrize("transform", ["fft", "matrix"])
+def test_roundtrip(make_nm, transform):
+    # the transforms write into the arrays they update
+    nm, beads = make_nm(5, 4, open_paths=[1], transform_method=transform)
+    q = dstrip(beads.q).copy()
+    qnm = dstrip(nm.qnm).copy()
+    nm.qnm = qnm * 2.0
+    npt.assert_allclose(beads.q, q * 2.0, rtol=1e-12)
+    beads.q = q
+    npt.assert_allclose(nm.qnm, qnm, rtol=1e-12)
+    pnm = dstrip(nm.pnm).copy()
+    nm.pnm = pnm * 3.0
+    npt.assert_allclose(nm.pnm, pnm * 3.0, rtol=1e-12)
+    beads.p = dstrip(beads.p) / 3.0
+    npt.assert_allclose(nm.pnm, pnm, rtol=1e-12)
+
+
+def old_free_qstep(nm):
+    """The free ring polymer propagator as it was first written, with one
+    matrix product per mode and a loop over the open path coordinates."""
+
+    sm = dstrip(nm.beads.sm3)
+    prop_pq = dstrip(nm.prop_pq)
+    o_prop_pq = dstrip(nm.o_prop_pq)
+    pnm = dstrip(nm.pnm) / sm
+    qnm = dstrip(nm.qnm) * sm
+
+    pq = np.zeros((2, nm.natoms * 3), float)
+    for k in range(1, nm.nbeads):
+        pq[0, :] = pnm[k]
+        pq[1, :] = qnm[k]
+        pq = np.dot(prop_pq[k], pq)
+        qnm[k] = pq[1, :]
+        pnm[k] = pq[0, :]
+
+    pq = np.zeros(2)
+    for j in nm.open_paths:
+        for a in xrange(3 * j, 3 * (j + 1)):
+            for k in xrange(1, nm.nbeads):
+                pq[0] = nm.pnm[k, a] / sm[k, a]
+                pq[1] = nm.qnm[k, a] * sm[k, a]
+                pq = np.dot(o_prop_pq[k], pq)
+                qnm[k, a] = pq[1]
+                pnm[k, a] = pq[0]
+    return pnm * sm, qnm / sm
+
+
+@pytest.mark.parametrize("nbeads", [1, 2, 5, 8])
+@pytest.mark.parametrize("open_paths", [None, [1], [0, 3]])
+def test_free_qstep(make_nm, nbeads, open_paths):
+    nm, beads = make_nm(nbeads, 4, open_paths=open_paths)
+    ref, rbeads = make_nm(nbeads, 4, open_paths=open_paths)
+
+    # the raw propagator leaves the normal modes alone
+    pnm = dstrip(nm.pnm).copy()
+    qnm = dstrip(nm.qnm).copy()
+    nm.free_propagate(pnm, qnm)
+    opnm, oqnm = old_free_qstep(ref)
+    npt.assert_allclose(pnm, opnm, rtol=1e-12, atol=1e-14)
+    npt.assert_allclose(qnm, oqnm, rtol=1e-12, atol=1e-14)
+    npt.assert_array_equal(nm.pnm, ref.pnm)
+
+    # free_qstep works in place, and the beads follow the normal modes
+    for i in range(2):
+        nm.free_qstep()
+        ref.pnm, ref.qnm = old_free_qstep(ref)
+        npt.assert_allclose(nm.pnm, ref.pnm, rtol=1e-12, atol=1e-14)
+        npt.assert_allclose(nm.qnm, ref.qnm, rtol=1e-12, atol=1e-14)
+        npt.assert_allclose(beads.p, rbeads.p, rtol=1e-12, atol=1e-14)
+        npt.assert_allclose(beads.q, rbeads.q, rtol=1e-12, atol=1e-14)
+
+
+def test_input_threads():
+    inm = InputNormalModes()
+    inm.store(NormalModes(n_threads=4))
+    assert inm.fetch().n_threads == 4
+    assert inm.fetch().copy().n_threads == 4
+
+    inm.n_threads.store(0)
+    with pytest.raises(ValueError):
+        inm.check()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python2
+# pylint: disable=C0111,W0621,R0914,C0301
+#+easier to find important problems
+
+import os
+
+import pytest
+import numpy as np
+import numpy.testing as npt
+
+import ipi.utils.io as io
+from ipi.engine.beads import Beads
+from ipi.engine.outputs import CheckpointOutput, PropertyOutput, TrajectoryOutput, _sync_due
+from ipi.utils.inputvalue import InputValue, InputArray
+from ipi.utils.io.io_properties import PropertyFile
+from ipi.utils.io.inputs.io_xml import xml_parse_string
+
+
+@pytest.mark.parametrize("durability", ["none", "flush", "fsync", "periodic"])
+def test_checkpoint_replace(tmpdir, durability):
+    chk = CheckpointOutput(durability=durability)
+    filename = str(tmpdir.join("restart"))
+
+    chk.write_file(filename, lambda f: f.write("first"), "w", backup=False, sync=True)
+    chk.write_file(filename, lambda f: f.write("second"), "w", backup=False, sync=True)
+    assert open(filename).read() == "second"
+    assert os.listdir(str(tmpdir)) == ["restart"]
+
+
+def test_checkpoint_backup(tmpdir):
+    chk = CheckpointOutput()
+    with tmpdir.as_cwd():
+        chk.write_file("restart", lambda f: f.write("first"), "w", backup=True, sync=False)
+        chk.write_file("restart", lambda f: f.write("second"), "w", backup=True, sync=False)
+        assert open("restart").read() == "second"
+        assert open("#restart#0#").read() == "first"
+
+
+class StubStatus(object):
+    """Stands for the input simulation, with a step and a large array."""
+
+    def __init__(self):
+        self.step = InputValue(dtype=int)
+        self.q = InputArray(dtype=float)
+
+    def write(self, name):
+        return self.q.write(name)
+
+
+class StubSimulation(object):
+
+    def __init__(self):
+        self.step = 0
+
+
+def read_q(filename):
+    parsed = InputArray(dtype=float)
+    parsed.parse(xml_parse_string(open(filename).read()).fields[0][1])
+    return parsed.fetch()
+
+
+def test_checkpoint_sidecar(tmpdir):
+    chk = CheckpointOutput(stride=1, format="npz")
+    chk.simul = StubSimulation()
+    chk.status = StubStatus()
+    with tmpdir.as_cwd():
+        chk.status.step.store(1)
+        chk.status.q.store(np.arange(40.0))
+        chk.write(store=False)
+        assert sorted(os.listdir(".")) == ["restart", "restart_1.npz"]
+        npt.assert_array_equal(read_q("restart"), np.arange(40.0))
+
+        # a crash before the xml is replaced leaves the previous checkpoint intact
+        def crash(filename, dump, mode, backup, sync):
+            if filename == "restart":
+                raise IOError("disk full")
+            CheckpointOutput.write_file(chk, filename, dump, mode, backup, sync)
+
+        chk.write_file = crash
+        chk.status.step.store(2)
+        chk.status.q.store(np.arange(40.0) * 2)
+        with pytest.raises(IOError):
+            chk.write(store=False)
+        npt.assert_array_equal(read_q("restart"), np.arange(40.0))
+
+        # the arrays of the previous checkpoint go once it has been replaced
+        del chk.write_file
+        chk.write(store=False)
+        assert sorted(os.listdir(".")) == ["restart", "restart_2.npz"]
+        npt.assert_array_equal(read_q("restart"), np.arange(40.0) * 2)
+
+
+class StubSystem(object):
+    """Stands for the system, of which writing a frame only needs the beads."""
+
+    def __init__(self, beads):
+        self.beads = beads
+
+
+def test_fixed_forces(tmpdir):
+    # the fixed format has no precision suited to every quantity
+    with pytest.raises(ValueError):
+        TrajectoryOutput(what="forces", format="fixed")
+
+    np.random.seed(12345)
+    beads = Beads(4, 2)
+    beads.names = ["O", "H", "H", "Na"]
+    forces = np.random.standard_normal((2, 12)) * 1e-3
+    traj = TrajectoryOutput(what="forces", format="fixed", precision=1e-8)
+    traj.system = StubSystem(beads)
+
+    filename = str(tmpdir.join("forces.fixed"))
+    with open(filename, "wb") as f:
+        for b in range(2):
+            traj.write_traj(forces, "forces", f, b, format="fixed", dimension="force", flush=False,
+                            step=0, names=beads.names, h=np.identity(3))
+
+    frames = list(io.iter_file_name_raw(filename))
+    assert len(frames) == 2
+    for b, frame in enumerate(frames):
+        assert (np.abs(frame["data"] - forces[b]) <= 0.5e-8 * (1 + 1e-9)).all()
+        assert list(frame["names"]) == ["O", "H", "H", "Na"]
+
+
+class StubProperties(object):
+
+    property_dict = {"step": {"dimension": "number", "help": "The step."},
+                     "kinetic_tens": {"dimension": "energy", "size": 6, "help": "The kinetic tensor."}}
+
+
+class StubPropertySystem(object):
+    """Stands for the system, at a given step of the simulation."""
+
+    def __init__(self, step):
+        self.simul = StubSimulation()
+        self.simul.step = step
+        self.properties = StubProperties()
+
+
+def write_properties(filename, step, outlist, values):
+    out = PropertyOutput(filename=filename, outlist=outlist, format="binary", durability="none")
+    out.system = StubPropertySystem(step)
+    out.open_stream()
+    try:
+        out.write_values(values)
+    finally:
+        out.close_stream()
+
+
+def test_binary_properties_restart(tmpdir):
+    outlist = ["step", "kinetic_tens"]
+    values = [1.0, np.arange(6.0)]
+
+    # a restart that creates the file, or appends to an empty one, writes the header
+    filename = str(tmpdir.join("out"))
+    write_properties(filename, 10, outlist, values)
+    open(str(tmpdir.join("empty")), "wb").close()
+    write_properties(str(tmpdir.join("empty")), 10, outlist, values)
+    for name in ["out", "empty"]:
+        pf = PropertyFile(str(tmpdir.join(name)))
+        assert len(pf) == 1
+        npt.assert_array_equal(pf["kinetic_tens"], [np.arange(6.0)])
+
+    # appending keeps the header, if the columns match
+    write_properties(filename, 20, outlist, [2.0, np.arange(6.0)])
+    npt.assert_array_equal(PropertyFile(filename)["step"], [1.0, 2.0])
+
+    with pytest.raises(ValueError):
+        write_properties(filename, 30, ["step"], [3.0])
+    with pytest.raises(ValueError):
+        write_properties(filename, 30, outlist, [3.0, np.arange(3.0)])
+    assert len(PropertyFile(filename)) == 2
+
+    textfile = str(tmpdir.join("text"))
+    with open(textfile, "w") as f:
+        f.write("# column   1     --> step : The step.\n  1.0\n")
+    with pytest.raises(ValueError):
+        write_properties(textfile, 10, ["step"], [2.0])
+
+
+def test_sync_due():
+    out = PropertyOutput(flush=3)
+    assert [_sync_due(out) for i in range(6)] == [False, False, True] * 2
+
+    out = PropertyOutput(flush=3, durability="none")
+    assert not any(_sync_due(out) for i in range(6))
+
+    out = PropertyOutput(durability="periodic", sync_interval=3600.0)
+    assert _sync_due(out)
+    assert not _sync_due(out)
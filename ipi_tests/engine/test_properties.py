@@ -113,3 +113,57 @@ def test_Trajectories_print_traj(prepare_Trajectories_print_traj, mocker):
     npt.assert_almost_equal(atoms.q, expected_position[bead], 5)
     npt.assert_equal(atoms.names, expected_names[:system.beads.natoms])
     npt.assert_almost_equal(cell.h, expected_cell * unit_conv)
+
+
+def test_StepCache():
+    cache = ipi.engine.properties.StepCache()
+    func = mock.Mock(side_effect=lambda *args, **kwargs: np.ones(3) * len(args))
+
+    name, unit, args, kwargs, key = cache.parse("isotope_zetatd(1.5;atom=H){energy}")
+    assert (name, unit, args, kwargs) == ("isotope_zetatd", "energy", ("1.5",), {"atom": "H"})
+    # units do not change the key under which the value is stored
+    assert cache.parse("isotope_zetatd(1.5;atom=H)")[4] == key
+    assert cache.parse("isotope_zetatd(2.0;atom=H)")[4] != key
+
+    first = cache.get(3, key, func, args, kwargs)
+    assert cache.get(3, key, func, args, kwargs) is first
+    assert func.call_count == 1
+    cache.get(3, cache.parse("isotope_zetatd(2.0;atom=H)")[4], func, ("2.0",), kwargs)
+    assert func.call_count == 2
+    # a new step discards all the values
+    assert not cache.get(4, key, func, args, kwargs) is first
+    assert func.call_count == 3
+
+
+def test_AtomSelection():
+    from ipi.engine.beads import Beads
+    beads = Beads(4, 2)
+    beads.names = np.array(["O", "H", "H", "O"])
+    selection = ipi.engine.properties.AtomSelection()
+    selection.bind(beads)
+
+    npt.assert_array_equal(selection.mask(""), [True, True, True, True])
+    npt.assert_array_equal(selection.mask("2"), [False, False, True, False])
+    npt.assert_array_equal(selection.mask("H"), [False, True, True, False])
+    npt.assert_array_equal(selection.mask("C"), [False, False, False, False])
+    with pytest.raises(IndexError):
+        selection.mask("4")
+    # the selections are kept until the atom names change
+    mask = selection.mask("H")
+    assert selection.mask("H") is mask
+    beads.names[0] = "H"
+    npt.assert_array_equal(selection.mask("H"), [True, True, True, False])
+
+
+def test_scaled_path():
+    np.random.seed(12345)
+    q = np.random.standard_normal((4, 9))
+    qc = q.mean(axis=0)
+    dq = ipi.engine.properties._scaled_path(q, qc, 1, 0.5)
+
+    # only atom 1 is moved, half way to its centroid
+    npt.assert_array_equal(dq[:, :3], q[:, :3])
+    npt.assert_array_equal(dq[:, 6:], q[:, 6:])
+    npt.assert_allclose(dq[:, 3:6], 0.5 * (q[:, 3:6] + qc[3:6]), rtol=1e-12)
+    assert not np.may_share_memory(dq, q)
+    npt.assert_allclose(dq.mean(axis=0), qc, rtol=1e-12)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python2
+import numpy as np
+import numpy.testing as npt
+
+from ipi.utils.depend import *
+from ipi.utils.prng import Random
+from ipi.engine.snapshot import StateSnapshot
+
+
+class Holder(dobject):
+
+    def __init__(self):
+        dself = dd(self)
+        dself.x = depend_array(name="x", value=np.zeros(4))
+        dself.x2 = depend_array(name="x2", value=np.zeros(4), func=self.get_x2, dependencies=[dself.x])
+        dself.e = depend_value(name="e", value=0.0)
+        self.counter = 0
+        self.history = np.zeros(3)
+        self.prng = Random(seed=1234)
+
+    def get_x2(self):
+        return dstrip(self.x)**2
+
+
+class Skipped(dobject):
+
+    def __init__(self):
+        self.counter = 0
+
+
+def test_restore():
+    h = Holder()
+    other = Skipped()
+    snap = StateSnapshot([h, [other]], skip=(Skipped,))
+    assert not snap.restore()
+
+    h.x[:] = 1.0
+    h.e = 2.0
+    snap.take()
+    g = h.prng.gvec(3)
+
+    h.x[:] = 3.0
+    h.e = 5.0
+    h.counter += 1
+    h.history[1] = 7.0
+    other.counter += 1
+    npt.assert_array_equal(h.x2, 9.0)
+
+    assert snap.restore()
+    npt.assert_array_equal(h.x, 1.0)
+    npt.assert_array_equal(h.x2, 1.0)
+    assert h.e == 2.0
+    assert h.counter == 0
+    npt.assert_array_equal(h.history, 0.0)
+    npt.assert_array_equal(h.prng.gvec(3), g)
+    assert other.counter == 1
+
+
+def test_double_buffer():
+    h = Holder()
+    snap = StateSnapshot([h])
+    for i in range(4):
+        h.x[:] = i
+        snap.take()
+    h.x[:] = 10.0
+    snap.restore()
+    npt.assert_array_equal(h.x, 3.0)
+
+
+class Synced(dobject):
+
+    def __init__(self):
+        dself = dd(self)
+        sync = synchronizer()
+        dself.a = depend_array(name="a", value=np.zeros(3), synchro=sync, func={"b": (lambda: dstrip(self.b) / 2.0)})
+        dself.b = depend_array(name="b", value=np.zeros(3), synchro=sync, func={"a": (lambda: dstrip(self.a) * 2.0)})
+
+
+def test_copies():
+    h = Holder()
+    s = Synced()
+    other = Skipped()
+    snap = StateSnapshot([h, [s, other]], skip=(Skipped,))
+    assert snap.copies() is None
+
+    h.x[:] = 1.0
+    h.e = 2.0
+    s.b = np.ones(3)
+    snap.take()
+    g = h.prng.gvec(3)
+
+    h.x[:] = 3.0
+    h.e = 5.0
+    h.counter += 1
+    s.a = np.ones(3) * 4.0
+    hc, (sc, oc) = snap.copies()
+
+    # the copies hold the snapshot...
+    assert type(hc) is Holder and type(sc) is Synced
+    npt.assert_array_equal(hc.x, 1.0)
+    npt.assert_array_equal(hc.x2, 1.0)
+    assert hc.e == 2.0
+    assert hc.counter == 0
+    npt.assert_array_equal(hc.prng.gvec(3), g)
+    npt.assert_array_equal(sc.a, 0.5)
+    npt.assert_array_equal(sc.b, 1.0)
+    assert oc is other
+
+    # ...and the objects are left untouched
+    npt.assert_array_equal(h.x, 3.0)
+    assert h.e == 5.0
+    assert h.counter == 1
+    npt.assert_array_equal(s.b, 8.0)
+    hc.x[:] = 7.0
+    npt.assert_array_equal(h.x2, 9.0)
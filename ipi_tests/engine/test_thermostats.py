@@ -0,0 +1,123 @@
+#!/usr/bin/env python2
+# pylint: disable=C0111,W0621,R0914,C0301
+#+easier to find important problems
+
+import pytest
+
+import numpy as np
+import numpy.testing as npt
+
+from ipi.utils.depend import dstrip
+from ipi.utils.prng import Random
+from ipi.utils.units import Constants
+from ipi.utils.mathtools import matrix_exp, root_herm
+from ipi.engine.thermostats import ThermoPILE_L, ThermoPILE_G, ThermoNMGLE, ThermoNMGLEG, ThermoCL
+
+
+@pytest.fixture
+def make_thermo_nm(make_nm):
+    """Normal modes of heavy atoms, with the time step of the thermostats."""
+
+    return lambda nbeads, natoms: make_nm(nbeads, natoms, mass=1800.0, dt=40.0)[0]
+
+
+@pytest.fixture
+def make_pile(make_thermo_nm):
+
+    def make(cls, nbeads=6, natoms=4, ethermo=0.0):
+        nm = make_thermo_nm(nbeads, natoms)
+        thermo = cls(temp=1e-3 * nbeads, dt=40.0, tau=500.0, ethermo=ethermo)
+        thermo.bind(nm=nm, prng=Random(seed=4321))
+        return thermo, nm
+
+    return make
+
+
+def test_pile_l_modes(make_pile):
+    thermo, nm = make_pile(ThermoPILE_L)
+    pnm = dstrip(nm.pnm).copy()
+    sm = np.sqrt(dstrip(nm.dynm3))
+    temp = thermo.temp
+    prng = Random(seed=4321)
+
+    thermo.step()
+
+    # one Langevin thermostat per mode, with the random numbers drawn mode by mode
+    taus = [thermo.tau] + [1.0 / (2 * nm.dynomegak[k]) for k in range(1, nm.nbeads)]
+    for k in range(nm.nbeads):
+        T = np.exp(-0.5 * thermo.dt / taus[k])
+        S = np.sqrt(Constants.kb * temp * (1 - T**2))
+        pnm[k] = (pnm[k] / sm[k] * T + S * prng.gvec(pnm.shape[1])) * sm[k]
+    npt.assert_allclose(nm.pnm, pnm, rtol=1e-12)
+
+
+@pytest.mark.parametrize("cls", [ThermoPILE_L, ThermoPILE_G])
+def test_pile_ethermo(make_pile, cls):
+    thermo, nm = make_pile(cls, ethermo=0.25)
+    npt.assert_allclose(thermo.ethermo, 0.25)
+    # the heat exchanged with the bath makes up for the change in kinetic energy
+    etot = thermo.ethermo + nm.kin
+    for i in range(3):
+        thermo.step()
+    npt.assert_allclose(thermo.ethermo + nm.kin, etot, rtol=1e-12)
+
+
+@pytest.fixture
+def make_nmgle(make_thermo_nm):
+
+    def make(cls, nbeads=6, natoms=4, ns=2, **kwargs):
+        nm = make_thermo_nm(nbeads, natoms)
+        rs = np.random.RandomState(321)
+        A = np.zeros((nbeads, ns + 1, ns + 1))
+        for b in range(nbeads):
+            a = rs.uniform(0.0, 1e-4, (ns + 1, ns + 1))
+            A[b] = a + a.T + np.identity(ns + 1) * 1e-3
+        thermo = cls(temp=1e-3 * nbeads, dt=40.0, A=A, **kwargs)
+        thermo.bind(nm=nm, prng=Random(seed=4321))
+        return thermo, nm
+
+    return make
+
+
+def test_nmgle_modes(make_nmgle):
+    thermo, nm = make_nmgle(ThermoNMGLE)
+    pnm = dstrip(nm.pnm).copy()
+    sm = np.sqrt(dstrip(nm.dynm3))
+    s = thermo.s.copy()
+    prng = Random(seed=4321)
+    prng.set_state(thermo.prng.get_state())
+
+    thermo.step()
+
+    # one GLE per mode, with the random numbers drawn mode by mode
+    for k in range(nm.nbeads):
+        T = matrix_exp(-0.5 * thermo.dt * thermo.A[k])
+        S = root_herm(Constants.kb * (thermo.C[k] - np.dot(T, np.dot(thermo.C[k], T.T))))
+        s[k, 0] = pnm[k] / sm[k]
+        s[k] = np.dot(T, s[k]) + np.dot(S, prng.gvec(s[k].shape))
+    npt.assert_allclose(thermo.s, s, rtol=1e-12)
+    npt.assert_allclose(nm.pnm, s[:, 0] * sm, rtol=1e-12)
+
+
+@pytest.mark.parametrize("cls,kwargs", [(ThermoNMGLE, {}), (ThermoNMGLEG, {"tau": 500.0})])
+def test_nmgle_ethermo(make_nmgle, cls, kwargs):
+    thermo, nm = make_nmgle(cls, ethermo=0.25, **kwargs)
+    npt.assert_allclose(thermo.ethermo, 0.25)
+    etot = thermo.ethermo + nm.kin
+    for i in range(3):
+        thermo.step()
+    npt.assert_allclose(thermo.ethermo + nm.kin, etot, rtol=1e-12)
+
+
+@pytest.mark.parametrize("tau", ["intau", "idtau"])
+def test_cl_apat(make_thermo_nm, tau):
+    nm = make_thermo_nm(1, 4)
+    # the system is far hotter than the target temperature
+    thermo = ThermoCL(temp=1e-6, dt=40.0, tau=500.0, apat=1000.0, **{tau: 800.0})
+    thermo.bind(beads=nm.beads, prng=Random(seed=4321))
+
+    # the time scale is adjusted every other step
+    thermo.step()
+    assert getattr(thermo, tau) == 800.0
+    thermo.step()
+    assert getattr(thermo, tau) != 800.0
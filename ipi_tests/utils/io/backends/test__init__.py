@@ -11,6 +11,9 @@ import ipi_tests.xyz_generator as xyz_gen
 
 import ipi.utils.io as io
 import ipi.utils.mathtools as mt
+from ipi.engine.beads import Beads
+from ipi.engine.cell import Cell
+from ipi.utils.io.backends.io_binary import BinaryTrajectory
 
 
 # default_cell_mat = mt.abc2h(-1.0, -1.0, -1.0, np.pi/2.0, np.pi/2.0, np.pi/2.0) # After changing the "input standard"
@@ -77,3 +80,41 @@ def test_read_file(prepare_read_file):
     npt.assert_almost_equal(expected_cell.flatten() * unit_conv_cell, returned_cell, 5)
     if output_type.strip() == 'objects':
         assert all([expected_names[_ii] == returned_names[_ii] for _ii in xrange(len(expected_names))])
+
+
+@pytest.mark.parametrize("nlines", [0, 1, 7])
+def test_format_block(nlines):
+    np.random.seed(12345)
+    q = np.random.standard_normal((nlines, 3)) * 10.0**np.random.randint(-12, 12, (nlines, 3))
+    q.flat[:3] = [np.nan, -np.inf, -0.0][:q.size]
+    names = np.array(["H", "Na", "Xyz12", "O", "C", "N", "Cl"][:nlines])
+    fmt = "ATOM  %5i %4s%1s%3s %1s%4i%1s   %8.3f%12.5e%8.3f%6.2f%6.2f          %2s%2i\n"
+
+    block = io.format_block(fmt, [np.arange(1, nlines + 1), names, ' ', '  1', ' ', 1, ' ',
+                                  q[:, 0], q[:, 1], q[:, 2], 0.0, 0.0, '  ', 0])
+    assert block == "".join(fmt % (i + 1, names[i], ' ', '  1', ' ', 1, ' ', q[i, 0], q[i, 1], q[i, 2], 0.0, 0.0, '  ', 0)
+                            for i in range(nlines))
+
+
+@pytest.mark.parametrize("mode", ["binary", "xyz"])
+def test_bundle(tmpdir, mode):
+    filename = str(tmpdir.join("traj." + mode))
+    np.random.seed(12345)
+    qs = np.random.standard_normal((3, 4, 6))
+    with open(filename, "wb") as f:
+        for q in qs:
+            beads = Beads(2, 4)
+            beads.names = ["O", "H"]
+            beads.q = q
+            io.print_file_path(mode, beads, Cell(np.identity(3) * 10.0), f, title="Step: 1 ")
+
+    assert io.count_beads([filename]) == 4
+    steps = list(io.iter_bundle_raw(mode, open(filename, "rb")))
+    assert [len(frames) for frames in steps] == [4, 4, 4]
+    npt.assert_allclose([[frame["data"] for frame in frames] for frames in steps], qs, rtol=1e-5)
+    assert list(steps[2][3]["names"]) == ["O", "H"]
+
+    if mode == "binary":
+        traj = BinaryTrajectory(filename)
+        assert traj.data.shape == (3, 4, 6)
+        npt.assert_array_equal(traj.data[:, 1], qs[:, 1])
@@ -0,0 +1,60 @@
+#!/usr/bin/env python2
+# pylint: disable=C0111,W0621,R0914,C0301
+#+easier to find important problems
+
+import pytest
+import numpy as np
+import numpy.testing as npt
+
+import ipi.utils.io as io
+from ipi.engine.atoms import Atoms
+from ipi.engine.cell import Cell
+from ipi.utils.io.backends.io_binary import BinaryTrajectory
+
+
+def write_frames(filename, nframes=5, natoms=4):
+    np.random.seed(12345)
+    frames = []
+    with open(filename, "wb") as f:
+        for i in range(nframes):
+            atoms = Atoms(natoms)
+            atoms.q = np.random.standard_normal(3 * natoms)
+            atoms.names = ["O", "H", "H", "Na"][:natoms]
+            cell = Cell(np.identity(3) * (10.0 + i))
+            io.print_file("binary", atoms, cell, f, title="Step: %10d " % i)
+            frames.append((atoms.q.copy(), cell.h.copy()))
+    return frames
+
+
+def test_read_binary(tmpdir):
+    filename = str(tmpdir.join("traj.bin"))
+    frames = write_frames(filename)
+
+    # multiple frames are read back in sequence, whatever mode is asked for
+    fdin = open(filename, "rb")
+    for q, h in frames:
+        frame = io.read_file_raw("xyz", fdin)
+        npt.assert_array_equal(frame["data"], q)
+        npt.assert_array_equal(frame["cell"], h)
+        assert list(frame["names"]) == ["O", "H", "H", "Na"]
+    with pytest.raises(EOFError):
+        io.read_file_raw("xyz", fdin)
+
+
+def test_binary_trajectory(tmpdir):
+    filename = str(tmpdir.join("traj.bin"))
+    frames = write_frames(filename)
+    # an incomplete frame, as left by a run that is still going
+    with open(filename, "ab") as f:
+        f.write(open(filename, "rb").read(40))
+
+    traj = BinaryTrajectory(filename)
+    assert len(traj) == len(frames)
+    npt.assert_array_equal(traj.data, [q for q, h in frames])
+    npt.assert_array_equal(traj.cell[1::2], [h for q, h in frames][1::2])
+    assert np.may_share_memory(traj.data, traj._map)
+
+    frame = traj[3]
+    npt.assert_array_equal(frame["data"], frames[3][0])
+    assert frame["comment"].startswith("Step:          3 ")
+    assert list(frame["names"]) == ["O", "H", "H", "Na"]
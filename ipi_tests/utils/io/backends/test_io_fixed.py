@@ -0,0 +1,103 @@
+#!/usr/bin/env python2
+# pylint: disable=C0111,W0621,R0914,C0301
+#+easier to find important problems
+
+import os
+import gzip
+
+import pytest
+import numpy as np
+import numpy.testing as npt
+
+import ipi.utils.io as io
+from ipi.engine.atoms import Atoms
+from ipi.engine.cell import Cell
+from ipi.inputs.outputs import InputTrajectory
+
+
+def make_frames(nframes=3, natoms=5):
+    np.random.seed(12345)
+    frames = []
+    for i in range(nframes):
+        atoms = Atoms(natoms)
+        atoms.q = np.random.standard_normal(3 * natoms) * 10.0
+        atoms.names = ["O", "H", "H", "Na", "Cl"][:natoms]
+        frames.append((atoms, Cell(np.identity(3) * (20.0 + i))))
+    return frames
+
+
+@pytest.mark.parametrize("precision", [1e-3, 1e-6, 0.5])
+def test_fixed_roundtrip(tmpdir, precision):
+    filename = str(tmpdir.join("traj.fixed"))
+    frames = make_frames()
+    with open(filename, "wb") as f:
+        for atoms, cell in frames:
+            io.print_file("fixed", atoms, cell, f, title="Step: 1 ", precision=precision)
+
+    read = list(io.iter_file_name_raw(filename))
+    assert len(read) == len(frames)
+    for (atoms, cell), frame in zip(frames, read):
+        assert (np.abs(frame["data"] - atoms.q) <= 0.5 * precision * (1 + 1e-9)).all()
+        npt.assert_array_equal(frame["cell"], cell.h)
+        assert list(frame["names"]) == list(atoms.names)
+        assert frame["comment"].startswith("Step: 1 ")
+
+
+@pytest.mark.parametrize("precision", [0.0, -1e-3])
+def test_fixed_input_precision(precision):
+    itraj = InputTrajectory()
+    itraj.parse(text="forces")
+    itraj.check()
+
+    # the precision has no default, and is only needed by the fixed format
+    itraj.format.store("fixed")
+    with pytest.raises(ValueError):
+        itraj.check()
+    itraj.precision.store(precision)
+    with pytest.raises(ValueError):
+        itraj.check()
+    itraj.precision.store(1e-6)
+    itraj.check()
+    assert itraj.fetch().precision == 1e-6
+
+    atoms, cell = make_frames(1)[0]
+    with pytest.raises(ValueError):
+        io.print_file("fixed", atoms, cell, open(os.devnull, "wb"))
+
+
+def test_fixed_nonfinite(tmpdir):
+    filename = str(tmpdir.join("traj.fixed"))
+    atoms, cell = make_frames(1)[0]
+    atoms.q[0] = np.nan
+    with open(filename, "wb") as f:
+        io.print_file("fixed", atoms, cell, f, precision=1e-3)
+
+    data = io.read_file_raw("fixed", open(filename, "rb"))["data"]
+    assert np.isnan(data[0])
+    npt.assert_array_equal(data[1:], atoms.q[1:])
+
+
+@pytest.mark.parametrize("mode", ["xyz", "fixed"])
+def test_read_compressed(tmpdir, mode):
+    # the files are read without being told they are compressed or fixed
+    filename = str(tmpdir.join("traj.xyz.gz"))
+    frames = make_frames()
+    f = gzip.open(filename, "wb")
+    for atoms, cell in frames:
+        if mode == "fixed":
+            io.print_file(mode, atoms, cell, f, precision=1e-3)
+        else:
+            io.print_file(mode, atoms, cell, f)
+    f.close()
+
+    read = list(io.iter_file_name_raw(filename))
+    assert len(read) == len(frames)
+    for (atoms, cell), frame in zip(frames, read):
+        npt.assert_allclose(frame["data"], atoms.q, atol=1e-3)
+        npt.assert_allclose(frame["cell"], cell.h, atol=1e-10)
+
+    fdin = open(filename, "rb")
+    for atoms, cell in frames:
+        npt.assert_allclose(io.read_file_raw("xyz", fdin)["data"], atoms.q, atol=1e-3)
+    with pytest.raises(EOFError):
+        io.read_file_raw("xyz", fdin)
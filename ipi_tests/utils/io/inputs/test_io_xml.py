@@ -0,0 +1,42 @@
+#!/usr/bin/env python2
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+from ipi.utils.io.inputs.io_xml import read_array, write_array
+
+
+@pytest.mark.parametrize("data,dtype,expected", [
+    (" [ 1.0, 2.5e-3,\n -3 ] ", float, [1.0, 2.5e-3, -3.0]),
+    (u"[1, 2, 3]", int, [1, 2, 3]),
+    ("['1.0', '2.0']", float, [1.0, 2.0]),
+    ("[ ]", float, []),
+])
+def test_read_array(data, dtype, expected):
+    value = read_array(dtype, data)
+    assert value.dtype == np.dtype(dtype)
+    npt.assert_array_equal(value, expected)
+
+
+@pytest.mark.parametrize("data,dtype", [
+    ("[1.0, , 2.0]", float),
+    ("[1.0 2.0]", float),
+    ("[1, 2.5]", int),
+    ("1.0, 2.0", float),
+])
+def test_read_array_errors(data, dtype):
+    with pytest.raises(ValueError):
+        read_array(dtype, data)
+
+
+def test_write_array_float():
+    text = write_array(float, np.array([1.0, 2.0, 3.0]), perline=2, newline="\n")
+    assert text == "  1.00000000e+00,   2.00000000e+00, \n  3.00000000e+00"
+
+
+def test_write_array_roundtrip():
+    value = np.random.standard_normal(23)
+    for dtype in [float, int]:
+        data = np.asarray(value * 100, dtype)
+        text = "[" + write_array(dtype, data) + "]"
+        npt.assert_allclose(read_array(dtype, text), data, rtol=1e-8)
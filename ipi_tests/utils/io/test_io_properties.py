@@ -0,0 +1,65 @@
+#!/usr/bin/env python2
+# pylint: disable=C0111,W0621,R0914,C0301
+#+easier to find important problems
+
+import pytest
+import numpy as np
+import numpy.testing as npt
+
+from ipi.utils.io.io_properties import PropertyFile, is_binary_properties, print_properties_header, print_properties_record
+
+
+properties = [{"name": "step", "dimension": "number", "unit": "atomic_unit", "size": 1, "help": ""},
+              {"name": "potential{electronvolt}", "dimension": "energy", "unit": "electronvolt", "size": 1, "help": ""},
+              {"name": "kinetic_tens", "dimension": "energy", "unit": "atomic_unit", "size": 6, "help": ""}]
+
+
+def frames(n=5):
+    np.random.seed(12345)
+    return [[float(i), np.random.standard_normal(), np.random.standard_normal(6)] for i in range(n)]
+
+
+def test_binary(tmpdir):
+    filename = str(tmpdir.join("out"))
+    with open(filename, "wb") as f:
+        print_properties_header(properties, f)
+        for values in frames():
+            print_properties_record(values, f)
+        # an incomplete record, as left by a run that is still going
+        f.write("\0" * 12)
+
+    assert is_binary_properties(filename)
+    pf = PropertyFile(filename)
+    assert len(pf) == 5
+    assert isinstance(pf.data, np.memmap)
+    npt.assert_array_equal(pf["step"], np.arange(5.0))
+    npt.assert_array_equal(pf["potential"], [v[1] for v in frames()])
+    npt.assert_array_equal(pf["kinetic_tens"], [v[2] for v in frames()])
+    assert pf.unit("potential") == "electronvolt"
+    assert pf.find("kinetic_tens")["dimension"] == "energy"
+    assert [u for u, in pf.iter_frames(["potential"])] == [v[1] for v in frames()]
+
+
+def test_text(tmpdir):
+    filename = str(tmpdir.join("out"))
+    with open(filename, "w") as f:
+        f.write("# column   1     --> step : The current simulation time step.\n")
+        f.write("# column   2     --> potential{electronvolt} : The physical system potential energy.\n")
+        f.write("# cols.    3-8   --> kinetic_tens \n")
+        for values in frames():
+            f.write(" ".join("%.16e" % x for x in np.hstack(values)) + "\n")
+
+    assert not is_binary_properties(filename)
+    pf = PropertyFile(filename)
+    # the frames are read one line at a time, without loading the file
+    for (step, kin), values in zip(pf.iter_frames(["step", "kinetic_tens"]), frames()):
+        assert step == values[0]
+        npt.assert_array_equal(kin, values[2])
+    assert len(list(pf.iter_frames(["step"]))) == 5
+    assert pf._data is None
+    npt.assert_array_equal(pf["potential{electronvolt}"], [v[1] for v in frames()])
+    npt.assert_array_equal(pf["kinetic_tens"], [v[2] for v in frames()])
+    assert pf.unit("potential") == "electronvolt"
+    assert pf.unit("kinetic_tens") == "atomic_unit"
+    with pytest.raises(KeyError):
+        pf.find("temperature")
@@ -0,0 +1,59 @@
+#!/usr/bin/env python2
+import os
+
+import numpy as np
+import numpy.testing as npt
+
+from ipi.utils.inputvalue import InputArray, ArraySidecar
+from ipi.utils.io.inputs.io_xml import xml_parse_string
+
+
+def roundtrip(value, sidecar=None):
+    iarr = InputArray(dtype=float)
+    iarr.store(value)
+    if sidecar is None:
+        text = iarr.write("arr")
+    else:
+        with sidecar:
+            text = iarr.write("arr")
+        with open(sidecar.filename, "wb") as sfile:
+            sidecar.save(sfile)
+    parsed = InputArray(dtype=float)
+    parsed.parse(xml_parse_string(text).fields[0][1])
+    return text, parsed.fetch()
+
+
+def test_sidecar_roundtrip(tmpdir):
+    value = np.random.uniform(size=(4, 30))
+    text, back = roundtrip(value, ArraySidecar(os.path.join(str(tmpdir), "chk.npz")))
+    assert "mode='npz'" in text
+    npt.assert_array_equal(back, value)
+
+
+def test_sidecar_small_array(tmpdir):
+    # arrays below the size threshold are written as text
+    value = np.array([1.0, 2.0, 3.0])
+    text, back = roundtrip(value, ArraySidecar(os.path.join(str(tmpdir), "chk.npz")))
+    assert not "npz" in text
+    npt.assert_array_equal(back, value)
+
+
+def test_no_sidecar():
+    value = np.arange(40.0)
+    text, back = roundtrip(value)
+    assert not "npz" in text
+    npt.assert_array_equal(back, value)
+
+
+def test_npy_mode(tmpdir):
+    value = np.random.uniform(size=(3, 7))
+    filename = str(tmpdir.join("arr.npy"))
+    np.save(filename, value)
+
+    # the shape is taken from the file if it is not given
+    iarr = InputArray(dtype=float)
+    iarr.parse(xml_parse_string("<arr mode='npy'> %s </arr>" % filename).fields[0][1])
+    npt.assert_array_equal(iarr.fetch(), value)
+
+    iarr.parse(xml_parse_string("<arr mode='npy' shape='(21)'> %s </arr>" % filename).fields[0][1])
+    npt.assert_array_equal(iarr.fetch(), value.flatten())
@@ -0,0 +1,55 @@
+#!/usr/bin/env python2
+import timeit
+
+import numpy as np
+import numpy.testing as npt
+import pytest
+
+from ipi.utils.nmtransform import nm_trans, nm_fft
+
+
+@pytest.mark.parametrize("nbeads", [1, 2, 3, 4, 7, 16])
+@pytest.mark.parametrize("open_paths", [None, [1], [0, 3]])
+def test_fft_matches_matrix(nbeads, open_paths):
+    natoms = 4
+    q = np.random.standard_normal((nbeads, 3 * natoms))
+    mat = nm_trans(nbeads, open_paths=open_paths)
+    fft = nm_fft(nbeads, natoms, open_paths=open_paths)
+
+    npt.assert_allclose(fft.b2nm(q), mat.b2nm(q), atol=1e-12)
+    npt.assert_allclose(fft.nm2b(q), mat.nm2b(q), atol=1e-12)
+    npt.assert_allclose(fft.nm2b(fft.b2nm(q)), q, atol=1e-12)
+
+
+@pytest.mark.parametrize("transform", [lambda: nm_trans(6, [2]), lambda: nm_fft(6, 3, [2])])
+def test_output_buffer(transform):
+    t = transform()
+    q = np.random.standard_normal((6, 9))
+    out = np.zeros((6, 9))
+    assert t.b2nm(q, out=out) is out
+    npt.assert_allclose(out, t.b2nm(q), atol=1e-14)
+    assert t.nm2b(q, out=out) is out
+    npt.assert_allclose(out, t.nm2b(q), atol=1e-14)
+
+
+def best_time(f):
+    return min(timeit.repeat(f, number=5, repeat=5))
+
+
+def test_benchmark_matrix():
+    # for many beads the FFT transform is faster than the matrix products
+    nbeads, natoms = 512, 100
+    q = np.random.standard_normal((nbeads, 3 * natoms))
+    out = np.empty(q.shape)
+    mat = nm_trans(nbeads)
+    fft = nm_fft(nbeads, natoms)
+
+    tmat = best_time(lambda: mat.b2nm(q))
+    tfft = best_time(lambda: fft.b2nm(q, out=out))
+    print "b2nm: %.4fs nm_trans, %.4fs nm_fft" % (tmat, tfft)
+    assert tfft < 0.8 * tmat
+
+    tmat = best_time(lambda: mat.nm2b(q))
+    tfft = best_time(lambda: fft.nm2b(q, out=out))
+    print "nm2b: %.4fs nm_trans, %.4fs nm_fft" % (tmat, tfft)
+    assert tfft < 0.8 * tmat
@@ -0,0 +1,113 @@
+#!/usr/bin/env python2
+import threading
+import time
+
+import pytest
+
+from ipi.utils.threadpool import ThreadPool, SerialQueue, Job
+
+
+def nap(secs):
+    time.sleep(secs)
+
+
+def record(log, value):
+    log.append(value)
+
+
+def test_run_results():
+    pool = ThreadPool()
+    jobs = [Job(lambda x: x * 2, {"x": i}) for i in range(5)]
+    assert pool.run(jobs) == [0, 2, 4, 6, 8]
+    assert all(job.done() for job in jobs)
+    pool.close()
+
+
+def test_run_concurrent():
+    # the jobs can only complete if they all run at the same time
+    pool = ThreadPool()
+    barrier = threading.Semaphore(0)
+    njobs = 4
+
+    def meet():
+        for i in range(njobs - 1):
+            barrier.release()
+        time.sleep(0.05)
+        for i in range(njobs - 1):
+            barrier.acquire()
+
+    pool.run([Job(meet) for i in range(njobs)])
+    pool.close()
+
+
+def test_workers_are_reused():
+    pool = ThreadPool()
+    pool.run([Job(nap, {"secs": 0.01}) for i in range(3)])
+    threads = list(pool._threads)
+    pool.run([Job(nap, {"secs": 0.01}) for i in range(3)])
+    assert pool._threads == threads
+    pool.close()
+
+
+def test_exception_is_raised():
+    pool = ThreadPool()
+
+    def fail():
+        raise ValueError("failed job")
+
+    with pytest.raises(ValueError):
+        pool.run([Job(nap, {"secs": 0.0}), Job(fail)])
+    pool.close()
+
+
+def test_submit():
+    pool = ThreadPool()
+    job = pool.submit(lambda a, b: a + b, a=1, b=5)
+    assert job.wait() == 6
+    pool.close()
+
+
+def test_serial_order():
+    queue = SerialQueue(maxsize=2)
+    done = []
+    for i in range(10):
+        queue.submit(record, log=done, value=i)
+    queue.drain()
+    assert done == range(10)
+    queue.close()
+
+
+def test_serial_backpressure():
+    # submit() must wait while the queue is full
+    queue = SerialQueue(maxsize=1)
+    gate = threading.Event()
+    queue.submit(gate.wait)
+    queue.submit(nap, secs=0.0)
+    submitted = threading.Event()
+
+    def third():
+        queue.submit(nap, secs=0.0)
+        submitted.set()
+
+    st = threading.Thread(target=third)
+    st.start()
+    assert not submitted.wait(0.05)
+    gate.set()
+    st.join()
+    assert submitted.is_set()
+    queue.close()
+
+
+def test_serial_exception():
+    queue = SerialQueue()
+    done = []
+
+    def fail():
+        raise IOError("disk full")
+
+    queue.submit(fail)
+    queue.submit(record, log=done, value=1)
+    with pytest.raises(IOError):
+        queue.drain()
+    assert done == []
+    queue.close()
@@ -13,6 +13,9 @@ naming scheme. This requires the following lines in input.xml file:
 <trajectory filename='force' stride='1' format='xyz' cell_units='angstrom'>
 forces </trajectory>
 
+The trajectories of all the beads can also be written to a single file each (bundle='true'),
+in the 'xyz' or 'binary' format, and possibly compressed.
+
 Syntax:
    python effective_temperatures.py "prefix" "simulation temperature (in Kelvin)"
    "number of time frames to skip in the beginning of each file (default 0)"
@@ -25,7 +28,7 @@ import sys
 import glob
 
 from ipi.utils.units import unit_to_internal, unit_to_user, Constants
-from ipi.utils.io import read_file
+from ipi.utils.io import iter_path, count_beads
 
 
 def effectiveTemperatures(prefix, temp, ss=0):
@@ -42,7 +45,7 @@ def effectiveTemperatures(prefix, temp, ss=0):
     fns_for = sorted(glob.glob(prefix + ".for*"))
     fn_out = prefix + ".effective_temperatures.dat"
 
-    nbeads = len(fns_for)
+    nbeads = count_beads(fns_for)
 
     # print some information
     print 'temperature = {:f} K'.format(float(temp))
@@ -58,7 +61,7 @@ def effectiveTemperatures(prefix, temp, ss=0):
     print
 
     # open input and output files
-    ifor = [open(fn, "r") for fn in fns_for]
+    ifor = iter_path(fns_for, dimension='force')
     iOut = open(fn_out, "w")
 
     # Some constants
@@ -76,14 +79,15 @@ def effectiveTemperatures(prefix, temp, ss=0):
             sys.stdout.flush()
 
         try:
+            forces = ifor.next()
             for i in range(nbeads):
-                ret = read_file("xyz", ifor[i], dimension='force')["atoms"]
+                ret = forces[i]["atoms"]
                 if natoms == 0:
                     m, natoms, names = ret.m, ret.natoms, ret.names
                     f = np.zeros((nbeads, 3 * natoms))
                     f2_av = np.zeros(3 * natoms)
                 f[i, :] = ret.q
-        except EOFError:  # finished reading files
+        except (EOFError, StopIteration):  # finished reading files
             break
 
         if ifr >= skipSteps:  # PPI correction
@@ -18,6 +18,8 @@ This would require the following lines in input.xml file:
 <trajectory filename='pos' stride='1' format='xyz' cell_units='angstrom'> positions{angstrom} </trajectory>
 <trajectory filename='force' stride='1' format='xyz' cell_units='angstrom'> forces{piconewton} </trajectory>
 
+The properties can be written either as text or in the binary format (format='binary').
+
 Syntax:
    python energy_ppi.py "prefix" "simulation temperature (in Kelvin)" "number of time frames to skip
    in the beginning of each file (default 0)"
@@ -29,10 +31,10 @@ import glob
 from ipi.utils.messages import verbosity
 
 from ipi.utils.io import read_file
+from ipi.utils.io.io_properties import PropertyFile
 from ipi.utils.units import unit_to_internal, unit_to_user, Constants
 
 verbosity.low = "low"
-time_index, potentialEnergy_index = 0, 0  # global variables for time step and potential energy units
 potentialEnergyUnit = None               # potential energy unit in input file prefix.out
 temperature = None                       # simulation temperature
 skipSteps = 0                            # steps to skip for thermalization
@@ -61,10 +63,11 @@ def totalEnergy(prefix, temp, ss=0):
 
     iU = None  # input potential energy and simulation time file
     for filename in sorted(glob.glob(prefix + ".out")):
-        iU = open(filename, "r")
+        iU = PropertyFile(filename)
 
     global potentialEnergyUnit, timeUnit
     timeUnit, potentialEnergyUnit = extractUnits(iU)  # extracting simulation time and potential energy units
+    iframes = iU.iter_frames(["time", "potential"])
 
     iE = open(prefix + ".energy" + ".dat", "w")
     iE.write("# Simulation time (in %s), virial total energy and PPI energy correction (in %s)\n" %
@@ -90,7 +93,7 @@ def totalEnergy(prefix, temp, ss=0):
                     f = np.zeros((nbeads, 3 * natoms))
                 q[i, :] = pos
                 f[i, :] = force
-            time, U = read_U(iU)
+            time, U = read_U(iframes)
         except EOFError:  # finished reading files
             sys.exit(0)
 
@@ -146,89 +149,44 @@ def totalEnergy(prefix, temp, ss=0):
             ifr += 1
 
 
-def extractUnits(filedescU):
+def extractUnits(props):
     """
-    Extracting potential energy and time step units.
-    Also this function looking for the simulation time
-    and potential energy position in the prefix.out
-    file. Thus, this file can contain any number of
-    output properties in arbitrary ordering.
+    Extracting potential energy and time step units from
+    the prefix.out file, which can be a text or binary
+    property file, and can contain any number of output
+    properties in arbitrary ordering.
 
     Args:
-       filedesc: An open readable file object from a xyz formatted file.
+       props: A PropertyFile object for the prefix.out file.
 
     Returns:
        Simulation time and potential energy units.
     """
 
-    global potentialEnergy_index, time_index
-
-    text = []
-    read = True
-    while read:   # the loop reads all lines which have # as a first word
-        position = filedescU.tell()
-        line = filedescU.readline()
-        if line == "":
-            raise EOFError("The file descriptor hit EOF.")
-        elif line.split()[0] == '#':
-            text.append(line)
-        else:
-            filedescU.seek(position)
-            read = False
-
-    timeUnit, potentialEnergyUnit = None, None
-
-    line_index = 0
-    for line in text:
-        ind = 0
-        try:
-            ind = line.find('potential{')
-            if ind != -1:
-                potentialEnergy_index = int(line_index)
-                line = line[ind + 10:]
-                ind = line.find('}')
-                unit = line[:ind]
-                potentialEnergyUnit = unit
-        except:
-            pass
-        try:
-            ind = line.find('time{')
-            if ind != -1:
-                time_index = int(line_index)
-                line = line[ind + 5:]
-                ind = line.find('}')
-                unit = line[:ind]
-                timeUnit = unit
-        except:
-            pass
-        line_index += 1
-
-    if timeUnit is None or potentialEnergyUnit is None:
+    try:
+        return props.unit("time"), props.unit("potential")
+    except KeyError:
         print("Cannot read time and potential energy units")
         sys.exit(1)
 
-    return timeUnit, potentialEnergyUnit
-
 
-def read_U(filedesc):
-    """Takes a file which contains simulation time and potential energy information and
-       returns these data. Potential energy is transformed into internal units.
+def read_U(frames):
+    """Takes the frames of a property file which contains simulation time and potential energy information and
+       returns these data for the next time frame. Potential energy is transformed into internal units.
 
     Args:
-       filedesc: An open readable file object.
+       frames: An iterator over the simulation time and potential energy of each frame, as given by
+          PropertyFile.iter_frames().
 
     Returns:
        The simulation time and potential energy of the system.
     """
 
-    line = filedesc.readline()
-    if line == "":
-        raise EOFError("The file descriptor hit EOF.")
+    try:
+        time, U = frames.next()
+    except StopIteration:
+        raise EOFError("The property file hit EOF.")
 
-    line = line.strip()
-    line = line.split()
-    time = float(line[time_index])
-    U = float(line[potentialEnergy_index])
     U = unit_to_internal("energy", potentialEnergyUnit, U)
 
     return time, U
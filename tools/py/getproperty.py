@@ -3,7 +3,8 @@
 """ getproperty.py
 
 Parses a property output file and - if present - outputs the column(s)
-corresponding to the desired property. Relies on the infrastructure of i-pi,
+corresponding to the desired property. Both text and binary property files
+can be read, the latter through a memory map. Relies on the infrastructure of i-pi,
 so the ipi package should be installed in the Python module directory, or
 the i-pi main directory must be added to the PYTHONPATH environment variable.
 
@@ -14,13 +15,29 @@ Syntax:
 
 import sys
 import re
+import numpy as np
 from ipi.utils.messages import warning
 from ipi.engine.outputs import *
+from ipi.utils.io.inputs.io_xml import write_type
+from ipi.utils.io.io_properties import PropertyFile, is_binary_properties
 
 
 def main(inputfile, propertyname="potential", skip="0"):
     skip = int(skip)
 
+    if is_binary_properties(inputfile):
+        try:
+            data = PropertyFile(inputfile)[propertyname]
+        except KeyError as e:
+            warning(e.args[0])
+            return
+        for value in data[skip:]:
+            if np.ndim(value) == 0:
+                print write_type(float, value).strip()
+            else:
+                print " ".join(write_type(float, el).strip() for el in value)
+        return
+
     # opens & parses the input file
     ifile = open(inputfile, "r")
 
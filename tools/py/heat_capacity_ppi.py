@@ -17,6 +17,11 @@ scheme. This would require the following lines in input.xml file:
 <trajectory filename='for' stride='n' format='xyz' cell_units='angstrom'> forces </trajectory>
 Here n is the same integer number.
 
+The trajectories of all the beads can also be written to a single file each (bundle='true'),
+in the 'xyz' or 'binary' format, and possibly compressed.
+
+The properties can be written either as text or in the binary format (format='binary').
+
 Syntax:
    python heat_capacity_ppi.py "prefix" "simulation temperature (in Kelvin)" "number of time frames to skip
    in the beginning of each file (default 0)"
@@ -30,10 +35,10 @@ import numpy as np
 import sys
 import glob
 import os
-import re
 
 from ipi.utils.units import unit_to_internal, Constants
-from ipi.utils.io import read_file
+from ipi.utils.io import iter_path, count_beads
+from ipi.utils.io.io_properties import PropertyFile
 
 
 def heatCapacity(prefix, temp, ss=0):
@@ -62,9 +67,10 @@ def heatCapacity(prefix, temp, ss=0):
     fns_iU = glob.glob(prefix + ".out")[0]
     fn_out_en = prefix + ".heat_capacity.dat"
 
-    # check that we found the same number of positions and forces files
-    nbeads = len(fns_pos)
-    if nbeads != len(fns_for):
+    # check that we found the same number of beads for positions and forces,
+    # either in one file per bead or in a single bundle
+    nbeads = count_beads(fns_pos)
+    if nbeads != count_beads(fns_for):
         print fns_pos
         print fns_for
         raise ValueError("Mismatch between number of input files for forces and positions.")
@@ -85,9 +91,9 @@ def heatCapacity(prefix, temp, ss=0):
     print
 
     # open input and output files
-    ipos = [open(fn, "r") for fn in fns_pos]
-    ifor = [open(fn, "r") for fn in fns_for]
-    iU = open(fns_iU, "r")
+    ipos = iter_path(fns_pos, dimension='length')
+    ifor = iter_path(fns_for, dimension='force')
+    iU = PropertyFile(fns_iU)
     iC = open(fn_out_en, "w")
 
     # Some constants
@@ -98,8 +104,9 @@ def heatCapacity(prefix, temp, ss=0):
     const_4 = Constants.hbar**2 * beta**2 / (24.0 * nbeads**3)
     const_5 = Constants.kb * beta**2
 
-    timeUnit, potentialEnergyUnit, potentialEnergy_index, time_index = extractUnits(iU)  # extracting simulation time
+    timeUnit, potentialEnergyUnit = extractUnits(iU)  # extracting simulation time
     # and potential energy units
+    iframes = iU.iter_frames(["time", "potential"])
 
     iC.write("# Simulation time (in %s), improved heat capacity estimator, primitive heat capacity estimator, "
              "and PPI correction for the heat capacity\n" % timeUnit)
@@ -116,16 +123,17 @@ def heatCapacity(prefix, temp, ss=0):
             sys.stdout.flush()
 
         try:
+            pos, forces = ipos.next(), ifor.next()
             for i in range(nbeads):
-                ret = read_file("xyz", ipos[i], dimension='length')["atoms"]
+                ret = pos[i]["atoms"]
                 if natoms == 0:
                     m, natoms = ret.m, ret.natoms
                     q = np.zeros((nbeads, 3 * natoms))
                     f = np.zeros((nbeads, 3 * natoms))
                 q[i, :] = ret.q
-                f[i, :] = read_file("xyz", ifor[i], dimension='force')["atoms"].q
-            U, time = read_U(iU, potentialEnergyUnit, potentialEnergy_index, time_index)
-        except EOFError:  # finished reading files
+                f[i, :] = forces[i]["atoms"].q
+            U, time = read_U(iframes, potentialEnergyUnit)
+        except (EOFError, StopIteration):  # finished reading files
             sys.exit(0)
 
         if ifr < skipSteps:
@@ -192,77 +200,44 @@ def heatCapacity(prefix, temp, ss=0):
             ifr += 1
 
 
-def extractUnits(filedescU):
+def extractUnits(props):
     """
-    Extracting potential energy and time step units.
-    Also this function looking for the simulation time
-    and potential energy position in the prefix.out
-    file. Thus, this file can contain any number of
-    output properties in arbitrary ordering.
+    Extracting potential energy and time step units from
+    the prefix.out file, which can be a text or binary
+    property file, and can contain any number of output
+    properties in arbitrary ordering.
 
     Args:
-       filedesc: An open readable file object from a xyz formatted file.
+       props: A PropertyFile object for the prefix.out file.
 
     Returns:
        Simulation time and potential energy units.
     """
 
-    text = []
-    read = True
-    while read:   # the loop reads all lines which have # as a first word
-        position = filedescU.tell()
-        line = filedescU.readline()
-        if line == "":
-            raise EOFError("The file descriptor hit EOF.")
-        elif line.split()[0] == '#':
-            text.append(line)
-        else:
-            filedescU.seek(position)
-            read = False
-
-    timeUnit, potentialEnergyUnit = None, None
-    potentialEnergy_index, time_index = 0, 0
-
-    potential_re = re.compile('potential\{[a-z]*\}')
-    time_re = re.compile('time\{[a-z]*\}')
-
-    line_index = 0
-    for line in text:
-        pot = potential_re.search(line)
-        time = time_re.search(line)
-        if pot is not None:
-            potentialEnergyUnit = pot.group()[:-1].split('{')[1]
-            potentialEnergy_index = line_index
-        if time is not None:
-            timeUnit = time.group()[:-1].split('{')[1]
-            time_index = line_index
-        line_index += 1
-
-    if timeUnit is None or potentialEnergyUnit is None:
+    try:
+        return props.unit("time"), props.unit("potential")
+    except KeyError:
         print("Cannot read time and potential energy units")
         sys.exit(1)
 
-    return timeUnit, potentialEnergyUnit, potentialEnergy_index, time_index
-
 
-def read_U(filedesc, potentialEnergyUnit, potentialEnergy_index, time_index):
-    """Takes a file which contains simulation time and potential energy information and
-       returns these data. Potential energy is transformed into internal units.
+def read_U(frames, potentialEnergyUnit):
+    """Takes the frames of a property file which contains simulation time and potential energy information and
+       returns these data for the next time frame. Potential energy is transformed into internal units.
 
     Args:
-       filedesc: An open readable file object.
+       frames: An iterator over the simulation time and potential energy of each frame, as given by
+          PropertyFile.iter_frames().
 
     Returns:
        The simulation time and potential energy of the system.
     """
 
-    line = filedesc.readline()
-    if line == "":
-        raise EOFError("The file descriptor hit EOF.")
+    try:
+        time, U = frames.next()
+    except StopIteration:
+        raise EOFError("The property file hit EOF.")
 
-    line = line.strip().split()
-    time = float(line[time_index])
-    U = float(line[potentialEnergy_index])
     U = unit_to_internal("energy", potentialEnergyUnit, U)
 
     return U, time
@@ -17,6 +17,8 @@ This would require the following lines in input.xml file:
 <trajectory filename='for' stride='n' format='xyz' cell_units='angstrom'> forces{piconewton} </trajectory>
 where n is the same integer number.
 
+The properties can be written either as text or in the binary format (format='binary').
+
 Syntax:
    python potential_energy_ppi.py "prefix" "simulation temperature (in Kelvin)" "number of time frames to skip
    in the beginning of each file (default 0)" "units for the energy output (default choice is the units for
@@ -29,10 +31,10 @@ import numpy as np
 import sys
 import glob
 import os
-import re
 
 from ipi.utils.units import unit_to_internal, unit_to_user, Constants
 from ipi.utils.io import read_file
+from ipi.utils.io.io_properties import PropertyFile
 
 
 def potentialEnergy(prefix, temp, ss=0, unit=''):
@@ -79,15 +81,16 @@ def potentialEnergy(prefix, temp, ss=0, unit=''):
 
     # open input and output files
     ifor = [open(fn, "r") for fn in fns_for]
-    iU = open(fns_iU, "r")
+    iU = PropertyFile(fns_iU)
     iE = open(fn_out_en, "w")
 
     # Some constants
     beta = 1.0 / (Constants.kb * temperature)
     const = Constants.hbar**2 * beta**2 / (24.0 * nbeads**3)
 
-    timeUnit, potentialEnergyUnit, potentialEnergy_index, time_index = extractUnits(iU)  # extracting simulation time
+    timeUnit, potentialEnergyUnit = extractUnits(iU)  # extracting simulation time
     # and potential energy units
+    iframes = iU.iter_frames(["time", "potential"])
 
     # Defining the output energy unit
     if unit == '':
@@ -113,7 +116,7 @@ def potentialEnergy(prefix, temp, ss=0, unit=''):
                     m, natoms = ret["masses"], ret["natoms"]
                     f = np.zeros((nbeads, 3 * natoms))
                 f[i, :] = ret["data"]
-            U, time = read_U(iU, potentialEnergyUnit, potentialEnergy_index, time_index)
+            U, time = read_U(iframes, potentialEnergyUnit)
         except EOFError:  # finished reading files
             sys.exit(0)
 
@@ -155,77 +158,44 @@ def potentialEnergy(prefix, temp, ss=0, unit=''):
             ifr += 1
 
 
-def extractUnits(filedescU):
+def extractUnits(props):
     """
-    Extracting potential energy and time step units.
-    Also this function looking for the simulation time
-    and potential energy position in the prefix.out
-    file. Thus, this file can contain any number of
-    output properties in arbitrary ordering.
+    Extracting potential energy and time step units from
+    the prefix.out file, which can be a text or binary
+    property file, and can contain any number of output
+    properties in arbitrary ordering.
 
     Args:
-       filedesc: An open readable file object from a xyz formatted file.
+       props: A PropertyFile object for the prefix.out file.
 
     Returns:
        Simulation time and potential energy units.
     """
 
-    text = []
-    read = True
-    while read:   # the loop reads all lines which have # as a first word
-        position = filedescU.tell()
-        line = filedescU.readline()
-        if line == "":
-            raise EOFError("The file descriptor hit EOF.")
-        elif line.split()[0] == '#':
-            text.append(line)
-        else:
-            filedescU.seek(position)
-            read = False
-
-    timeUnit, potentialEnergyUnit = None, None
-    potentialEnergy_index, time_index = 0, 0
-
-    potential_re = re.compile('potential\{[a-z]*\}')
-    time_re = re.compile('time\{[a-z]*\}')
-
-    line_index = 0
-    for line in text:
-        pot = potential_re.search(line)
-        time = time_re.search(line)
-        if pot is not None:
-            potentialEnergyUnit = pot.group()[:-1].split('{')[1]
-            potentialEnergy_index = line_index
-        if time is not None:
-            timeUnit = time.group()[:-1].split('{')[1]
-            time_index = line_index
-        line_index += 1
-
-    if timeUnit is None or potentialEnergyUnit is None:
+    try:
+        return props.unit("time"), props.unit("potential")
+    except KeyError:
         print("Cannot read time and potential energy units")
         sys.exit(1)
 
-    return timeUnit, potentialEnergyUnit, potentialEnergy_index, time_index
 
-
-def read_U(filedesc, potentialEnergyUnit, potentialEnergy_index, time_index):
-    """Takes a file which contains simulation time and potential energy information and
-       returns these data. Potential energy is transformed into internal units.
+def read_U(frames, potentialEnergyUnit):
+    """Takes the frames of a property file which contains simulation time and potential energy information and
+       returns these data for the next time frame. Potential energy is transformed into internal units.
 
     Args:
-       filedesc: An open readable file object.
+       frames: An iterator over the simulation time and potential energy of each frame, as given by
+          PropertyFile.iter_frames().
 
     Returns:
        The simulation time and potential energy of the system.
     """
 
-    line = filedesc.readline()
-    if line == "":
-        raise EOFError("The file descriptor hit EOF.")
+    try:
+        time, U = frames.next()
+    except StopIteration:
+        raise EOFError("The property file hit EOF.")
 
-    line = line.strip().split()
-    time = float(line[time_index])
-    U = float(line[potentialEnergy_index])
     U = unit_to_internal("energy", potentialEnergyUnit, U)
 
     return U, time
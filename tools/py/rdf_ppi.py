@@ -16,6 +16,9 @@ This would require the following lines in input.xml file:
 <trajectory filename='for' stride='n' format='xyz' cell_units='angstrom'> forces </trajectory>
 where n is the same integer number.
 
+The trajectories of all the beads can also be written to a single file each (bundle='true'),
+in the 'xyz' or 'binary' format, and possibly compressed.
+
 Syntax:
    python rdf_ppi.py "prefix" "simulation temperature (in Kelvin)" "element A" "element B" "number of bins for RDF"
    "minimum distance (in Angstroms)" "maximum distance (in Angstroms) "number of time frames to skip in the beginning
@@ -31,7 +34,7 @@ import sys
 import glob
 import os
 from ipi.utils.units import unit_to_internal, unit_to_user, Constants, Elements
-from ipi.utils.io import read_file
+from ipi.utils.io import iter_path, count_beads
 
 
 def RDF(prefix, temp, A, B, nbins, r_min, r_max, ss=0, unit='angstrom'):
@@ -53,9 +56,10 @@ def RDF(prefix, temp, A, B, nbins, r_min, r_max, ss=0, unit='angstrom'):
     fns_for = sorted(glob.glob(prefix + ".for*"))
     fn_out_rdf, fn_out_rdf_q = prefix + '.' + A + B + ".rdf.dat", prefix + '.' + A + B + ".rdf-ppi.dat"
 
-    # check that we found the same number of positions and forces files
-    nbeads = len(fns_pos)
-    if nbeads != len(fns_for):
+    # check that we found the same number of beads for positions and forces,
+    # either in one file per bead or in a single bundle
+    nbeads = count_beads(fns_pos)
+    if nbeads != count_beads(fns_for):
         print fns_pos
         print fns_for
         raise ValueError("Mismatch between number of input files for forces and positions.")
@@ -75,8 +79,8 @@ def RDF(prefix, temp, A, B, nbins, r_min, r_max, ss=0, unit='angstrom'):
     print
 
     # open input and output files
-    ipos = [open(fn, "r") for fn in fns_pos]
-    ifor = [open(fn, "r") for fn in fns_for]
+    ipos = iter_path(fns_pos, dimension='length')
+    ifor = iter_path(fns_for, dimension='force')
     #iRDF, iRDFq = open(fn_out_rdf, "w"), open(fn_out_rdf_q, "w")
 
     # Species for RDF
@@ -113,8 +117,9 @@ def RDF(prefix, temp, A, B, nbins, r_min, r_max, ss=0, unit='angstrom'):
             sys.stdout.flush()
 
         try:
+            frames, forces = ipos.next(), ifor.next()
             for i in range(nbeads):
-                ret = read_file("xyz", ipos[i], dimension='length')
+                ret = frames[i]
                 if natoms == 0:
                     mass, natoms = ret["atoms"].m, ret["atoms"].natoms
                     pos = np.zeros((nbeads, 3 * natoms), order='F')
@@ -123,8 +128,8 @@ def RDF(prefix, temp, A, B, nbins, r_min, r_max, ss=0, unit='angstrom'):
                 inverseCell = ret["cell"].get_ih()
                 cellVolume = ret["cell"].get_volume()
                 pos[i, :] = ret["atoms"].q
-                force[i, :] = read_file("xyz", ifor[i], dimension='force')["atoms"].q
-        except EOFError:  # finished reading files
+                force[i, :] = forces[i]["atoms"].q
+        except (EOFError, StopIteration):  # finished reading files
             noteof = False
 
         if noteof:
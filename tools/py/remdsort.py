@@ -28,6 +28,7 @@ from ipi.engine.outputs import *
 from ipi.engine.properties import getkey
 from ipi.inputs.simulation import InputSimulation
 from ipi.utils.io.inputs import io_xml
+from ipi.utils.io.io_properties import PropertyFile
 
 
 def main(inputfile, prefix="PT"):
@@ -62,9 +63,18 @@ def main(inputfile, prefix="PT"):
                     filename = s.prefix + "_" + o.filename
                 else: filename = o.filename
                 ofilename = prefix + str(isys) + "_" + o.filename
-                nprop.append({"filename": filename, "ofilename": ofilename, "stride": o.stride,
-                              "ifile": open(filename, "r"), "ofile": open(ofilename, "w")
-                              })
+                if o.format == "binary":
+                    # binary files are read through a memory map, one record at a time
+                    pfile = PropertyFile(filename)
+                    nprop.append({"filename": filename, "ofilename": ofilename, "stride": o.stride,
+                                  "ifile": pfile, "iframe": 0, "ofile": open(ofilename, "wb")
+                                  })
+                    with open(filename, "rb") as ifile:
+                        nprop[-1]["ofile"].write(ifile.read(pfile.offset))
+                else:
+                    nprop.append({"filename": filename, "ofilename": ofilename, "stride": o.stride,
+                                  "ifile": open(filename, "r"), "ofile": open(ofilename, "w")
+                                  })
                 isys += 1
             lprop.append(nprop)
         elif type(o) is TrajectoryOutput:   # trajectories are more complex, as some have per-bead output
@@ -126,7 +136,11 @@ def main(inputfile, prefix="PT"):
             for prop in lprop:
                 for isys in range(nsys):
                     sprop = prop[isys]
-                    if step % sprop["stride"] == 0:  # property transfer
+                    if step % sprop["stride"] == 0 and "iframe" in sprop:  # binary property transfer
+                        if sprop["iframe"] >= len(sprop["ifile"]): raise EOFError
+                        prop[irep[isys]]["ofile"].write(sprop["ifile"].data[sprop["iframe"]].tostring())
+                        sprop["iframe"] += 1
+                    elif step % sprop["stride"] == 0:  # property transfer
                         iline = sprop["ifile"].readline()
                         if len(iline) == 0: raise EOFError  # useful if line is blank
                         while iline[0] == "#":  # fast forward if line is a comment